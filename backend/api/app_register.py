@@ -8,7 +8,7 @@ from pydantic import BaseModel, Field
 from typing import List, Optional
 
 from api.deps import get_deps
-from api.routers.kb import _ensure_collection, _kb_filters
+from api.routers.kb import _ensure_collection, _kb_total
 from api.routers.owner import ensure_app_owner, require_wallet_id, is_super_admin
 from api.schemas.ingestion import IngestionLogItem
 
@@ -158,11 +158,7 @@ def app_status(app_id: str, wallet_id: Optional[str] = None, deps=Depends(get_de
                     collection = str(cfg.get("collection") or "")
                     try:
                         collection = _ensure_collection(deps, cfg)
-                        filters = _kb_filters(cfg, app_id, None, None)
-                        total = deps.datasource.weaviate.count(
-                            collection,
-                            filters=filters if filters else None,
-                        )
+                        total = _kb_total(deps, cfg, collection, app_id, str(kb_key))
                         kb_stats.append(
                             AppStatusKBInfo(
                                 kb_key=str(kb_key),
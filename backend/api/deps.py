@@ -241,3 +241,52 @@ def get_deps() -> Deps:
 
         orchestrator=orchestrator,
     )
+
+
+# -------------------------------------------------
+# Parser registry（进程内共享：进程池只建一次）
+# -------------------------------------------------
+@lru_cache(maxsize=1)
+def get_parser_registry():
+    from core.ingestion.parser_registry import default_registry
+
+    settings = get_settings()
+    return default_registry(
+        process_workers=settings.ingestion_parse_processes,
+        process_min_bytes=settings.ingestion_parse_process_min_bytes,
+        max_bytes=settings.ingestion_parse_max_bytes,
+        timeout_seconds=settings.ingestion_parse_timeout_seconds,
+    )
+
+
+# -------------------------------------------------
+# Ingestion workers（后台执行 ingestion_jobs）
+# -------------------------------------------------
+@lru_cache(maxsize=1)
+def get_ingestion_workers():
+    # 延迟导入：worker_pool -> job_runner -> api.routers.kb -> api.deps 会形成循环
+    from core.ingestion.scheduler import FairScheduler
+    from core.ingestion.worker_pool import IngestionWorkerPool
+
+    settings = get_settings()
+    return IngestionWorkerPool(
+        get_deps,
+        workers=settings.ingestion_workers,
+        lease_seconds=settings.ingestion_lease_seconds,
+        poll_interval_ms=settings.ingestion_poll_interval_ms,
+        max_attempts=settings.ingestion_max_attempts,
+        backoff_seconds=settings.ingestion_retry_backoff_seconds,
+        backoff_max_seconds=settings.ingestion_retry_backoff_max_seconds,
+        scheduler=FairScheduler.from_settings(settings),
+    )
+
+
+# -------------------------------------------------
+# KB 计数对账（后台周期任务）
+# -------------------------------------------------
+@lru_cache(maxsize=1)
+def get_kb_count_reconciler():
+    # 延迟导入：count_reconciler -> api.routers.kb -> api.deps 会形成循环
+    from core.kb.count_reconciler import KBCountReconciler
+
+    return KBCountReconciler(get_deps)
@@ -1,5 +1,7 @@
 # api/main.py
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -17,12 +19,47 @@ from api.routers.ingestion_jobs import router as ingestion_jobs_router
 from api.routers.resume import router as resume_router
 from api.routers.jd import router as jd_router
 from api.routers.private_dbs import router as private_db_router
+from api.deps import (
+    get_datasource,
+    get_deps,
+    get_ingestion_workers,
+    get_kb_count_reconciler,
+    get_parser_registry,
+    get_settings,
+)
+from api.routers.kb import prepare_kb_collections
+from core.memory.auxiliary_memory import AuxiliaryMemory
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 后台摄取 worker：随服务启动/停止（INGESTION_WORKERS=0 时不启动）
+    workers = get_ingestion_workers()
+    workers.start()
+    # Weaviate schema 漂移检查：热路径只查本地缓存，这里周期性与服务端核对
+    weaviate = get_datasource().weaviate
+    if weaviate:
+        # collection 创建/等待可见放到后台任务里，请求线程只做有上限的等待
+        weaviate.prepare_collection(AuxiliaryMemory.COLLECTION_NAME, AuxiliaryMemory.PROPERTIES)
+        prepare_kb_collections(get_deps())
+        weaviate.schema.start(get_settings().weaviate_schema_check_seconds)
+        # KB 计数对账：统计接口读 SQLite 计数，这里周期性与 Weaviate 实际数核对
+        get_kb_count_reconciler().start(get_settings().kb_count_reconcile_seconds)
+    try:
+        yield
+    finally:
+        workers.stop()
+        if weaviate:
+            weaviate.schema.stop()
+            get_kb_count_reconciler().stop()
+        get_parser_registry().close()
 
 
 def create_app() -> FastAPI:
     app = FastAPI(
         title="RAG Service",
         version="2.1.0",
+        lifespan=lifespan,
     )
 
     origins = [o.strip() for o in os.getenv("CORS_ALLOW_ORIGINS", "").split(",") if o.strip()]
@@ -1,7 +1,6 @@
 # api/routers/ingestion.py
 # -*- coding: utf-8 -*-
 
-import hashlib
 import uuid
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
@@ -11,6 +10,7 @@ from api.kb_meta import infer_file_type
 from api.schemas.ingestion import IngestionLogCreate, IngestionLogList, IngestionLogItem
 from api.routers.owner import ensure_app_owner, require_wallet_id, is_super_admin
 from api.routers.kb import _resolve_kb_config
+from datasource.objectstores.minio_store import HashingReader
 from datasource.objectstores.path_builder import PathBuilder
 
 router = APIRouter(prefix="/ingestion", tags=["ingestion"])
@@ -101,25 +101,29 @@ def upload_file(
         if kb_type != "user_upload":
             data_wallet_id = None
 
-        raw = file.file.read()
-        if not raw:
+        if not file.file.read(1):
             raise HTTPException(status_code=400, detail="empty file")
+        file.file.seek(0)
+
         name = (filename or file.filename or "").strip() or f"upload_{uuid.uuid4()}"
         file_type = infer_file_type(name) or "bin"
         key = PathBuilder.kb_upload(storage_wallet_id, app_id, kb_key, name)
-        deps.datasource.minio.put_bytes(
+
+        # 单遍：边读边算 sha256，同时 multipart 流式写入 MinIO
+        reader = HashingReader(file.file)
+        deps.datasource.minio.put_stream(
             bucket=deps.datasource.bucket,
             key=key,
-            data=raw,
+            stream=reader,
             content_type=file.content_type or "application/octet-stream",
         )
-        sha256 = hashlib.sha256(raw).hexdigest()
+        sha256 = reader.hexdigest()
         return {
             "bucket": deps.datasource.bucket,
             "key": key,
             "source_url": f"minio://{deps.datasource.bucket}/{key}",
             "file_type": file_type,
-            "size_bytes": len(raw),
+            "size_bytes": reader.size,
             "content_sha256": sha256,
             "data_wallet_id": data_wallet_id,
         }
@@ -4,28 +4,36 @@
 from __future__ import annotations
 
 import uuid
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException
 
-from api.deps import get_deps
+from api.deps import get_deps, get_ingestion_workers
 from api.kb_meta import infer_file_type, sha256_text
 from api.routers.kb import _resolve_kb_config
 from api.routers.owner import ensure_app_owner, is_super_admin, require_wallet_id
 from api.schemas.ingestion_jobs import (
+    IngestionJobBatchCreate,
+    IngestionJobBatchInfo,
     IngestionJobCreate,
     IngestionJobInfo,
     IngestionJobList,
     IngestionJobPreset,
     IngestionJobRunItem,
     IngestionJobRuns,
+    IngestionJobSyncCreate,
+    IngestionSyncStateInfo,
+    IngestionSyncStateList,
 )
 from api.routers.private_db_utils import resolve_private_db_id
-from core.ingestion.job_runner import run_ingestion_job
+from core.ingestion.job_runner import _parse_minio_url, run_ingestion_job
 from datasource.objectstores.path_builder import PathBuilder
 
 router = APIRouter(prefix="/ingestion/jobs", tags=["ingestion-jobs"])
 
+# 单个批次最多展开的作业数（超出直接拒绝，避免半截批次）
+MAX_BATCH_JOBS = 20000
+
 
 def _as_job_info(row) -> IngestionJobInfo:
     return IngestionJobInfo(
@@ -39,6 +47,9 @@ def _as_job_info(row) -> IngestionJobInfo:
         source_url=row.get("source_url"),
         file_type=row.get("file_type"),
         status=row.get("status") or "",
+        priority=int(row.get("priority") or 0),
+        attempts=int(row.get("attempts") or 0),
+        batch_id=row.get("batch_id"),
         options_json=row.get("options_json"),
         result_json=row.get("result_json"),
         error_message=row.get("error_message"),
@@ -49,39 +60,102 @@ def _as_job_info(row) -> IngestionJobInfo:
     )
 
 
+def _as_batch_info(batch, counts) -> IngestionJobBatchInfo:
+    total = int(batch.get("total") or 0)
+    done = counts.get("success", 0) + counts.get("failed", 0)
+    if total and done >= total:
+        status = "failed" if counts.get("failed", 0) else "success"
+    elif done or counts.get("running", 0):
+        status = "running"
+    else:
+        status = "pending"
+    return IngestionJobBatchInfo(
+        batch_id=batch.get("id") or "",
+        wallet_id=batch.get("wallet_id") or "",
+        app_id=batch.get("app_id") or "",
+        kb_key=batch.get("kb_key") or "",
+        source_prefix=batch.get("source_prefix"),
+        total=total,
+        pending=counts.get("pending", 0),
+        running=counts.get("running", 0),
+        success=counts.get("success", 0),
+        failed=counts.get("failed", 0),
+        deduped=counts.get("deduped", 0),
+        done=done,
+        progress=round(done / total, 4) if total else 1.0,
+        status=status,
+        created_at=batch.get("created_at"),
+    )
+
+
+def _resolve_job_scope(
+    deps,
+    *,
+    wallet_id: str,
+    app_id: str,
+    kb_key: str,
+    data_wallet_id: Optional[str],
+    private_db_id: Optional[str],
+    session_id: Optional[str],
+) -> Tuple[Optional[str], Optional[str], str]:
+    """
+    校验 owner + KB 配置并解析私有库（单条与批量共用，批量只做一次）。
+    返回 (data_wallet_id, private_db_id, storage_wallet_id)。
+    """
+    ensure_app_owner(deps, app_id, wallet_id)
+    cfg = _resolve_kb_config(deps, app_id, kb_key)
+    kb_type = str(cfg.get("type") or "").strip()
+    data_wallet_id = (data_wallet_id or "").strip() or None
+    resolved_private_db_id = None
+    if kb_type == "user_upload":
+        resolved_private_db_id = resolve_private_db_id(
+            deps,
+            app_id=app_id,
+            wallet_id=wallet_id,
+            private_db_id=private_db_id,
+            session_id=session_id,
+            allow_create=True,
+        )
+        if not resolved_private_db_id and not data_wallet_id:
+            raise HTTPException(status_code=400, detail="session_id or private_db_id is required for user_upload")
+        if not resolved_private_db_id and data_wallet_id:
+            resolved_private_db_id = data_wallet_id
+        data_wallet_id = data_wallet_id or wallet_id
+    else:
+        data_wallet_id = None
+    storage_wallet_id = data_wallet_id if kb_type == "user_upload" else wallet_id
+    return data_wallet_id, resolved_private_db_id, storage_wallet_id
+
+
+def _check_source_url(source_url: str) -> None:
+    if "://" in source_url and not source_url.startswith("minio://"):
+        raise HTTPException(status_code=400, detail="only minio:// URLs are supported for now")
+
+
 @router.post("", response_model=IngestionJobInfo)
 def create_job(req: IngestionJobCreate, run: bool = False, deps=Depends(get_deps)):
+    """
+    只负责入队；后台 worker 领取执行。
+    run=true 仅在未启用后台 worker（INGESTION_WORKERS=0）时内联执行。
+    """
     try:
-        ensure_app_owner(deps, req.app_id, req.wallet_id)
+        data_wallet_id, private_db_id, storage_wallet_id = _resolve_job_scope(
+            deps,
+            wallet_id=req.wallet_id,
+            app_id=req.app_id,
+            kb_key=req.kb_key,
+            data_wallet_id=req.data_wallet_id,
+            private_db_id=req.private_db_id,
+            session_id=req.session_id,
+        )
         if not deps.datasource.minio and req.content:
             raise HTTPException(status_code=400, detail="MinIO is required for inline content")
 
-        cfg = _resolve_kb_config(deps, req.app_id, req.kb_key)
-        kb_type = str(cfg.get("type") or "").strip()
-        data_wallet_id = (req.data_wallet_id or "").strip() or None
-        private_db_id = None
-        if kb_type == "user_upload":
-            private_db_id = resolve_private_db_id(
-                deps,
-                app_id=req.app_id,
-                wallet_id=req.wallet_id,
-                private_db_id=req.private_db_id,
-                session_id=req.session_id,
-                allow_create=True,
-            )
-            if not private_db_id and not data_wallet_id:
-                raise HTTPException(status_code=400, detail="session_id or private_db_id is required for user_upload")
-            if not private_db_id and data_wallet_id:
-                private_db_id = data_wallet_id
-            data_wallet_id = data_wallet_id or req.wallet_id
-        else:
-            data_wallet_id = None
-        storage_wallet_id = data_wallet_id if kb_type == "user_upload" else req.wallet_id
-
         source_url = req.source_url
         file_type = req.file_type
 
         content_sha256 = None
+        enqueued_stat = None
         if req.content:
             filename = (req.filename or "").strip() or f"ingest_{uuid.uuid4()}.txt"
             file_type = file_type or infer_file_type(filename) or "txt"
@@ -89,15 +163,20 @@ def create_job(req: IngestionJobCreate, run: bool = False, deps=Depends(get_deps
             deps.datasource.minio.put_text(bucket=deps.datasource.bucket, key=key, text=req.content)
             source_url = f"minio://{deps.datasource.bucket}/{key}"
             content_sha256 = sha256_text(req.content)
+            # 记下入队时对象的 ETag/大小：执行时对象未变才能信任这个哈希、在下载前去重
+            stat = deps.datasource.minio.stat(deps.datasource.bucket, key) or {}
+            enqueued_stat = {"etag": stat.get("etag"), "size": stat.get("size")}
 
         if not source_url:
             raise HTTPException(status_code=400, detail="source_url is required")
-        if "://" in source_url and not source_url.startswith("minio://"):
-            raise HTTPException(status_code=400, detail="only minio:// URLs are supported for now")
+        _check_source_url(source_url)
         if file_type is None:
             file_type = infer_file_type(source_url) or "txt"
 
         options = dict(req.options or {})
+        options.pop("source_stat", None)
+        if enqueued_stat:
+            options["source_stat"] = enqueued_stat
         if req.metadata:
             options["metadata"] = req.metadata
 
@@ -112,12 +191,16 @@ def create_job(req: IngestionJobCreate, run: bool = False, deps=Depends(get_deps
             file_type=file_type,
             content_sha256=content_sha256,
             options=options,
+            priority=req.priority,
         )
         job = deps.datasource.ingestion_jobs.get(job_id)
         if not job:
             raise HTTPException(status_code=500, detail="failed to create ingestion job")
 
-        if run:
+        workers = get_ingestion_workers()
+        if workers.enabled:
+            workers.wake()
+        elif run:
             run_ingestion_job(job_id, deps)
             job = deps.datasource.ingestion_jobs.get(job_id) or job
         return _as_job_info(job)
@@ -127,6 +210,200 @@ def create_job(req: IngestionJobCreate, run: bool = False, deps=Depends(get_deps
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/batches", response_model=IngestionJobBatchInfo)
+def create_batch(req: IngestionJobBatchCreate, run: bool = False, deps=Depends(get_deps)):
+    """
+    批量入队：逐个列出的 sources 和/或一个 minio:// 前缀（展开为前缀下全部对象）。
+    owner / KB 配置 / 私有库只解析一次，全部作业在同一事务里写入。
+    """
+    try:
+        data_wallet_id, private_db_id, _ = _resolve_job_scope(
+            deps,
+            wallet_id=req.wallet_id,
+            app_id=req.app_id,
+            kb_key=req.kb_key,
+            data_wallet_id=req.data_wallet_id,
+            private_db_id=req.private_db_id,
+            session_id=req.session_id,
+        )
+
+        sources: dict = {}
+        for item in req.sources:
+            source_url = (item.source_url or "").strip()
+            if not source_url:
+                raise HTTPException(status_code=400, detail="source_url is required")
+            _check_source_url(source_url)
+            file_type = item.file_type or infer_file_type(source_url) or "txt"
+            sources.setdefault(source_url, (source_url, file_type, item.metadata or None))
+
+        source_prefix = None
+        if req.prefix:
+            if not deps.datasource.minio:
+                raise HTTPException(status_code=400, detail="MinIO is not enabled")
+            source_prefix = req.prefix.strip()
+            _check_source_url(source_prefix)
+            bucket, prefix = _parse_minio_url(source_prefix, deps.datasource.bucket)
+            allowed = {t.strip().lower().lstrip(".") for t in req.file_types if t.strip()}
+            for key in deps.datasource.minio.iter_keys(bucket, prefix, recursive=True):
+                file_type = infer_file_type(key) or "txt"
+                if allowed and file_type not in allowed:
+                    continue
+                source_url = f"minio://{bucket}/{key}"
+                sources.setdefault(source_url, (source_url, file_type, None))
+                if len(sources) > MAX_BATCH_JOBS:
+                    break
+
+        if not sources:
+            raise HTTPException(status_code=400, detail="no sources matched")
+        if len(sources) > MAX_BATCH_JOBS:
+            raise HTTPException(status_code=400, detail=f"too many sources (max {MAX_BATCH_JOBS} per batch)")
+
+        options = dict(req.options or {})
+        if req.metadata:
+            options["metadata"] = req.metadata
+
+        store = deps.datasource.ingestion_jobs
+        batch_id = uuid.uuid4().hex
+        store.create_batch(
+            batch_id=batch_id,
+            wallet_id=req.wallet_id,
+            data_wallet_id=data_wallet_id,
+            private_db_id=private_db_id or data_wallet_id,
+            app_id=req.app_id,
+            kb_key=req.kb_key,
+            job_type="kb_ingest",
+            sources=list(sources.values()),
+            options=options,
+            priority=req.priority,
+            source_prefix=source_prefix,
+        )
+
+        workers = get_ingestion_workers()
+        if workers.enabled:
+            workers.wake()
+        elif run:
+            for row in store.list(batch_id=batch_id, limit=MAX_BATCH_JOBS, offset=0):
+                run_ingestion_job(int(row["id"]), deps)
+        batch = store.get_batch(batch_id)
+        if not batch:
+            raise HTTPException(status_code=500, detail="failed to create ingestion batch")
+        return _as_batch_info(batch, store.batch_progress(batch_id))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/batches/{batch_id}", response_model=IngestionJobBatchInfo)
+def get_batch(batch_id: str, wallet_id: Optional[str] = None, deps=Depends(get_deps)):
+    wallet_id = require_wallet_id(wallet_id)
+    store = deps.datasource.ingestion_jobs
+    batch = store.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="batch not found")
+    ensure_app_owner(deps, batch.get("app_id"), wallet_id)
+    return _as_batch_info(batch, store.batch_progress(batch_id))
+
+
+@router.get("/batches/{batch_id}/jobs", response_model=IngestionJobList)
+def list_batch_jobs(
+    batch_id: str,
+    wallet_id: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+    deps=Depends(get_deps),
+):
+    wallet_id = require_wallet_id(wallet_id)
+    store = deps.datasource.ingestion_jobs
+    batch = store.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="batch not found")
+    ensure_app_owner(deps, batch.get("app_id"), wallet_id)
+    rows = store.list(batch_id=batch_id, status=status, limit=limit, offset=offset)
+    return IngestionJobList(items=[_as_job_info(row) for row in rows])
+
+
+@router.post("/syncs", response_model=IngestionJobInfo)
+def create_sync(req: IngestionJobSyncCreate, run: bool = False, deps=Depends(get_deps)):
+    """
+    前缀同步（job_type=kb_sync）：按 ETag/大小比对前缀下对象与已入库来源，
+    只为新增/变更对象入队 kb_ingest 批次，已删除对象的向量随之删除，并记录同步水位。
+    """
+    try:
+        if not deps.datasource.minio:
+            raise HTTPException(status_code=400, detail="MinIO is not enabled")
+        data_wallet_id, private_db_id, storage_wallet_id = _resolve_job_scope(
+            deps,
+            wallet_id=req.wallet_id,
+            app_id=req.app_id,
+            kb_key=req.kb_key,
+            data_wallet_id=req.data_wallet_id,
+            private_db_id=req.private_db_id,
+            session_id=req.session_id,
+        )
+        source_prefix = (req.prefix or "").strip()
+        if not source_prefix:
+            key = PathBuilder.kb_upload(storage_wallet_id, req.app_id, req.kb_key, "")
+            source_prefix = f"minio://{deps.datasource.bucket}/{key}"
+        _check_source_url(source_prefix)
+
+        options = {
+            "file_types": [t.strip() for t in req.file_types if t.strip()],
+            "delete_removed": req.delete_removed,
+            "allow_empty": req.allow_empty,
+            "job_options": dict(req.options or {}),
+        }
+        if req.metadata:
+            options["metadata"] = req.metadata
+
+        store = deps.datasource.ingestion_jobs
+        job_id = store.create(
+            wallet_id=req.wallet_id,
+            data_wallet_id=data_wallet_id,
+            private_db_id=private_db_id or data_wallet_id,
+            app_id=req.app_id,
+            kb_key=req.kb_key,
+            job_type="kb_sync",
+            source_url=source_prefix,
+            options=options,
+            priority=req.priority,
+        )
+        job = store.get(job_id)
+        if not job:
+            raise HTTPException(status_code=500, detail="failed to create sync job")
+
+        workers = get_ingestion_workers()
+        if workers.enabled:
+            workers.wake()
+        elif run:
+            result = run_ingestion_job(job_id, deps)
+            if result.get("batch_id"):
+                for row in store.list(batch_id=result["batch_id"], limit=MAX_BATCH_JOBS, offset=0):
+                    run_ingestion_job(int(row["id"]), deps)
+            job = store.get(job_id) or job
+        return _as_job_info(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/syncs", response_model=IngestionSyncStateList)
+def list_syncs(
+    wallet_id: Optional[str] = None,
+    app_id: Optional[str] = None,
+    kb_key: Optional[str] = None,
+    limit: int = 50,
+    deps=Depends(get_deps),
+):
+    wallet_id = require_wallet_id(wallet_id)
+    if not app_id:
+        raise HTTPException(status_code=400, detail="app_id is required")
+    ensure_app_owner(deps, app_id, wallet_id)
+    rows = deps.datasource.ingestion_jobs.list_sync_states(app_id=app_id, kb_key=kb_key, limit=limit)
+    return IngestionSyncStateList(items=[IngestionSyncStateInfo(**row) for row in rows])
+
 
 
 @router.get("", response_model=IngestionJobList)
@@ -184,7 +461,17 @@ def run_job(job_id: int, wallet_id: Optional[str] = None, deps=Depends(get_deps)
     if not row:
         raise HTTPException(status_code=404, detail="job not found")
     ensure_app_owner(deps, row.get("app_id"), wallet_id)
-    run_ingestion_job(job_id, deps)
+    workers = get_ingestion_workers()
+    if workers.enabled:
+        # 重新入队，由后台 worker 执行
+        if not deps.datasource.ingestion_jobs.requeue(job_id):
+            raise HTTPException(status_code=409, detail="job is running")
+        workers.wake()
+    else:
+        try:
+            run_ingestion_job(job_id, deps)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
     row = deps.datasource.ingestion_jobs.get(job_id) or row
     return _as_job_info(row)
 
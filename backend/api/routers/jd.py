@@ -14,6 +14,7 @@ from api.kb_meta import infer_file_type, sha256_text
 from api.routers.kb import _ensure_collection, _resolve_kb_config, _text_field_from_cfg
 from api.schemas.jd import JDUploadRequest, JDUploadResponse
 from api.routers.private_db_utils import resolve_private_db_id
+from core.kb.kb_manager import allowed_apps_value
 from datasource.objectstores.path_builder import PathBuilder
 
 
@@ -117,7 +118,7 @@ def upload_jd(app_id: str, req: JDUploadRequest, deps=Depends(get_deps)):
             combined = {"jd": req.jd, "metadata": req.metadata}
             props["metadata_json"] = _serialize_payload(combined)
         if cfg.get("use_allowed_apps_filter"):
-            props["allowed_apps"] = effective_app_id
+            props["allowed_apps"] = allowed_apps_value(deps.datasource.weaviate, collection, [effective_app_id])
 
         vector = deps.embedding_client.embed_one(jd_text, app_id=effective_app_id)
         doc_id = deps.datasource.weaviate.upsert(
@@ -1,16 +1,23 @@
 # api/routers/kb.py
 # -*- coding: utf-8 -*-
 
+import base64
+import json
+import uuid
+from itertools import islice
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 import weaviate.classes.config as wc
 
-from api.deps import get_deps
+from api.deps import get_deps, get_kb_count_reconciler
 from api.schemas.kb import (
     KBInfo,
     KBStats,
     KBDocument,
+    KBDocumentBatchItem,
+    KBDocumentBatchResult,
+    KBDocumentBatchUpsert,
     KBDocumentList,
     KBDocumentUpsert,
     KBDocumentUpdate,
@@ -18,9 +25,16 @@ from api.schemas.kb import (
 from api.kb_meta import derive_content_sha256, extract_source_info, infer_file_type
 from api.routers.owner import ensure_app_owner, require_wallet_id, is_super_admin
 from api.routers.private_db_utils import resolve_private_db_id
+from core.kb.kb_manager import allowed_apps_filter, allowed_apps_list, allowed_apps_value
+from datasource.vectorstores.weaviate_store import CollectionNotReady
 
 router = APIRouter(prefix="/kb", tags=["knowledge-base"])
 
+# 批量写入单次请求的文档上限
+MAX_BATCH_DOCUMENTS = 1000
+# 文档列表单页上限
+MAX_LIST_LIMIT = 500
+
 
 def _resolve_kb_config(deps, app_id: str, kb_key: str) -> dict:
     spec = deps.app_registry.get(app_id)
@@ -37,13 +51,7 @@ def _text_field_from_cfg(cfg: dict) -> str:
     return str(cfg.get("text_field") or "text").strip() or "text"
 
 
-def _ensure_collection(deps, cfg: dict) -> str:
-    collection = str(cfg.get("collection") or "")
-    if not collection:
-        raise ValueError("collection is empty")
-    if not deps.datasource.weaviate:
-        raise RuntimeError("Weaviate is not enabled")
-
+def _collection_properties(cfg: dict) -> list:
     text_field = _text_field_from_cfg(cfg)
     kb_type = str(cfg.get("type") or "").strip()
 
@@ -61,15 +69,63 @@ def _ensure_collection(deps, cfg: dict) -> str:
                 wc.Property(name="source_url", data_type=wc.DataType.TEXT),
                 wc.Property(name="file_type", data_type=wc.DataType.TEXT),
                 wc.Property(name="metadata_json", data_type=wc.DataType.TEXT),
+                wc.Property(name="parent_doc_id", data_type=wc.DataType.TEXT),
+                wc.Property(name="chunk_index", data_type=wc.DataType.INT),
             ]
         )
         if cfg.get("use_allowed_apps_filter"):
-            props.append(wc.Property(name="allowed_apps", data_type=wc.DataType.TEXT))
+            # 多值：一份向量可对多个 app 可见；field 分词保证 app_id 整体精确匹配
+            props.append(
+                wc.Property(name="allowed_apps", data_type=wc.DataType.TEXT_ARRAY, tokenization=wc.Tokenization.FIELD)
+            )
+    return props
+
+
+def _ensure_collection(deps, cfg: dict, *, wait: Optional[float] = None) -> str:
+    """
+    请求线程用默认等待（ready_wait_seconds，超时 503）；
+    摄取 worker 等后台调用方传 wait=create_timeout_seconds，慢创建时等到完成而不是报错。
+    """
+    collection = str(cfg.get("collection") or "")
+    if not collection:
+        raise ValueError("collection is empty")
+    if not deps.datasource.weaviate:
+        raise RuntimeError("Weaviate is not enabled")
 
-    deps.datasource.weaviate.ensure_collection(collection, props)
+    try:
+        deps.datasource.weaviate.ensure_collection(collection, _collection_properties(cfg), wait=wait)
+    except CollectionNotReady as e:
+        # 后台仍在创建：快速失败，由客户端按 Retry-After 重试
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
     return collection
 
 
+def prepare_kb_collections(deps) -> int:
+    """启动时为已注册插件的全部 KB 提交后台就绪任务（不等待），返回提交数。"""
+    if not deps.datasource.weaviate:
+        return 0
+    submitted = 0
+    for app_id in deps.app_registry.list_apps():
+        if not (deps.app_registry.plugins_root / app_id / "config.yaml").exists():
+            continue
+        try:
+            kb_cfg = (deps.app_registry.get(app_id).config or {}).get("knowledge_bases", {}) or {}
+        except Exception as e:
+            print(f"[kb] prepare collections skipped: app_id={app_id} err={e}")
+            continue
+        if not isinstance(kb_cfg, dict):
+            continue
+        for cfg in kb_cfg.values():
+            if isinstance(cfg, dict) and cfg.get("collection"):
+                deps.datasource.weaviate.prepare_collection(str(cfg["collection"]), _collection_properties(cfg))
+                submitted += 1
+    return submitted
+
+
 def _kb_filters(
     cfg: dict,
     app_id: str,
@@ -84,10 +140,47 @@ def _kb_filters(
         elif data_wallet_id:
             filters["wallet_id"] = data_wallet_id
         if cfg.get("use_allowed_apps_filter"):
-            filters["allowed_apps"] = app_id
+            filters["allowed_apps"] = allowed_apps_filter(app_id)
     return filters
 
 
+def _count_scope(cfg: dict, private_db_id: Optional[str], data_wallet_id: Optional[str]) -> tuple:
+    """与 _kb_filters 对应的计数范围：(scope, kb_documents 过滤条件)。"""
+    if str(cfg.get("type") or "").strip() == "user_upload":
+        if private_db_id:
+            return f"private_db:{private_db_id}", {"private_db_id": private_db_id}
+        if data_wallet_id:
+            return f"wallet:{data_wallet_id}", {"wallet_id": data_wallet_id}
+    return "", {}
+
+
+def _kb_total(
+    deps,
+    cfg: dict,
+    collection: str,
+    app_id: str,
+    kb_key: str,
+    private_db_id: Optional[str] = None,
+    data_wallet_id: Optional[str] = None,
+) -> int:
+    """
+    KB 文档总数：kb_doc_counters 计数 + 对账记录的校正值（不再每次对 Weaviate 做 aggregate）。
+    该范围从未对账过时现查一次 Weaviate 并记下校正值。
+    """
+    scope, where = _count_scope(cfg, private_db_id, data_wallet_id)
+    docs = deps.datasource.kb_documents
+    counted = docs.active_count(app_id=app_id, kb_key=kb_key, **where)
+    adj = docs.get_count_adjustment(app_id=app_id, kb_key=kb_key, scope=scope)
+    if adj is not None:
+        return max(counted + int(adj.get("delta") or 0), 0)
+    filters = _kb_filters(cfg, app_id, private_db_id, data_wallet_id)
+    total = deps.datasource.weaviate.count(collection, filters=filters if filters else None)
+    docs.save_count_adjustment(
+        app_id=app_id, kb_key=kb_key, scope=scope, weaviate_count=total, sqlite_count=counted,
+    )
+    return total
+
+
 @router.get("/list", response_model=list[KBInfo])
 def list_kbs(wallet_id: Optional[str] = None, deps=Depends(get_deps)):
     try:
@@ -124,6 +217,8 @@ def list_kbs(wallet_id: Optional[str] = None, deps=Depends(get_deps)):
                     )
                 )
         return out
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -154,8 +249,7 @@ def kb_stats(
             )
         else:
             private_db_id = None
-        filters = _kb_filters(cfg, app_id, private_db_id, data_wallet_id)
-        total = deps.datasource.weaviate.count(collection, filters=filters if filters else None)
+        total = _kb_total(deps, cfg, collection, app_id, kb_key, private_db_id, data_wallet_id)
         return KBStats(
             app_id=app_id,
             kb_key=kb_key,
@@ -163,6 +257,26 @@ def kb_stats(
             total_count=total,
             chunk_count=total,
         )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/{app_id}/{kb_key}/stats/reconcile")
+def reconcile_kb_stats(
+    app_id: str,
+    kb_key: str,
+    wallet_id: Optional[str] = None,
+    deps=Depends(get_deps),
+):
+    """立即对账该 KB 的计数（默认由后台按 KB_COUNT_RECONCILE_SECONDS 周期执行）。"""
+    try:
+        ensure_app_owner(deps, app_id, wallet_id)
+        _resolve_kb_config(deps, app_id, kb_key)
+        return get_kb_count_reconciler().reconcile(app_id, kb_key)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -173,6 +287,7 @@ def list_documents(
     kb_key: str,
     limit: int = 20,
     offset: int = 0,
+    cursor: Optional[str] = None,
     wallet_id: Optional[str] = None,
     data_wallet_id: Optional[str] = None,
     private_db_id: Optional[str] = None,
@@ -181,6 +296,8 @@ def list_documents(
 ):
     try:
         ensure_app_owner(deps, app_id, wallet_id)
+        limit = max(1, min(int(limit), MAX_LIST_LIMIT))
+        after, start = _decode_cursor(cursor, kb_key) if cursor else (None, offset)
         cfg = _resolve_kb_config(deps, app_id, kb_key)
         collection = _ensure_collection(deps, cfg)
         kb_type = str(cfg.get("type") or "").strip()
@@ -196,12 +313,32 @@ def list_documents(
         else:
             private_db_id = None
         filters = _kb_filters(cfg, app_id, private_db_id, data_wallet_id)
-        items = deps.datasource.weaviate.fetch_objects(
-            collection,
-            limit=limit,
-            offset=offset,
-            filters=filters if filters else None,
-        )
+        next_cursor = None
+        if filters or (offset and not cursor):
+            # 带范围过滤（共享 collection 里的私有库/钱包）：Weaviate 游标不支持 where，按 uuid 游标只能全表扫描，
+            # 这里用服务端过滤 + offset（每页 O(limit)，深度受 QUERY_MAXIMUM_RESULTS 限制）；cursor 里带的是 offset。
+            # 未传 cursor 的旧 offset 调用也走这里
+            if after is not None:
+                raise HTTPException(status_code=400, detail="invalid cursor")
+            items = deps.datasource.weaviate.fetch_objects(
+                collection,
+                limit=limit,
+                offset=start,
+                filters=filters if filters else None,
+            )
+            if filters and len(items) == limit:
+                next_cursor = _encode_cursor(kb_key, offset=start + limit)
+        else:
+            if cursor and after is None:
+                raise HTTPException(status_code=400, detail="invalid cursor")
+            items = list(
+                islice(
+                    deps.datasource.weaviate.iterate(collection, batch_size=limit, after=after),
+                    limit,
+                )
+            )
+            if len(items) == limit:
+                next_cursor = _encode_cursor(kb_key, after=items[-1]["id"])
         normalized = []
         for item in items:
             normalized.append(
@@ -212,12 +349,42 @@ def list_documents(
                     updated_at=_to_iso(item.get("updated_at")),
                 )
             )
-        total = deps.datasource.weaviate.count(collection, filters=filters if filters else None)
-        return KBDocumentList(items=normalized, total=total)
+        total = _kb_total(deps, cfg, collection, app_id, kb_key, private_db_id, data_wallet_id)
+        return KBDocumentList(items=normalized, total=total, next_cursor=next_cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def _encode_cursor(kb_key: str, *, after: Optional[str] = None, offset: Optional[int] = None) -> str:
+    data = {"k": kb_key, "a": after} if after is not None else {"k": kb_key, "o": int(offset or 0)}
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token: str, kb_key: str) -> tuple[Optional[str], int]:
+    """
+    cursor 对调用方不透明，换 KB 使用视为无效；返回 (after, offset)：
+    - 无过滤：{kb_key, 上一页最后一条 uuid}，按 uuid 游标续取
+    - 带范围过滤：{kb_key, 下一页 offset}
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw.decode("utf-8"))
+        if "a" in data:
+            after, offset = str(uuid.UUID(str(data["a"]))), 0
+        else:
+            after, offset = None, int(data["o"])
+            if offset < 0:
+                raise ValueError("negative offset")
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    if data.get("k") != kb_key:
+        raise HTTPException(status_code=400, detail="cursor does not belong to this knowledge base")
+    return after, offset
+
+
 def _to_iso(val) -> str | None:
     if not val:
         return None
@@ -237,7 +404,39 @@ def _prepare_properties(cfg: dict, payload: dict) -> dict:
     return props
 
 
-def _resolve_text_and_vector(cfg: dict, req, deps, app_id: str) -> tuple[dict, list | None]:
+def _normalize_allowed_apps(deps, collection: str, props: dict) -> dict:
+    """调用方传入的 allowed_apps（字符串或列表）按 collection 的属性类型规整。"""
+    if props and props.get("allowed_apps") is not None:
+        props["allowed_apps"] = allowed_apps_value(deps.datasource.weaviate, collection, props["allowed_apps"])
+    return props
+
+
+def _existing_apps(deps, cfg: dict, collection: str, doc_id: str, app_id: str) -> Optional[list]:
+    """
+    开启 allowed_apps 过滤的 KB 里一份对象可能被多个 app 共享：返回对象当前的 allowed_apps（对象不存在 / 未开启过滤返回 None）。
+    对象不对当前 app 可见时按不存在处理（404），不能改写或删除其它 app 的文档。
+    """
+    if not cfg.get("use_allowed_apps_filter"):
+        return None
+    props = deps.datasource.weaviate.get_properties_by_id(collection, doc_id)
+    if props is None:
+        return None
+    apps = allowed_apps_list(props.get("allowed_apps"))
+    if apps and app_id not in apps:
+        raise HTTPException(status_code=404, detail="document not found")
+    return apps
+
+
+def _merge_allowed_apps(deps, collection: str, props: dict, existing: Optional[list]) -> dict:
+    """改写共享对象时把调用方给的 allowed_apps 并入已有列表，不覆盖其它 app。"""
+    if existing and props.get("allowed_apps") is not None:
+        props["allowed_apps"] = allowed_apps_value(
+            deps.datasource.weaviate, collection, existing + allowed_apps_list(props["allowed_apps"])
+        )
+    return props
+
+
+def _resolve_text(cfg: dict, req) -> tuple[dict, str | None]:
     props = _prepare_properties(cfg, req.properties)
     text_field = _text_field_from_cfg(cfg)
 
@@ -246,15 +445,18 @@ def _resolve_text_and_vector(cfg: dict, req, deps, app_id: str) -> tuple[dict, l
         text = props.get(text_field)
     if text:
         props[text_field] = text
+    return props, text
+
 
+def _resolve_text_and_vector(cfg: dict, req, deps, app_id: str) -> tuple[dict, list | None]:
+    props, text = _resolve_text(cfg, req)
     vector = req.vector
     if vector is None and text:
         vector = deps.embedding_client.embed_one(str(text), app_id=app_id)
     return props, vector
 
 
-def _record_doc_meta(
-    deps,
+def _doc_meta_row(
     *,
     doc_id: str,
     app_id: str,
@@ -264,7 +466,7 @@ def _record_doc_meta(
     text: Optional[str],
     text_field: str,
     default_source_type: Optional[str] = None,
-) -> None:
+) -> dict:
     source_url = props.get("source_url") if isinstance(props, dict) else None
     if isinstance(source_url, str) and not source_url.strip():
         source_url = None
@@ -275,19 +477,41 @@ def _record_doc_meta(
     file_type = props.get("file_type") if isinstance(props, dict) else None
     if file_type is None:
         file_type = infer_file_type(source_url)
-
-    content_sha256 = derive_content_sha256(text, props, text_field)
-
-    deps.datasource.kb_documents.upsert(
-        doc_id=doc_id,
-        app_id=app_id,
-        kb_key=kb_key,
-        wallet_id=wallet_id,
-        source_url=source_url,
-        source_type=source_type,
-        source_id=source_id,
-        file_type=file_type,
-        content_sha256=content_sha256,
+    # 私有库范围的计数读 kb_documents.private_db_id：与向量对象上的属性保持一致
+    private_db_id = props.get("private_db_id") if isinstance(props, dict) else None
+
+    return {
+        "doc_id": doc_id,
+        "app_id": app_id,
+        "kb_key": kb_key,
+        "wallet_id": wallet_id,
+        "private_db_id": str(private_db_id) if private_db_id else None,
+        "source_url": source_url,
+        "source_type": source_type,
+        "source_id": source_id,
+        "file_type": file_type,
+        "content_sha256": derive_content_sha256(text, props, text_field),
+    }
+
+
+def _record_doc_meta(deps, **kwargs) -> None:
+    row = _doc_meta_row(**kwargs)
+    current = deps.datasource.kb_documents.get(row["doc_id"])
+    if current and current.get("status") == "active" and current.get("app_id") != row["app_id"]:
+        # 共享对象被其它 app 改写：内容字段照常更新，元数据行的归属不变
+        for key in ("app_id", "kb_key", "wallet_id", "private_db_id"):
+            row[key] = current.get(key)
+    deps.datasource.kb_documents.upsert(**row)
+
+
+def _as_document(obj: Optional[dict], doc_id: str, props: dict) -> KBDocument:
+    if not obj:
+        return KBDocument(id=doc_id, properties=props)
+    return KBDocument(
+        id=obj.get("id") or doc_id,
+        properties=obj.get("properties") or props,
+        created_at=_to_iso(obj.get("created_at")),
+        updated_at=_to_iso(obj.get("updated_at")),
     )
 
 
@@ -307,6 +531,7 @@ def create_document(
         props, vector = _resolve_text_and_vector(cfg, req, deps, app_id)
         if vector is None:
             raise ValueError("vector is required (text or vector must be provided)")
+        _normalize_allowed_apps(deps, collection, props)
 
         obj_id = deps.datasource.weaviate.upsert(
             collection=collection,
@@ -334,10 +559,129 @@ def create_document(
             created_at=_to_iso(obj.get("created_at")),
             updated_at=_to_iso(obj.get("updated_at")),
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/{app_id}/{kb_key}/documents/batch", response_model=KBDocumentBatchResult)
+def create_documents_batch(
+    app_id: str,
+    kb_key: str,
+    req: KBDocumentBatchUpsert,
+    wallet_id: Optional[str] = None,
+    deps=Depends(get_deps),
+):
+    """
+    批量写入：owner / KB 配置 / collection 只解析一次；缺向量的按批向量化，
+    经 batch 一次写入 Weaviate，kb_documents 在同一事务里写入。
+    单条失败不影响其它条，逐条返回 id 与错误；return_objects=true 时才回读对象。
+    """
+    try:
+        if len(req.items) > MAX_BATCH_DOCUMENTS:
+            raise ValueError(f"too many items (max {MAX_BATCH_DOCUMENTS} per request)")
+        ensure_app_owner(deps, app_id, wallet_id)
+        cfg = _resolve_kb_config(deps, app_id, kb_key)
+        collection = _ensure_collection(deps, cfg)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    text_field = _text_field_from_cfg(cfg)
+    results = [KBDocumentBatchItem(index=i, id=item.id, status="ok") for i, item in enumerate(req.items)]
+    resolved: dict[int, tuple[dict, Optional[str], Optional[list]]] = {}
+    seen_ids: set = set()
+    for i, item in enumerate(req.items):
+        if item.id:
+            # 非法 uuid 会在 batch 上下文里抛错，已加入的对象照样落盘却整批报错、不写 kb_documents：先逐条校验
+            try:
+                results[i].id = str(uuid.UUID(str(item.id)))
+            except ValueError:
+                results[i].status, results[i].error = "error", "invalid id (must be a UUID)"
+                continue
+            if results[i].id in seen_ids:
+                results[i].status, results[i].error = "error", "duplicate id in batch"
+                continue
+            seen_ids.add(results[i].id)
+        props, text = _resolve_text(cfg, item)
+        _normalize_allowed_apps(deps, collection, props)
+        if item.vector is None and not text:
+            results[i].status, results[i].error = "error", "vector is required (text or vector must be provided)"
+            continue
+        resolved[i] = (props, text, item.vector)
+
+    # 只为缺向量的条目向量化，按批调用
+    missing = [i for i, (_, _, vector) in resolved.items() if vector is None]
+    batch_size = max(int(deps.settings.ingestion_embed_batch_size or 32), 1)
+    for start in range(0, len(missing), batch_size):
+        part = missing[start:start + batch_size]
+        try:
+            vectors = deps.embedding_client.embed([str(resolved[i][1]) for i in part], app_id=app_id)
+        except Exception as e:
+            for i in part:
+                results[i].status, results[i].error = "error", f"embedding failed: {e}"
+                resolved.pop(i)
+            continue
+        for i, vector in zip(part, vectors):
+            props, text, _ = resolved[i]
+            resolved[i] = (props, text, vector)
+
+    order = list(resolved)
+    written: list[int] = []
+    if order:
+        try:
+            res = deps.datasource.weaviate.upsert_many(
+                collection,
+                [resolved[i][2] for i in order],
+                [resolved[i][0] for i in order],
+                ids=[results[i].id for i in order],
+            )
+        except Exception as e:
+            for i in order:
+                results[i].status, results[i].error = "error", str(e)
+        else:
+            for i, obj_id in zip(order, res.ids):
+                results[i].id = obj_id
+                if obj_id in res.errors:
+                    results[i].status, results[i].error = "error", res.errors[obj_id]
+                else:
+                    written.append(i)
+
+    try:
+        deps.datasource.kb_documents.upsert_many(
+            _doc_meta_row(
+                doc_id=str(results[i].id),
+                app_id=app_id,
+                kb_key=kb_key,
+                wallet_id=wallet_id,
+                props=resolved[i][0],
+                text=resolved[i][1],
+                text_field=text_field,
+                default_source_type="manual",
+            )
+            for i in written
+        )
+    except Exception as e:
+        # 向量已写入，元数据失败只报错不回滚（与单条接口一致，可重放修复）
+        raise HTTPException(status_code=500, detail=f"kb_documents write failed: {e}")
+
+    if req.return_objects:
+        for i in written:
+            obj_id = str(results[i].id)
+            obj = deps.datasource.weaviate.fetch_object_by_id(collection, obj_id)
+            results[i].document = _as_document(obj, obj_id, resolved[i][0])
+
+    failed = sum(1 for r in results if r.status != "ok")
+    return KBDocumentBatchResult(
+        total=len(results),
+        succeeded=len(results) - failed,
+        failed=failed,
+        items=results,
+    )
+
+
 @router.put("/{app_id}/{kb_key}/documents/{doc_id}", response_model=KBDocument)
 def replace_document(
     app_id: str,
@@ -352,9 +696,15 @@ def replace_document(
         cfg = _resolve_kb_config(deps, app_id, kb_key)
         collection = _ensure_collection(deps, cfg)
 
+        existing = _existing_apps(deps, cfg, collection, doc_id, app_id)
         props, vector = _resolve_text_and_vector(cfg, req, deps, app_id)
         if vector is None:
             raise ValueError("vector is required (text or vector must be provided)")
+        _normalize_allowed_apps(deps, collection, props)
+        if existing:
+            # 整体替换也不能丢掉其它 app：没传 allowed_apps 时沿用已有列表
+            props.setdefault("allowed_apps", [])
+        _merge_allowed_apps(deps, collection, props, existing)
 
         deps.datasource.weaviate.upsert(
             collection=collection,
@@ -382,6 +732,8 @@ def replace_document(
             created_at=_to_iso(obj.get("created_at")),
             updated_at=_to_iso(obj.get("updated_at")),
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -400,7 +752,10 @@ def update_document(
         cfg = _resolve_kb_config(deps, app_id, kb_key)
         collection = _ensure_collection(deps, cfg)
 
+        existing = _existing_apps(deps, cfg, collection, doc_id, app_id)
         props, vector = _resolve_text_and_vector(cfg, req, deps, app_id)
+        _normalize_allowed_apps(deps, collection, props)
+        _merge_allowed_apps(deps, collection, props, existing)
         deps.datasource.weaviate.update(
             collection=collection,
             object_id=doc_id,
@@ -427,6 +782,8 @@ def update_document(
             created_at=_to_iso(obj.get("created_at")),
             updated_at=_to_iso(obj.get("updated_at")),
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -443,8 +800,26 @@ def delete_document(
         ensure_app_owner(deps, app_id, wallet_id)
         cfg = _resolve_kb_config(deps, app_id, kb_key)
         collection = _ensure_collection(deps, cfg)
+        docs = deps.datasource.kb_documents
+        remaining = [a for a in _existing_apps(deps, cfg, collection, doc_id, app_id) or [] if a != app_id]
+        docs.drop_refs_to([doc_id], app_id=app_id)
+        if remaining:
+            # 其它 app 仍在使用这份对象：只把当前 app 从 allowed_apps 去掉，向量保留
+            deps.datasource.weaviate.update(
+                collection=collection,
+                object_id=doc_id,
+                properties={"allowed_apps": allowed_apps_value(deps.datasource.weaviate, collection, remaining)},
+            )
+            row = docs.get(doc_id)
+            if row and row.get("app_id") == app_id and row.get("status") == "active":
+                # 元数据行归当前 app：转给仍在使用的 app（有其引用时），否则标记删除
+                if docs.promote_ref(doc_id, app_id=app_id) is None:
+                    docs.mark_deleted(doc_id)
+            return {"status": "ok", "remaining_apps": remaining}
         deps.datasource.weaviate.delete_by_id(collection, doc_id)
-        deps.datasource.kb_documents.mark_deleted(doc_id)
+        docs.mark_deleted(doc_id)
         return {"status": "ok"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -10,6 +10,7 @@ from api.schemas.query import QueryRequest, QueryResponse
 from api.deps import get_deps
 from api.routers.kb import _ensure_collection, _text_field_from_cfg, _resolve_kb_config
 from api.routers.owner import is_super_admin
+from core.kb.kb_manager import allowed_apps_filter, kb_return_fields
 
 router = APIRouter()
 
@@ -81,6 +82,11 @@ def _extract_text_from_raw(raw: str) -> str:
     return text
 
 
+def _lookup_fields(kb_cfg: dict) -> list[str]:
+    """按 resume_id/jd_id 直取 user_upload 单条时只需要正文字段（正文为空时回退解析 metadata_json）。"""
+    return [_text_field_from_cfg(kb_cfg), "metadata_json"]
+
+
 def _extract_top_kb_text(docs: list, kb_cfg: dict) -> str:
     if not docs:
         return ""
@@ -169,12 +175,13 @@ def query(req: QueryRequest, deps=Depends(get_deps)):
                     else:
                         filters["wallet_id"] = req.wallet_id
                     if kb_cfg.get("use_allowed_apps_filter"):
-                        filters["allowed_apps"] = req.app_id
+                        filters["allowed_apps"] = allowed_apps_filter(req.app_id)
                     docs = deps.datasource.weaviate.fetch_objects(
                         collection,
                         limit=1,
                         offset=0,
                         filters=filters,
+                        return_properties=_lookup_fields(kb_cfg),
                     )
                     if docs:
                         props = docs[0].get("properties") or {}
@@ -203,12 +210,13 @@ def query(req: QueryRequest, deps=Depends(get_deps)):
                     else:
                         filters["wallet_id"] = req.wallet_id
                     if kb_cfg.get("use_allowed_apps_filter"):
-                        filters["allowed_apps"] = req.app_id
+                        filters["allowed_apps"] = allowed_apps_filter(req.app_id)
                     docs = deps.datasource.weaviate.fetch_objects(
                         collection,
                         limit=1,
                         offset=0,
                         filters=filters,
+                        return_properties=_lookup_fields(kb_cfg),
                     )
                     if docs:
                         jd_text = _extract_top_kb_text(docs, kb_cfg)
@@ -253,7 +261,8 @@ def query(req: QueryRequest, deps=Depends(get_deps)):
                             collection=collection,
                             query_vector=qvec,
                             top_k=max(top_k, 1),
-                            filters={"allowed_apps": req.app_id} if kb_cfg.get("use_allowed_apps_filter") else None,
+                            filters={"allowed_apps": allowed_apps_filter(req.app_id)} if kb_cfg.get("use_allowed_apps_filter") else None,
+                            return_properties=kb_return_fields(kb_cfg),
                         )
                         filtered = []
                         for h in hits or []:
@@ -14,6 +14,7 @@ from api.kb_meta import infer_file_type, sha256_text
 from api.routers.kb import _ensure_collection, _resolve_kb_config, _text_field_from_cfg
 from api.schemas.resume import ResumeUploadRequest, ResumeUploadResponse
 from api.routers.private_db_utils import resolve_private_db_id
+from core.kb.kb_manager import allowed_apps_value
 from datasource.objectstores.path_builder import PathBuilder
 
 
@@ -113,7 +114,7 @@ def upload_resume(req: ResumeUploadRequest, deps=Depends(get_deps)):
             combined = {"resume": req.resume, "metadata": req.metadata}
             props["metadata_json"] = _serialize_payload(combined)
         if cfg.get("use_allowed_apps_filter"):
-            props["allowed_apps"] = req.app_id
+            props["allowed_apps"] = allowed_apps_value(deps.datasource.weaviate, collection, [req.app_id])
 
         vector = deps.embedding_client.embed_one(resume_text, app_id=req.app_id)
         doc_id = deps.datasource.weaviate.upsert(
@@ -3,8 +3,8 @@
 
 from fastapi import APIRouter, Depends
 
-from api.deps import get_deps
-from api.schemas.stores import StoresHealthResponse, StoreHealthItem
+from api.deps import get_deps, get_ingestion_workers, get_kb_count_reconciler, get_parser_registry
+from api.schemas.stores import StoresHealthResponse, StoreHealthItem, StoresMetricsResponse
 
 router = APIRouter(prefix="/stores", tags=["stores"])
 
@@ -44,3 +44,26 @@ def stores_health(deps=Depends(get_deps)):
         stores.append(StoreHealthItem(name="llm", status="disabled", details="OPENAI_API_KEY missing"))
 
     return StoresHealthResponse(stores=stores)
+
+
+@router.get("/metrics", response_model=StoresMetricsResponse)
+def stores_metrics(deps=Depends(get_deps)):
+    metrics = {}
+
+    # MinIO 读缓存
+    if deps.datasource.minio:
+        metrics["minio_cache"] = deps.datasource.minio.cache_stats() or {"enabled": False}
+
+    # Weaviate schema 缓存（命中 / 拉取 schema 次数 / 漂移修复）
+    if deps.datasource.weaviate:
+        metrics["weaviate_schema"] = deps.datasource.weaviate.schema.metrics()
+        # KB 计数对账（对账次数 / 发现漂移的范围数 / 最近一次耗时）
+        metrics["kb_count_reconcile"] = get_kb_count_reconciler().metrics()
+
+    # 后台摄取 worker（队列深度 / 领取延迟 / 吞吐）
+    metrics["ingestion_workers"] = get_ingestion_workers().metrics()
+
+    # 文档解析（按文件类型的耗时 / 进程池 / 超时）
+    metrics["parsers"] = get_parser_registry().metrics()
+
+    return StoresMetricsResponse(metrics=metrics)
@@ -18,6 +18,7 @@ class IngestionJobCreate(BaseModel):
     file_type: Optional[str] = Field(None, description="Optional file type override")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="Optional metadata")
     options: Dict[str, Any] = Field(default_factory=dict, description="Job options")
+    priority: int = Field(0, ge=-100, le=100, description="租户内优先级，越大越先（不影响跨租户公平）")
 
     @model_validator(mode="after")
     def validate_source(self) -> "IngestionJobCreate":
@@ -37,6 +38,9 @@ class IngestionJobInfo(BaseModel):
     source_url: Optional[str] = None
     file_type: Optional[str] = None
     status: str
+    priority: int = 0
+    attempts: int = 0
+    batch_id: Optional[str] = None
     options_json: Optional[str] = None
     result_json: Optional[str] = None
     error_message: Optional[str] = None
@@ -46,6 +50,86 @@ class IngestionJobInfo(BaseModel):
     finished_at: Optional[str] = None
 
 
+class IngestionJobBatchSource(BaseModel):
+    source_url: str = Field(..., description="MinIO URL (minio://bucket/key)")
+    file_type: Optional[str] = Field(None, description="Optional file type override")
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="Per-source metadata (merged over batch metadata)")
+
+
+class IngestionJobBatchCreate(BaseModel):
+    wallet_id: str = Field(..., description="开发者钱包 ID")
+    data_wallet_id: Optional[str] = Field(None, description="数据归属钱包 ID（业务用户）")
+    private_db_id: Optional[str] = Field(None, description="私有库 ID（session_id 二选一）")
+    session_id: Optional[str] = Field(None, description="业务会话 ID（私有库绑定）")
+    app_id: str = Field(..., description="Plugin app_id")
+    kb_key: str = Field(..., description="KB key")
+    sources: List[IngestionJobBatchSource] = Field(default_factory=list, description="逐个列出的来源")
+    prefix: Optional[str] = Field(None, description="MinIO 前缀（minio://bucket/prefix/），展开为前缀下全部对象")
+    file_types: List[str] = Field(default_factory=list, description="按扩展名过滤 prefix 展开结果（为空不过滤）")
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="Batch metadata")
+    options: Dict[str, Any] = Field(default_factory=dict, description="Job options")
+    priority: int = Field(0, ge=-100, le=100, description="租户内优先级，越大越先")
+
+    @model_validator(mode="after")
+    def validate_sources(self) -> "IngestionJobBatchCreate":
+        if not self.sources and not self.prefix:
+            raise ValueError("sources or prefix is required")
+        return self
+
+
+class IngestionJobBatchInfo(BaseModel):
+    batch_id: str
+    wallet_id: str
+    app_id: str
+    kb_key: str
+    source_prefix: Optional[str] = None
+    total: int = 0
+    pending: int = 0
+    running: int = 0
+    success: int = 0
+    failed: int = 0
+    deduped: int = Field(0, description="内容去重跳过的作业数（计入 success）")
+    done: int = 0
+    progress: float = 0.0
+    status: str = "pending"
+    created_at: Optional[str] = None
+
+
+class IngestionJobSyncCreate(BaseModel):
+    wallet_id: str = Field(..., description="开发者钱包 ID")
+    data_wallet_id: Optional[str] = Field(None, description="数据归属钱包 ID（业务用户）")
+    private_db_id: Optional[str] = Field(None, description="私有库 ID（session_id 二选一）")
+    session_id: Optional[str] = Field(None, description="业务会话 ID（私有库绑定）")
+    app_id: str = Field(..., description="Plugin app_id")
+    kb_key: str = Field(..., description="KB key")
+    prefix: Optional[str] = Field(None, description="MinIO 前缀（minio://bucket/prefix/）；为空时取该 KB 的上传目录")
+    file_types: List[str] = Field(default_factory=list, description="按扩展名过滤（为空不过滤）")
+    delete_removed: bool = Field(True, description="前缀下已删除的对象同步删除其向量")
+    allow_empty: bool = Field(False, description="前缀列不出任何对象时仍执行删除（默认跳过，防止误清空）")
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="入队作业的 metadata")
+    options: Dict[str, Any] = Field(default_factory=dict, description="入队作业的 Job options")
+    priority: int = Field(0, ge=-100, le=100, description="租户内优先级（同步作业及其入队作业共用）")
+
+
+class IngestionSyncStateInfo(BaseModel):
+    sync_key: str
+    wallet_id: str
+    app_id: str
+    kb_key: str
+    data_wallet_id: Optional[str] = None
+    private_db_id: Optional[str] = None
+    source_prefix: str
+    watermark: Optional[str] = Field(None, description="上次同步见到的最大 last_modified（UTC）")
+    last_job_id: Optional[int] = None
+    last_batch_id: Optional[str] = None
+    last_synced_at: Optional[str] = None
+    stats_json: Optional[str] = None
+
+
+class IngestionSyncStateList(BaseModel):
+    items: List[IngestionSyncStateInfo] = Field(default_factory=list)
+
+
 class IngestionJobRunItem(BaseModel):
     id: int
     job_id: int
@@ -33,6 +33,7 @@ class KBDocument(BaseModel):
 class KBDocumentList(BaseModel):
     items: List[KBDocument] = Field(default_factory=list)
     total: Optional[int] = None
+    next_cursor: Optional[str] = Field(None, description="下一页游标；为空表示没有更多")
 
 
 class KBDocumentUpsert(BaseModel):
@@ -46,3 +47,23 @@ class KBDocumentUpdate(BaseModel):
     text: Optional[str] = Field(None, description="Text content for embedding")
     properties: Dict[str, Any] = Field(default_factory=dict)
     vector: Optional[List[float]] = None
+
+
+class KBDocumentBatchUpsert(BaseModel):
+    items: List[KBDocumentUpsert] = Field(..., min_length=1, description="Documents to upsert")
+    return_objects: bool = Field(False, description="写入后回读对象（默认只返回 id，省掉逐条读取）")
+
+
+class KBDocumentBatchItem(BaseModel):
+    index: int = Field(..., description="在请求 items 中的位置")
+    id: Optional[str] = None
+    status: str = Field(..., description="ok / error")
+    error: Optional[str] = None
+    document: Optional[KBDocument] = None
+
+
+class KBDocumentBatchResult(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    items: List[KBDocumentBatchItem] = Field(default_factory=list)
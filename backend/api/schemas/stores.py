@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -11,3 +11,7 @@ class StoreHealthItem(BaseModel):
 
 class StoresHealthResponse(BaseModel):
     stores: List[StoreHealthItem]
+
+
+class StoresMetricsResponse(BaseModel):
+    metrics: Dict[str, Any] = Field(default_factory=dict, description="Per-component runtime metrics")
@@ -4,12 +4,17 @@
 from __future__ import annotations
 
 import json
+import uuid
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 
+from api.deps import get_parser_registry
 from api.kb_meta import infer_file_type
 from api.routers.kb import _ensure_collection, _resolve_kb_config, _text_field_from_cfg
-from core.ingestion.parser_registry import ParsedDocument, default_registry
+from core.ingestion.parser_registry import ParsedDocument
+from core.kb.chunker import TextChunker
+from core.kb.kb_builder import BuildItem, build_items
+from core.kb.kb_manager import allowed_apps_value
 
 
 def _parse_minio_url(source_url: str, default_bucket: str) -> Tuple[str, str]:
@@ -39,6 +44,247 @@ def _clip_text(text: str, max_chars: Optional[int]) -> str:
     return text[:max_chars]
 
 
+def _clip_segments(segments: Iterable[str], max_chars: Optional[int]) -> Iterator[str]:
+    if not max_chars or max_chars <= 0:
+        yield from segments
+        return
+    left = max_chars
+    for seg in segments:
+        if len(seg) >= left:
+            yield seg[:left]
+            return
+        left -= len(seg)
+        yield seg
+
+
+def _option_bool(options: dict, key: str, default: bool) -> bool:
+    val = options.get(key)
+    if val is None:
+        return default
+    if isinstance(val, str):
+        return val.strip().lower() in ("1", "true", "yes", "on")
+    return bool(val)
+
+
+def _option_int(options: dict, key: str, default: int) -> int:
+    try:
+        return int(options[key])
+    except Exception:
+        return default
+
+
+def _dedupe_hit(
+    deps,
+    job: dict,
+    *,
+    scope: dict,
+    content_sha256: Optional[str],
+    collection: str,
+    source_url: str,
+    metadata: dict,
+    relink: bool,
+    stage: str,
+    source_meta: Optional[dict] = None,
+) -> Optional[dict]:
+    """
+    同范围内已有相同内容的 active 文档时返回去重结果（不下载/不向量化/不写向量）。
+    新来源记为指向已有文档的引用（带 ETag/大小），前缀同步据此判断它未变；已有文档的 source_url 不动。
+    relink=True 时把 metadata 合并到已有文档上（只改 properties，不重算向量）。
+    """
+    if not content_sha256:
+        return None
+    existing = deps.datasource.kb_documents.find_active_by_hash(content_sha256=content_sha256, **scope)
+    if not existing:
+        return None
+
+    # 切块写入的文档以 parent_doc_id 为文档 ID，向量对象是各个块
+    parent_doc_id = existing.get("parent_doc_id")
+    doc_id = str(parent_doc_id or existing["doc_id"])
+    if relink:
+        object_ids = (
+            deps.datasource.kb_documents.list_chunk_ids(parent_doc_id) if parent_doc_id else [doc_id]
+        )
+        for object_id in object_ids:
+            props = deps.datasource.weaviate.get_properties_by_id(collection, object_id)
+            if props is None:
+                # 元数据说有、向量库里没有：不算命中，走完整摄取把它补回来
+                return None
+            try:
+                merged = json.loads(props.get("metadata_json") or "{}")
+            except Exception:
+                merged = {}
+            merged.update(metadata or {})
+            deps.datasource.weaviate.update(
+                collection,
+                object_id,
+                properties={"metadata_json": json.dumps(merged, ensure_ascii=False)},
+            )
+
+    if source_url == existing.get("source_url"):
+        if source_meta:
+            deps.datasource.kb_documents.set_source_columns(doc_id, **_source_columns(source_meta))
+    else:
+        deps.datasource.kb_documents.upsert_ref(
+            ref_id=_parent_doc_id(collection, scope, source_url),
+            doc_id=doc_id,
+            source_url=source_url,
+            source_type="ingestion_job",
+            source_id=str(job.get("id") or ""),
+            file_type=existing.get("file_type"),
+            content_sha256=content_sha256,
+            **_source_columns(source_meta),
+            **scope,
+        )
+
+    return {
+        "job_id": int(job.get("id") or 0),
+        "doc_id": doc_id,
+        "collection": collection,
+        "kb_key": scope["kb_key"],
+        "file_type": existing.get("file_type"),
+        "source_url": source_url,
+        "deduped": True,
+        "dedupe_stage": stage,
+        "dedupe_of": existing.get("source_url"),
+        "relinked": relink,
+        "content_sha256": content_sha256,
+    }
+
+
+def _claim_source(deps, scope: dict, source_url: str, doc_id: str) -> None:
+    """
+    来源写入了自己的向量：撤掉它原来指向其它文档的引用；
+    指向本文档的引用作废（内容可能已变，那些来源下次同步时重新摄取/去重）。
+    """
+    deps.datasource.kb_documents.drop_source_refs(source_urls=[source_url], **scope)
+    deps.datasource.kb_documents.drop_refs_to([doc_id])
+
+
+def _parent_doc_id(collection: str, scope: dict, source_url: str) -> str:
+    """同一范围 + 同一来源得到固定的文档 ID，重跑作业会覆盖而不是新增。"""
+    key = "|".join(
+        [collection, scope["app_id"], scope["kb_key"], scope["wallet_id"] or "", scope["private_db_id"] or "", source_url]
+    )
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def _chunk_id(parent_doc_id: str, ordinal: int) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{parent_doc_id}#{ordinal}"))
+
+
+def _chunk_items(
+    chunker: TextChunker,
+    text: Union[str, Iterable[str]],
+    *,
+    text_field: str,
+    parent_doc_id: str,
+    base_props: dict,
+    metadata: dict,
+) -> Iterator[BuildItem]:
+    for c in chunker.chunks(text):
+        meta = dict(metadata)
+        if c.heading:
+            meta["chunk_heading"] = c.heading
+        yield BuildItem(
+            object_id=_chunk_id(parent_doc_id, c.ordinal),
+            text=c.text,
+            properties={
+                **base_props,
+                text_field: c.text,
+                "metadata_json": json.dumps(meta, ensure_ascii=False),
+                "parent_doc_id": parent_doc_id,
+                "chunk_index": c.ordinal,
+            },
+        )
+
+
+def _write_chunks(
+    deps,
+    *,
+    text: Union[str, Iterable[str]],
+    chunker: TextChunker,
+    collection: str,
+    text_field: str,
+    parent_doc_id: str,
+    base_props: dict,
+    metadata: dict,
+    doc_row: dict,
+) -> Tuple[int, int, dict]:
+    """
+    切块 -> 分批向量化 -> 批量写入 Weaviate + kb_documents（KBBuilder 流水线，embed 与 write 重叠）。
+    text 可以是文本片段迭代器（分段解析），切块与写入边读边进行。
+    返回 (写入块数, 清理的旧块数, 阶段报告)；旧块指上次摄取同一来源时多出来的尾部块。
+    """
+    settings = deps.settings
+
+    def on_written(items: List[BuildItem]) -> None:
+        deps.datasource.kb_documents.upsert_many(
+            {
+                **doc_row,
+                "doc_id": i.object_id,
+                "parent_doc_id": parent_doc_id,
+                "chunk_index": i.properties["chunk_index"],
+            }
+            for i in items
+        )
+
+    result, stages = build_items(
+        _chunk_items(
+            chunker, text, text_field=text_field, parent_doc_id=parent_doc_id,
+            base_props=base_props, metadata=metadata,
+        ),
+        embedding_client=deps.embedding_client,
+        weaviate_store=deps.datasource.weaviate,
+        collection=collection,
+        app_id=doc_row["app_id"],
+        batch_size=max(settings.ingestion_embed_batch_size, 1),
+        embed_workers=max(settings.ingestion_embed_workers, 1),
+        on_written=on_written,
+    )
+    if not result.ok:
+        raise RuntimeError(f"chunk write failed: written={result.written}/{result.items} err={result.error}")
+
+    written = result.written
+    if written == 0:
+        # 不清理旧块：空解析结果多半是上游问题，保留原有内容
+        raise ValueError("parsed text is empty")
+    stale = deps.datasource.kb_documents.list_chunk_ids(parent_doc_id, from_index=written)
+    removed = 0
+    if stale:
+        res = deps.datasource.weaviate.delete_by_ids(collection, stale)
+        failed = set(res.failed_ids)
+        deps.datasource.kb_documents.mark_deleted_many(i for i in stale if i not in failed)
+        removed = len(stale) - len(failed)
+    return written, removed, stages
+
+
+def _object_meta(deps, bucket: str, key: str) -> dict:
+    """下载前先 stat：ETag/大小记入 kb_documents（前缀同步比对），大小决定是否分段解析。"""
+    try:
+        return deps.datasource.minio.stat(bucket, key) or {}
+    except Exception:
+        return {}
+
+
+def _source_columns(meta: Optional[dict]) -> dict:
+    meta = meta or {}
+    return {
+        "source_etag": meta.get("etag") or None,
+        "source_size": int(meta["size"]) if meta.get("size") is not None else None,
+    }
+
+
+def _unchanged_since_enqueue(options: dict, source_meta: Optional[dict]) -> bool:
+    """对象的 ETag/大小与入队时记录的一致：入队时算的内容哈希仍然可信。"""
+    recorded = options.get("source_stat")
+    if not isinstance(recorded, dict) or not source_meta or not recorded.get("etag"):
+        return False
+    if str(recorded.get("etag")) != str(source_meta.get("etag") or ""):
+        return False
+    size = recorded.get("size")
+    return size is None or source_meta.get("size") is None or int(size) == int(source_meta["size"])
+
+
 def _normalize_parsed(
     parsed: ParsedDocument, fallback_file_type: Optional[str]
 ) -> ParsedDocument:
@@ -47,138 +293,285 @@ def _normalize_parsed(
     return parsed
 
 
-def run_ingestion_job(job_id: int, deps) -> dict:
-    job = deps.datasource.ingestion_jobs.get(job_id)
-    if not job:
-        raise ValueError(f"ingestion_job not found: id={job_id}")
+def execute_ingestion_job(job: dict, deps) -> dict:
+    """
+    执行单个作业（只做解析 -> 向量化 -> 写入，不修改作业状态）
+    状态流转由调用方负责：内联执行见 run_ingestion_job，后台执行见 IngestionWorkerPool。
+    """
+    if str(job.get("job_type") or "") == "kb_sync":
+        # 延迟导入：prefix_sync 复用本模块的工具函数
+        from core.ingestion.prefix_sync import execute_sync_job
 
-    status = str(job.get("status") or "")
-    if status == "running":
-        raise RuntimeError(f"ingestion_job {job_id} is already running")
+        return execute_sync_job(job, deps)
 
-    deps.datasource.ingestion_jobs.mark_running(job_id)
-    deps.datasource.ingestion_jobs.append_run(
-        job_id=job_id, status="running", message="job started"
-    )
+    job_id = int(job.get("id") or 0)
+    app_id = str(job.get("app_id") or "")
+    kb_key = str(job.get("kb_key") or "")
+    wallet_id = str(job.get("wallet_id") or "")
+    source_url = str(job.get("source_url") or "")
+    if not app_id or not kb_key or not wallet_id:
+        raise ValueError("job missing app_id/kb_key/wallet_id")
+    if not source_url:
+        raise ValueError("job missing source_url")
+    if not deps.datasource.minio:
+        raise RuntimeError("MinIO is not enabled")
+    if not deps.datasource.weaviate:
+        raise RuntimeError("Weaviate is not enabled")
 
-    try:
-        app_id = str(job.get("app_id") or "")
-        kb_key = str(job.get("kb_key") or "")
-        wallet_id = str(job.get("wallet_id") or "")
-        source_url = str(job.get("source_url") or "")
-        if not app_id or not kb_key or not wallet_id:
-            raise ValueError("job missing app_id/kb_key/wallet_id")
-        if not source_url:
-            raise ValueError("job missing source_url")
-        if not deps.datasource.minio:
-            raise RuntimeError("MinIO is not enabled")
-        if not deps.datasource.weaviate:
-            raise RuntimeError("Weaviate is not enabled")
-
-        cfg = _resolve_kb_config(deps, app_id, kb_key)
-        kb_type = str(cfg.get("type") or "").strip()
-        data_wallet_id = str(job.get("data_wallet_id") or "")
-        private_db_id = str(job.get("private_db_id") or "")
-        owner_wallet_id = data_wallet_id or wallet_id
-        if kb_type != "user_upload":
-            owner_wallet_id = ""
-
-        options = _load_job_options(job.get("options_json"))
-        max_chars = options.get("max_chars")
-        if max_chars is not None:
-            try:
-                max_chars = int(max_chars)
-            except Exception:
-                max_chars = None
+    cfg = _resolve_kb_config(deps, app_id, kb_key)
+    kb_type = str(cfg.get("type") or "").strip()
+    data_wallet_id = str(job.get("data_wallet_id") or "")
+    private_db_id = str(job.get("private_db_id") or "")
+    owner_wallet_id = data_wallet_id or wallet_id
+    if kb_type != "user_upload":
+        owner_wallet_id = ""
 
-        bucket, key = _parse_minio_url(source_url, deps.datasource.bucket)
-        raw = deps.datasource.minio.get_bytes(bucket=bucket, key=key)
-        file_type = str(job.get("file_type") or "") or infer_file_type(source_url)
+    options = _load_job_options(job.get("options_json"))
+    max_chars = options.get("max_chars")
+    if max_chars is not None:
+        try:
+            max_chars = int(max_chars)
+        except Exception:
+            max_chars = None
+
+    extra_meta = options.get("metadata")
+    if not isinstance(extra_meta, dict):
+        extra_meta = {}
 
-        registry = default_registry()
-        parsed = _normalize_parsed(
-            registry.parse(raw, file_type, filename=Path(key).name),
-            file_type,
+    # 去重：同 app/kb/钱包/私有库内已有相同内容 -> 跳过向量化
+    dedupe = _option_bool(options, "dedupe", deps.settings.ingestion_dedupe)
+    relink = _option_bool(options, "relink_metadata", False)
+    scope = {
+        "app_id": app_id,
+        "kb_key": kb_key,
+        "wallet_id": owner_wallet_id or None,
+        "private_db_id": private_db_id or None,
+    }
+    collection = str(cfg.get("collection") or "")
+    bucket, key = _parse_minio_url(source_url, deps.datasource.bucket)
+    source_meta = _object_meta(deps, bucket, key)
+    pre_checked = False
+    if dedupe and job.get("content_sha256") and _unchanged_since_enqueue(options, source_meta):
+        # 入队时已知哈希（内联 content）且对象之后没被覆盖：连下载都省掉
+        pre_checked = True
+        hit = _dedupe_hit(
+            deps, job, scope=scope, content_sha256=job.get("content_sha256"), collection=collection,
+            source_url=source_url, metadata=extra_meta, relink=relink, stage="pre_download",
+            source_meta=source_meta,
         )
-        text = _clip_text(parsed.text or "", max_chars)
-        if not text:
-            raise ValueError("parsed text is empty")
+        if hit:
+            return hit
 
-        collection = _ensure_collection(deps, cfg)
-        text_field = _text_field_from_cfg(cfg)
+    file_type = str(job.get("file_type") or "") or infer_file_type(source_url)
 
-        metadata = parsed.metadata or {}
-        extra_meta = options.get("metadata")
-        if isinstance(extra_meta, dict):
-            metadata.update(extra_meta)
+    settings = deps.settings
+    chunking = _option_bool(options, "chunking", settings.ingestion_chunking)
+    registry = get_parser_registry()
+    segments = None
+    if chunking and registry.supports_segments(file_type) and int(source_meta.get("size") or 0) >= max(
+        settings.ingestion_stream_min_bytes, 0
+    ):
+        # 大文件：分段解析直接喂给切块器，全程不持有整份文本；内容哈希要读完才知道
+        chunks = deps.datasource.minio.get_stream(bucket=bucket, key=key)
+        segments = registry.parse_segments(chunks, file_type, filename=Path(key).name)
+        parsed = ParsedDocument(text="", metadata=segments.metadata, file_type=file_type)
+    elif registry.supports_stream(file_type):
+        # 流式：分块读取 MinIO 并增量解析，不持有整份原始字节（解析出的文本仍是整份）
+        chunks = deps.datasource.minio.get_stream(bucket=bucket, key=key)
+        parsed = registry.parse_stream(chunks, file_type, filename=Path(key).name)
+    else:
+        raw = deps.datasource.minio.get_bytes(bucket=bucket, key=key)
+        parsed = registry.parse(raw, file_type, filename=Path(key).name)
+    parsed = _normalize_parsed(parsed, file_type)
 
-        props = {
-            text_field: text,
-            "source_url": source_url,
-            "file_type": parsed.file_type,
-            "metadata_json": json.dumps(metadata, ensure_ascii=False),
-        }
-        if kb_type == "user_upload":
-            if private_db_id:
-                props["private_db_id"] = private_db_id
-            props["wallet_id"] = owner_wallet_id
-        if cfg.get("use_allowed_apps_filter"):
-            props["allowed_apps"] = app_id
-
-        vector = deps.embedding_client.embed_one(text, app_id=app_id)
-        doc_id = deps.datasource.weaviate.upsert(
-            collection=collection,
-            vector=vector,
-            properties=props,
+    metadata = dict(parsed.metadata or {})
+    metadata.update(extra_meta)
+    if dedupe and parsed.content_sha256 and not (pre_checked and parsed.content_sha256 == job.get("content_sha256")):
+        # 解析后才知道哈希（MinIO 来源 / 对象在入队后被覆盖）：省掉向量化与写入
+        hit = _dedupe_hit(
+            deps, job, scope=scope, content_sha256=parsed.content_sha256, collection=collection,
+            source_url=source_url, metadata=metadata, relink=relink, stage="post_parse",
+            source_meta=source_meta,
         )
+        if hit:
+            return hit
 
-        deps.datasource.kb_documents.upsert(
-            doc_id=str(doc_id),
-            app_id=app_id,
-            kb_key=kb_key,
-            wallet_id=owner_wallet_id or None,
-            private_db_id=private_db_id or None,
-            source_url=source_url,
-            source_type="ingestion_job",
-            source_id=str(job_id),
-            file_type=parsed.file_type,
-            content_sha256=parsed.content_sha256,
+    text = _clip_text(parsed.text or "", max_chars)
+    if not text and segments is None:
+        raise ValueError("parsed text is empty")
+
+    collection = _ensure_collection(deps, cfg, wait=deps.datasource.weaviate.create_timeout_seconds)
+    text_field = _text_field_from_cfg(cfg)
+
+    props = {
+        text_field: text,
+        "source_url": source_url,
+        "file_type": parsed.file_type,
+        "metadata_json": json.dumps(metadata, ensure_ascii=False),
+    }
+    if kb_type == "user_upload":
+        if private_db_id:
+            props["private_db_id"] = private_db_id
+        props["wallet_id"] = owner_wallet_id
+    if cfg.get("use_allowed_apps_filter"):
+        # 作业选项 allowed_apps 可额外授权其它 app，一份向量多 app 可见（不必按 app 各写一份）
+        extra = options.get("allowed_apps") or []
+        props["allowed_apps"] = allowed_apps_value(
+            deps.datasource.weaviate, collection, [app_id, *([extra] if isinstance(extra, str) else extra)]
         )
 
-        result = {
+    if chunking:
+        chunker = TextChunker(
+            _option_int(options, "chunk_size", settings.ingestion_chunk_size),
+            _option_int(options, "chunk_overlap", settings.ingestion_chunk_overlap),
+        )
+        parent_doc_id = _parent_doc_id(collection, scope, source_url)
+        base_props = {k: v for k, v in props.items() if k not in (text_field, "metadata_json")}
+        chunk_count, stale_removed, stages = _write_chunks(
+            deps,
+            text=_clip_segments(segments, max_chars) if segments is not None else text,
+            chunker=chunker,
+            collection=collection,
+            text_field=text_field,
+            parent_doc_id=parent_doc_id,
+            base_props=base_props,
+            metadata=metadata,
+            doc_row={
+                **scope,
+                "source_url": source_url,
+                "source_type": "ingestion_job",
+                "source_id": str(job_id),
+                "file_type": parsed.file_type,
+                "content_sha256": parsed.content_sha256,
+                **_source_columns(source_meta),
+            },
+        )
+        out = {
             "job_id": job_id,
-            "doc_id": str(doc_id),
+            "doc_id": parent_doc_id,
             "collection": collection,
             "kb_key": kb_key,
             "file_type": parsed.file_type,
             "source_url": source_url,
+            "chunks": chunk_count,
+            "chunk_size": chunker.chunk_size,
+            "stale_chunks_deleted": stale_removed,
+            "stages": stages,
         }
-        deps.datasource.ingestion_jobs.mark_success(job_id, result=result)
-        deps.datasource.ingestion_jobs.append_run(
-            job_id=job_id, status="success", message="job completed", meta=result
-        )
-        deps.datasource.ingestion_logs.create(
-            status="success",
-            message="ingestion job completed",
-            wallet_id=wallet_id,
-            app_id=app_id,
-            kb_key=kb_key,
-            collection=collection,
-            meta={"job_id": job_id},
-        )
-        return result
+        _claim_source(deps, scope, source_url, parent_doc_id)
+        if segments is not None:
+            # 写入时哈希未知，读完后回填，后续作业的去重才能命中
+            if segments.content_sha256:
+                deps.datasource.kb_documents.set_content_sha256(parent_doc_id, segments.content_sha256)
+            out.update({
+                "streamed": True,
+                "bytes": segments.bytes,
+                "chars": segments.chars,
+                "content_sha256": segments.content_sha256,
+            })
+        return out
+
+    vector = deps.embedding_client.embed_one(text, app_id=app_id)
+    doc_id = deps.datasource.weaviate.upsert(
+        collection=collection,
+        vector=vector,
+        properties=props,
+    )
+
+    deps.datasource.kb_documents.upsert(
+        doc_id=str(doc_id),
+        app_id=app_id,
+        kb_key=kb_key,
+        wallet_id=owner_wallet_id or None,
+        private_db_id=private_db_id or None,
+        source_url=source_url,
+        source_type="ingestion_job",
+        source_id=str(job_id),
+        file_type=parsed.file_type,
+        content_sha256=parsed.content_sha256,
+        **_source_columns(source_meta),
+    )
+    _claim_source(deps, scope, source_url, str(doc_id))
+
+    return {
+        "job_id": job_id,
+        "doc_id": str(doc_id),
+        "collection": collection,
+        "kb_key": kb_key,
+        "file_type": parsed.file_type,
+        "source_url": source_url,
+    }
+
+
+def record_job_success(job: dict, result: dict, deps, *, lease_owner: Optional[str] = None) -> bool:
+    job_id = int(job.get("id") or 0)
+    if not deps.datasource.ingestion_jobs.mark_success(job_id, result=result, lease_owner=lease_owner):
+        return False
+    deduped = bool(result.get("deduped"))
+    if result.get("sync"):
+        message = f"sync completed: enqueued={result.get('enqueued', 0)} removed={result.get('removed_sources', 0)}"
+    elif deduped:
+        message = "job skipped (duplicate content)"
+    else:
+        message = "job completed"
+    deps.datasource.ingestion_jobs.append_run(
+        job_id=job_id,
+        status="success",
+        message=message,
+        meta=result,
+    )
+    deps.datasource.ingestion_logs.create(
+        status="success",
+        message="ingestion job deduped" if deduped else (
+            "ingestion sync completed" if result.get("sync") else "ingestion job completed"
+        ),
+        wallet_id=job.get("wallet_id"),
+        app_id=job.get("app_id"),
+        kb_key=job.get("kb_key"),
+        collection=result.get("collection"),
+        meta={"job_id": job_id, "deduped": deduped},
+    )
+    return True
+
+
+def record_job_failure(job: dict, error: str, deps, *, lease_owner: Optional[str] = None) -> bool:
+    job_id = int(job.get("id") or 0)
+    if not deps.datasource.ingestion_jobs.mark_failed(job_id, error, lease_owner=lease_owner):
+        return False
+    deps.datasource.ingestion_jobs.append_run(
+        job_id=job_id, status="failed", message=error
+    )
+    deps.datasource.ingestion_logs.create(
+        status="failed",
+        message=error,
+        wallet_id=job.get("wallet_id"),
+        app_id=job.get("app_id"),
+        kb_key=job.get("kb_key"),
+        collection=None,
+        meta={"job_id": job_id},
+    )
+    return True
+
+
+def run_ingestion_job(job_id: int, deps) -> dict:
+    """内联执行（在调用线程内跑完）；未启用后台 worker 时使用。"""
+    job = deps.datasource.ingestion_jobs.get(job_id)
+    if not job:
+        raise ValueError(f"ingestion_job not found: id={job_id}")
+
+    status = str(job.get("status") or "")
+    if status == "running":
+        raise RuntimeError(f"ingestion_job {job_id} is already running")
+
+    deps.datasource.ingestion_jobs.mark_running(job_id)
+    deps.datasource.ingestion_jobs.append_run(
+        job_id=job_id, status="running", message="job started"
+    )
+
+    try:
+        result = execute_ingestion_job(job, deps)
     except Exception as e:
-        deps.datasource.ingestion_jobs.mark_failed(job_id, str(e))
-        deps.datasource.ingestion_jobs.append_run(
-            job_id=job_id, status="failed", message=str(e)
-        )
-        deps.datasource.ingestion_logs.create(
-            status="failed",
-            message=str(e),
-            wallet_id=job.get("wallet_id"),
-            app_id=job.get("app_id"),
-            kb_key=job.get("kb_key"),
-            collection=None,
-            meta={"job_id": job_id},
-        )
+        record_job_failure(job, str(e), deps)
         raise
+    record_job_success(job, result, deps)
+    return result
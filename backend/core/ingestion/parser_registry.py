@@ -1,12 +1,40 @@
 # core/ingestion/parser_registry.py
 # -*- coding: utf-8 -*-
+"""
+ParserRegistry（按文件类型分发解析器）
+- 默认在调用线程内解析
+- 注册时标记 cpu_bound 的解析器（纯 Python 的 HTML / JSON 提取）在启用进程池后放到子进程执行，
+  大文档不再长时间占着 GIL 拖慢同进程的其它请求；小文档仍在本线程解析（省掉序列化开销）
+- max_bytes 限制单文档大小；timeout_seconds 限制进程池内单次解析耗时（超时即重建进程池）
+- metrics() 按文件类型给出调用数 / 字节数 / 耗时 / 超时 / 拒绝
+- 分段解析（parse_segments）：字节流 -> 文本片段流，直接喂给 TextChunker，大文件全程常量内存
+"""
 
 from __future__ import annotations
 
+import codecs
+import hashlib
 import json
-from dataclasses import dataclass
+import multiprocessing
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
 from html.parser import HTMLParser
-from typing import Callable, Dict, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+DEFAULT_PROCESS_MIN_BYTES = 256 * 1024
+
+
+class DocumentTooLarge(ValueError):
+    pass
+
+
+class ParseTimeout(TimeoutError):
+    pass
 
 
 class _HTMLTextExtractor(HTMLParser):
@@ -22,6 +50,54 @@ class _HTMLTextExtractor(HTMLParser):
         return " ".join(x.strip() for x in self._chunks if x.strip())
 
 
+_HTML_HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_HTML_PARAGRAPHS = {"p", "blockquote", "pre", "table", "ul", "ol", "section", "article"}
+_HTML_LINES = {"br", "div", "li", "tr", "hr", "header", "footer", "dt", "dd"}
+_HTML_SKIP = {"script", "style", "noscript", "template"}
+_WS_RE = re.compile(r"\s+")
+
+
+class _HTMLSegmentExtractor(HTMLParser):
+    """
+    分块 feed 的 HTML 文本提取：每次 feed 后 drain() 取走已产出的文本，不累积全部文本节点。
+    标题转成 Markdown 标题行、块级元素转成空行/换行，供 TextChunker 按结构切块；跳过 script/style。
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._out: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag in _HTML_SKIP:
+            self._skip += 1
+        elif tag in _HTML_HEADINGS:
+            self._out.append("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag in _HTML_PARAGRAPHS:
+            self._out.append("\n\n")
+        elif tag in _HTML_LINES:
+            self._out.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in _HTML_SKIP:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in _HTML_HEADINGS or tag in _HTML_PARAGRAPHS:
+            self._out.append("\n\n")
+        elif tag in _HTML_LINES:
+            self._out.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        # 分块 feed 时同一文本节点可能分几次到达，只折叠空白、不加分隔，避免切开单词
+        if self._skip or not data:
+            return
+        self._out.append(_WS_RE.sub(" ", data))
+
+    def drain(self) -> str:
+        out = "".join(self._out)
+        self._out.clear()
+        return out
+
+
 @dataclass
 class ParsedDocument:
     text: str
@@ -31,11 +107,13 @@ class ParsedDocument:
 
 
 ParserFunc = Callable[[bytes, Optional[str]], ParsedDocument]
+# 流式解析器：输入字节块迭代器（如 MinIOStore.get_stream），不要求整文件驻留内存
+StreamParserFunc = Callable[[Iterable[bytes], Optional[str]], ParsedDocument]
+# 分段解析器：字节块迭代器 -> 文本片段迭代器；第三个参数是 metadata，解析器可回填统计（如记录数）
+SegmentParserFunc = Callable[[Iterable[bytes], Optional[str], dict], Iterator[str]]
 
 
 def _sha256_bytes(data: bytes) -> str:
-    import hashlib
-
     return hashlib.sha256(data).hexdigest()
 
 
@@ -69,6 +147,27 @@ def _parse_text(data: bytes, filename: Optional[str]) -> ParsedDocument:
     )
 
 
+def _parse_text_stream(chunks: Iterable[bytes], filename: Optional[str]) -> ParsedDocument:
+    """
+    边读边哈希、增量解码，不持有原始字节；但返回的是整份文本，峰值内存仍与文件大小同量级。
+    大文件要常量内存须走 parse_segments（job_runner 在 INGESTION_STREAM_MIN_BYTES 以上切块时使用）。
+    """
+    sha = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    parts: list[str] = []
+    for chunk in chunks:
+        if not chunk:
+            continue
+        sha.update(chunk)
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", final=True))
+    return ParsedDocument(
+        text="".join(parts).strip(),
+        metadata={"filename": filename} if filename else {},
+        content_sha256=sha.hexdigest(),
+    )
+
+
 def _parse_json(data: bytes, filename: Optional[str]) -> ParsedDocument:
     text = _decode_text(data)
     try:
@@ -102,33 +201,427 @@ def _parse_html(data: bytes, filename: Optional[str]) -> ParsedDocument:
     )
 
 
+def _iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """按换行切分（UTF-8 下换行字节不会出现在多字节字符中间，可直接在字节上切）。"""
+    buf = bytearray()
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buf += chunk
+        start = 0
+        while True:
+            i = buf.find(b"\n", start)
+            if i < 0:
+                break
+            yield bytes(buf[start:i])
+            start = i + 1
+        del buf[:start]
+    if buf:
+        yield bytes(buf)
+
+
+def _iter_text_segments(chunks: Iterable[bytes], filename: Optional[str], meta: dict) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    for chunk in chunks:
+        if not chunk:
+            continue
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _iter_jsonl_segments(chunks: Iterable[bytes], filename: Optional[str], meta: dict) -> Iterator[str]:
+    """JSON Lines：逐条解析，每条记录的文本作为一个段落；坏行按原文保留并计数。"""
+    records = 0
+    bad = 0
+    for line in _iter_lines(chunks):
+        raw = _decode_text(line).strip()
+        if not raw:
+            continue
+        try:
+            text = _extract_text_from_json(json.loads(raw))
+            records += 1
+        except Exception:
+            text = raw
+            bad += 1
+        meta["records"] = records
+        meta["bad_records"] = bad
+        if text:
+            yield text + "\n\n"
+
+
+def _iter_html_segments(chunks: Iterable[bytes], filename: Optional[str], meta: dict) -> Iterator[str]:
+    parser = _HTMLSegmentExtractor()
+    for text in _iter_text_segments(chunks, filename, meta):
+        try:
+            parser.feed(text)
+        except Exception:
+            pass
+        out = parser.drain()
+        if out:
+            yield out
+    try:
+        parser.close()
+    except Exception:
+        pass
+    out = parser.drain()
+    if out:
+        yield out
+
+
+def _parse_jsonl(data: bytes, filename: Optional[str]) -> ParsedDocument:
+    metadata = {"filename": filename} if filename else {}
+    text = "".join(_iter_jsonl_segments([data], filename, metadata)).strip()
+    return ParsedDocument(
+        text=text,
+        metadata=metadata,
+        file_type="jsonl",
+        content_sha256=_sha256_bytes(data),
+    )
+
+
+class SegmentStream:
+    """
+    parse_segments 的返回值：只能迭代一次，产出文本片段。
+    content_sha256 / bytes 在完整迭代结束后才可用；中途停止（如 max_chars 截断）时 content_sha256 为 None。
+    """
+
+    def __init__(
+        self,
+        registry: "ParserRegistry",
+        parser: SegmentParserFunc,
+        chunks: Iterable[bytes],
+        file_type: str,
+        filename: Optional[str],
+    ) -> None:
+        self.file_type = file_type or None
+        self.metadata: dict = {"filename": filename} if filename else {}
+        self.content_sha256: Optional[str] = None
+        self.bytes = 0
+        self.chars = 0
+        self._registry = registry
+        self._parser = parser
+        self._chunks = chunks
+        self._filename = filename
+        self._consumed = False
+
+    def __iter__(self) -> Iterator[str]:
+        if self._consumed:
+            raise RuntimeError("segment stream can only be iterated once")
+        self._consumed = True
+        return self._run()
+
+    def _hashed(self, sha) -> Iterator[bytes]:
+        for chunk in self._registry._limited(self._chunks, self.file_type or ""):
+            sha.update(chunk)
+            self.bytes += len(chunk)
+            yield chunk
+
+    def _run(self) -> Iterator[str]:
+        sha = hashlib.sha256()
+        it = self._parser(self._hashed(sha), self._filename, self.metadata)
+        busy = 0.0
+        key = self.file_type or ""
+        try:
+            while True:
+                t = time.time()
+                try:
+                    seg = next(it)
+                except StopIteration:
+                    busy += time.time() - t
+                    break
+                busy += time.time() - t
+                self.chars += len(seg)
+                yield seg
+        except DocumentTooLarge:
+            raise
+        except GeneratorExit:
+            self._registry._record(key, self.bytes, busy, segments=True)
+            raise
+        except Exception:
+            self._registry._record(key, self.bytes, busy, segments=True, error=True)
+            raise
+        self.content_sha256 = sha.hexdigest()
+        self._registry._record(key, self.bytes, busy, segments=True)
+
+
+@dataclass
+class _ParseStats:
+    calls: int = 0
+    process_calls: int = 0         # 在进程池中执行的次数
+    segment_calls: int = 0         # 分段（流式）解析次数；耗时为解析器自身耗时（含读取上游字节流）
+    errors: int = 0
+    timeouts: int = 0
+    rejected: int = 0              # 超过 max_bytes 被拒绝
+    bytes: int = 0
+    total_s: float = 0.0
+    max_s: float = 0.0
+
+    def as_dict(self) -> dict:
+        out = asdict(self)
+        done = self.calls - self.rejected
+        out["total_s"] = round(self.total_s, 3)
+        out["max_ms"] = round(self.max_s * 1000, 2)
+        out["avg_ms"] = round(self.total_s * 1000 / done, 2) if done > 0 else 0.0
+        out.pop("max_s")
+        return out
+
+
+def _run_parser(parser: ParserFunc, data: bytes, filename: Optional[str]) -> ParsedDocument:
+    # 子进程入口：parser 必须是模块级函数（可 pickle）
+    return parser(data, filename)
+
+
 class ParserRegistry:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        *,
+        process_workers: int = 0,
+        process_min_bytes: int = DEFAULT_PROCESS_MIN_BYTES,
+        max_bytes: int = 0,
+        timeout_seconds: float = 0,
+    ) -> None:
+        """
+        process_workers：进程池大小，0 表示全部在调用线程解析
+        process_min_bytes：cpu_bound 解析器的文档达到该大小才走进程池
+        max_bytes：单文档上限，0 不限制；超过抛 DocumentTooLarge
+        timeout_seconds：进程池内单次解析超时（含排队），0 不限制；超时抛 ParseTimeout
+        """
         self._parsers: Dict[str, ParserFunc] = {}
+        self._stream_parsers: Dict[str, StreamParserFunc] = {}
+        self._segment_parsers: Dict[str, SegmentParserFunc] = {}
+        self._cpu_bound: Set[str] = set()
         self._fallback: ParserFunc = _parse_text
 
-    def register(self, file_type: str, parser: ParserFunc) -> None:
+        self.process_workers = max(int(process_workers or 0), 0)
+        self.process_min_bytes = max(int(process_min_bytes or 0), 0)
+        self.max_bytes = max(int(max_bytes or 0), 0)
+        self.timeout_seconds = max(float(timeout_seconds or 0), 0.0)
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_restarts = 0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _ParseStats] = {}
+
+    def register(self, file_type: str, parser: ParserFunc, *, cpu_bound: bool = False) -> None:
         key = (file_type or "").strip().lower()
         if not key:
             return
         self._parsers[key] = parser
+        if cpu_bound:
+            self._cpu_bound.add(key)
+        else:
+            self._cpu_bound.discard(key)
+
+    def register_stream(self, file_type: str, parser: StreamParserFunc) -> None:
+        key = (file_type or "").strip().lower()
+        if not key:
+            return
+        self._stream_parsers[key] = parser
+
+    def register_segments(self, file_type: str, parser: SegmentParserFunc) -> None:
+        key = (file_type or "").strip().lower()
+        if not key:
+            return
+        self._segment_parsers[key] = parser
+
+    def supports_stream(self, file_type: Optional[str]) -> bool:
+        return (file_type or "").strip().lower() in self._stream_parsers
+
+    def supports_segments(self, file_type: Optional[str]) -> bool:
+        return (file_type or "").strip().lower() in self._segment_parsers
+
+    def is_cpu_bound(self, file_type: Optional[str]) -> bool:
+        return (file_type or "").strip().lower() in self._cpu_bound
 
     def parse(self, data: bytes, file_type: Optional[str], filename: Optional[str] = None) -> ParsedDocument:
         key = (file_type or "").strip().lower()
         parser = self._parsers.get(key) or self._fallback
-        parsed = parser(data, filename)
+        size = len(data)
+        if self.max_bytes and size > self.max_bytes:
+            self._record(key, size, 0.0, rejected=True)
+            raise DocumentTooLarge(f"document too large: {size} > {self.max_bytes} bytes")
+
+        use_pool = self.process_workers > 0 and key in self._cpu_bound and size >= self.process_min_bytes
+        t = time.time()
+        try:
+            if use_pool:
+                parsed = self._parse_in_pool(parser, data, filename, key)
+            else:
+                parsed = parser(data, filename)
+        except ParseTimeout:
+            self._record(key, size, time.time() - t, process=use_pool, timeout=True)
+            raise
+        except Exception:
+            self._record(key, size, time.time() - t, process=use_pool, error=True)
+            raise
+        self._record(key, size, time.time() - t, process=use_pool)
         if parsed.file_type is None:
             parsed.file_type = key or parsed.file_type
         return parsed
 
+    def parse_stream(
+        self,
+        chunks: Iterable[bytes],
+        file_type: Optional[str],
+        filename: Optional[str] = None,
+    ) -> ParsedDocument:
+        """
+        有流式解析器则边读边解析（省掉整份原始字节，结果仍是整份文本）；否则回退为拼接后走 parse。
+        需要常量内存时用 parse_segments。
+        """
+        key = (file_type or "").strip().lower()
+        parser = self._stream_parsers.get(key)
+        if parser is None:
+            return self.parse(b"".join(self._limited(chunks, key)), file_type, filename=filename)
+        counted = [0]
+
+        def counting() -> Iterator[bytes]:
+            for chunk in self._limited(chunks, key):
+                counted[0] += len(chunk)
+                yield chunk
+
+        t = time.time()
+        try:
+            parsed = parser(counting(), filename)
+        except DocumentTooLarge:
+            raise
+        except Exception:
+            self._record(key, counted[0], time.time() - t, error=True)
+            raise
+        self._record(key, counted[0], time.time() - t)
+        if parsed.file_type is None:
+            parsed.file_type = key or parsed.file_type
+        return parsed
+
+    def parse_segments(
+        self,
+        chunks: Iterable[bytes],
+        file_type: Optional[str],
+        filename: Optional[str] = None,
+    ) -> SegmentStream:
+        """边读边产出文本片段（不在进程池中执行，单次只处理一个字节块）。"""
+        key = (file_type or "").strip().lower()
+        parser = self._segment_parsers.get(key)
+        if parser is None:
+            raise ValueError(f"no segment parser for file_type={key or '-'}")
+        return SegmentStream(self, parser, chunks, key, filename)
+
+    def _limited(self, chunks: Iterable[bytes], key: str) -> Iterator[bytes]:
+        total = 0
+        for chunk in chunks:
+            total += len(chunk)
+            if self.max_bytes and total > self.max_bytes:
+                self._record(key, total, 0.0, rejected=True)
+                raise DocumentTooLarge(f"document too large: > {self.max_bytes} bytes")
+            yield chunk
+
+    # -------- 进程池 --------
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn：调用方进程里有大量线程，fork 可能继承到被持有的锁
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.process_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _reset_pool(self, pool: ProcessPoolExecutor) -> None:
+        """超时/子进程崩溃后丢弃整个进程池；卡住的子进程直接终止，下次解析时重建。"""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self._pool_restarts += 1
+        # ProcessPoolExecutor 没有取消单个运行中任务的接口，只能终止其子进程
+        for proc in list((getattr(pool, "_processes", None) or {}).values()):
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _parse_in_pool(
+        self, parser: ParserFunc, data: bytes, filename: Optional[str], key: str
+    ) -> ParsedDocument:
+        pool = self._get_pool()
+        try:
+            future = pool.submit(_run_parser, parser, data, filename)
+            return future.result(timeout=self.timeout_seconds or None)
+        except FutureTimeout:
+            self._reset_pool(pool)
+            raise ParseTimeout(f"parse timeout: file_type={key or '-'} after {self.timeout_seconds}s")
+        except BrokenProcessPool:
+            self._reset_pool(pool)
+            raise
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # -------- 指标 --------
+    def _record(
+        self,
+        key: str,
+        size: int,
+        elapsed: float,
+        *,
+        process: bool = False,
+        segments: bool = False,
+        error: bool = False,
+        timeout: bool = False,
+        rejected: bool = False,
+    ) -> None:
+        with self._lock:
+            st = self._stats.setdefault(key or "-", _ParseStats())
+            st.calls += 1
+            st.bytes += size
+            st.total_s += elapsed
+            st.max_s = max(st.max_s, elapsed)
+            st.process_calls += int(process)
+            st.segment_calls += int(segments)
+            st.errors += int(error)
+            st.timeouts += int(timeout)
+            st.rejected += int(rejected)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "process_workers": self.process_workers,
+                "process_min_bytes": self.process_min_bytes,
+                "max_bytes": self.max_bytes,
+                "timeout_seconds": self.timeout_seconds,
+                "pool_running": self._pool is not None,
+                "pool_restarts": self._pool_restarts,
+                "cpu_bound_types": sorted(self._cpu_bound),
+                "segment_types": sorted(self._segment_parsers),
+                "by_type": {k: v.as_dict() for k, v in sorted(self._stats.items())},
+            }
+
 
-def default_registry() -> ParserRegistry:
-    registry = ParserRegistry()
+def default_registry(**kwargs) -> ParserRegistry:
+    """kwargs 透传给 ParserRegistry（进程池 / 大小限制 / 超时）。"""
+    registry = ParserRegistry(**kwargs)
     registry.register("txt", _parse_text)
     registry.register("text", _parse_text)
     registry.register("md", _parse_text)
     registry.register("markdown", _parse_text)
-    registry.register("json", _parse_json)
-    registry.register("html", _parse_html)
-    registry.register("htm", _parse_html)
+    registry.register("json", _parse_json, cpu_bound=True)
+    registry.register("html", _parse_html, cpu_bound=True)
+    registry.register("htm", _parse_html, cpu_bound=True)
+    registry.register("jsonl", _parse_jsonl, cpu_bound=True)
+    registry.register("ndjson", _parse_jsonl, cpu_bound=True)
+    for key in ("txt", "text", "md", "markdown"):
+        registry.register_stream(key, _parse_text_stream)
+        registry.register_segments(key, _iter_text_segments)
+    for key in ("jsonl", "ndjson"):
+        registry.register_segments(key, _iter_jsonl_segments)
+    for key in ("html", "htm"):
+        registry.register_segments(key, _iter_html_segments)
     return registry
@@ -0,0 +1,191 @@
+# core/ingestion/prefix_sync.py
+# -*- coding: utf-8 -*-
+"""
+前缀同步（job_type = kb_sync）
+- 流式列出 minio:// 前缀下的对象，按 ETag + 大小与 kb_documents 中记录的来源比对
+  （内容去重命中的来源记在 kb_document_refs，同样参与比对）
+- 新增/变更的对象作为一个批次入队 kb_ingest 作业；已在排队/执行的来源不重复入队
+- 前缀下已删除的对象：删除其向量并把 kb_documents 标记为 deleted；只是引用的来源只作废引用，不动被引用的文档
+- 同步水位（已见对象的最大 last_modified）与统计写入 ingestion_sync_state
+"""
+
+from __future__ import annotations
+
+import hashlib
+import uuid
+from datetime import timezone
+from typing import Any, Dict, Optional
+
+from api.kb_meta import infer_file_type
+from api.routers.kb import _ensure_collection, _resolve_kb_config
+from core.ingestion.job_runner import _load_job_options, _option_bool, _parse_minio_url
+
+
+def sync_key(*, app_id: str, kb_key: str, wallet_id: str, private_db_id: str, source_prefix: str) -> str:
+    raw = "|".join([app_id, kb_key, wallet_id or "", private_db_id or "", source_prefix])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _ts(value) -> str:
+    """对象 last_modified -> 与 SQLite datetime('now') 同格式的 UTC 字符串，便于直接比较。"""
+    if value is None:
+        return ""
+    if hasattr(value, "astimezone"):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+def _unchanged(obj: Dict[str, Any], known: Optional[Dict[str, Any]], watermark: str) -> bool:
+    if known is None:
+        return False
+    etag = known.get("source_etag")
+    if etag:
+        size = known.get("source_size")
+        return etag == obj["etag"] and (size is None or int(size) == obj["size"])
+    # 早期写入的文档没有记录 ETag：对象在该文档写入之后（或上次同步之后）没有改过即视为未变
+    modified = _ts(obj.get("last_modified"))
+    return bool(modified) and modified <= max(str(known.get("updated_at") or ""), watermark or "")
+
+
+def execute_sync_job(job: dict, deps) -> dict:
+    job_id = int(job.get("id") or 0)
+    app_id = str(job.get("app_id") or "")
+    kb_key = str(job.get("kb_key") or "")
+    wallet_id = str(job.get("wallet_id") or "")
+    source_prefix = str(job.get("source_url") or "")
+    if not app_id or not kb_key or not wallet_id:
+        raise ValueError("job missing app_id/kb_key/wallet_id")
+    if not source_prefix:
+        raise ValueError("sync job missing source prefix")
+    if not deps.datasource.minio:
+        raise RuntimeError("MinIO is not enabled")
+
+    cfg = _resolve_kb_config(deps, app_id, kb_key)
+    kb_type = str(cfg.get("type") or "").strip()
+    data_wallet_id = str(job.get("data_wallet_id") or "")
+    private_db_id = str(job.get("private_db_id") or "")
+    owner_wallet_id = (data_wallet_id or wallet_id) if kb_type == "user_upload" else ""
+
+    options = _load_job_options(job.get("options_json"))
+    allowed = {str(t).strip().lower().lstrip(".") for t in options.get("file_types") or [] if str(t).strip()}
+    delete_removed = _option_bool(options, "delete_removed", True)
+    allow_empty = _option_bool(options, "allow_empty", False)
+    job_options = dict(options.get("job_options") or {})
+    if isinstance(options.get("metadata"), dict) and options["metadata"]:
+        job_options["metadata"] = options["metadata"]
+
+    bucket, prefix = _parse_minio_url(source_prefix, deps.datasource.bucket)
+    url_prefix = f"minio://{bucket}/{prefix}"
+    key = sync_key(
+        app_id=app_id, kb_key=kb_key, wallet_id=owner_wallet_id,
+        private_db_id=private_db_id, source_prefix=url_prefix,
+    )
+    state = deps.datasource.ingestion_jobs.get_sync_state(key) or {}
+    watermark = str(state.get("watermark") or "")
+
+    known = deps.datasource.kb_documents.source_states(
+        app_id=app_id, kb_key=kb_key, url_prefix=url_prefix,
+        wallet_id=owner_wallet_id or None, private_db_id=private_db_id or None,
+    )
+    inflight = deps.datasource.ingestion_jobs.inflight_sources(
+        app_id=app_id, kb_key=kb_key, url_prefix=url_prefix, private_db_id=private_db_id or None,
+    )
+
+    stats = {"listed": 0, "filtered": 0, "new": 0, "changed": 0, "unchanged": 0, "inflight": 0}
+    sources = []
+    seen = set()
+    new_watermark = watermark
+    for obj in deps.datasource.minio.iter_objects(bucket, prefix, recursive=True):
+        stats["listed"] += 1
+        source_url = f"minio://{bucket}/{obj['key']}"
+        seen.add(source_url)
+        modified = _ts(obj.get("last_modified"))
+        if modified > new_watermark:
+            new_watermark = modified
+        file_type = infer_file_type(obj["key"]) or "txt"
+        if allowed and file_type not in allowed:
+            stats["filtered"] += 1
+            continue
+        prev = known.get(source_url)
+        if _unchanged(obj, prev, watermark):
+            stats["unchanged"] += 1
+            continue
+        if source_url in inflight:
+            stats["inflight"] += 1
+            continue
+        stats["changed" if prev is not None else "new"] += 1
+        sources.append((source_url, file_type, None))
+
+    batch_id = None
+    if sources:
+        batch_id = uuid.uuid4().hex
+        deps.datasource.ingestion_jobs.create_batch(
+            batch_id=batch_id,
+            wallet_id=wallet_id,
+            data_wallet_id=data_wallet_id or None,
+            private_db_id=private_db_id or None,
+            app_id=app_id,
+            kb_key=kb_key,
+            job_type="kb_ingest",
+            sources=sources,
+            options=job_options,
+            priority=int(job.get("priority") or 0),
+            source_prefix=url_prefix,
+        )
+
+    removed = [u for u in known if u not in seen]
+    removed_vectors = 0
+    delete_failed = 0
+    delete_skipped = None
+    if removed and not delete_removed:
+        delete_skipped = "delete_removed=false"
+    elif removed and not seen and not allow_empty:
+        # 整个前缀列不出对象多半是路径写错或存储异常，不据此清空知识库
+        delete_skipped = "empty listing"
+    elif removed:
+        collection = _ensure_collection(deps, cfg, wait=deps.datasource.weaviate.create_timeout_seconds)
+        scope = {"wallet_id": owner_wallet_id or None, "private_db_id": private_db_id or None}
+        deps.datasource.kb_documents.drop_source_refs(
+            app_id=app_id, kb_key=kb_key, source_urls=removed, **scope,
+        )
+        doc_ids = deps.datasource.kb_documents.list_doc_ids_by_sources(
+            app_id=app_id, kb_key=kb_key, source_urls=[u for u in removed if known[u].get("docs")], **scope,
+        )
+        ids = [doc_id for ids in doc_ids.values() for doc_id in ids]
+        res = deps.datasource.weaviate.delete_by_ids(collection, ids)
+        failed = set(res.failed_ids)
+        deps.datasource.kb_documents.mark_deleted_many(i for i in ids if i not in failed)
+        removed_vectors = len(ids) - len(failed)
+        delete_failed = len(failed)
+        for err in res.errors:
+            print(f"[kb-sync] delete FAILED: job_id={job_id} err={err}")
+
+    result = {
+        "job_id": job_id,
+        "sync": True,
+        "source_prefix": url_prefix,
+        **stats,
+        "enqueued": len(sources),
+        "batch_id": batch_id,
+        "removed_sources": len(removed),
+        "removed_vectors": removed_vectors,
+        "delete_failed": delete_failed,
+        "delete_skipped": delete_skipped,
+        "watermark": new_watermark or None,
+    }
+    deps.datasource.ingestion_jobs.save_sync_state(
+        sync_key=key,
+        wallet_id=wallet_id,
+        app_id=app_id,
+        kb_key=kb_key,
+        data_wallet_id=data_wallet_id or None,
+        private_db_id=private_db_id or None,
+        source_prefix=url_prefix,
+        watermark=new_watermark or None,
+        last_job_id=job_id,
+        last_batch_id=batch_id,
+        stats=result,
+    )
+    return result
@@ -0,0 +1,122 @@
+# core/ingestion/scheduler.py
+# -*- coding: utf-8 -*-
+"""
+FairScheduler（摄取作业的租户公平调度）
+- 租户 = (wallet_id, app_id)；每个租户只取队首一条作业参与排序（租户内按 priority DESC + FIFO）
+- 加权公平排队：虚拟时间 vt = (running + 窗口内已领取数) / weight，vt 小的租户先被服务
+- 每租户并发上限：running 已达 max_concurrency 的租户本轮不参与
+- 策略查找顺序："wallet/app" -> "wallet" -> 默认
+调度器本身无状态，"已服务量"全部来自 SQLite（claimed_at），多进程部署下各 worker 看到的是同一份账本。
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+Row = Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class TenantPolicy:
+    weight: float = 1.0
+    max_concurrency: int = 0       # 0 表示不限
+
+
+def tenant_key(wallet_id: Optional[str], app_id: Optional[str]) -> str:
+    return f"{wallet_id or ''}/{app_id or ''}"
+
+
+def parse_tenant_policies(raw: Optional[str]) -> Dict[str, TenantPolicy]:
+    """解析 INGESTION_TENANT_POLICIES；格式错误的条目跳过，不阻断启动。"""
+    if not raw or not raw.strip():
+        return {}
+    try:
+        data = json.loads(raw)
+    except Exception as e:
+        print(f"[ingest-scheduler] invalid INGESTION_TENANT_POLICIES: err={e}")
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    out: Dict[str, TenantPolicy] = {}
+    for key, cfg in data.items():
+        if not isinstance(cfg, dict):
+            continue
+        try:
+            weight = float(cfg.get("weight", 1.0))
+            cap = int(cfg.get("max_concurrency", 0) or 0)
+        except Exception:
+            print(f"[ingest-scheduler] skip invalid policy: key={key}")
+            continue
+        out[str(key)] = TenantPolicy(weight=weight if weight > 0 else 1.0, max_concurrency=max(cap, 0))
+    return out
+
+
+class FairScheduler:
+    def __init__(
+        self,
+        policies: Optional[Dict[str, TenantPolicy]] = None,
+        *,
+        default_max_concurrency: int = 0,
+        window_seconds: int = 300,
+    ) -> None:
+        self.policies = dict(policies or {})
+        self.default_policy = TenantPolicy(max_concurrency=max(int(default_max_concurrency or 0), 0))
+        self.window_seconds = max(int(window_seconds or 0), 1)
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "FairScheduler":
+        return cls(
+            parse_tenant_policies(getattr(settings, "ingestion_tenant_policies", "")),
+            default_max_concurrency=getattr(settings, "ingestion_tenant_max_concurrency", 0),
+            window_seconds=getattr(settings, "ingestion_fair_window_seconds", 300),
+        )
+
+    def policy_for(self, wallet_id: Optional[str], app_id: Optional[str]) -> TenantPolicy:
+        return (
+            self.policies.get(tenant_key(wallet_id, app_id))
+            or self.policies.get(wallet_id or "")
+            or self.default_policy
+        )
+
+    def order(self, candidates: List[Row]) -> Tuple[List[Tuple[Row, Dict[str, Any]]], List[str]]:
+        """
+        candidates 来自 IngestionJobStore.claim_candidates（每租户一条）。
+        返回 ([(row, decision), ...] 按服务顺序, 因并发上限被跳过的租户)。
+        decision 会写入 ingestion_job_runs.meta_json，便于事后追溯调度原因。
+        """
+        ranked: List[Tuple[Tuple[Any, ...], Row, Dict[str, Any]]] = []
+        capped: List[str] = []
+        for row in candidates:
+            tenant = tenant_key(row.get("wallet_id"), row.get("app_id"))
+            policy = self.policy_for(row.get("wallet_id"), row.get("app_id"))
+            running = int(row.get("tenant_running") or 0)
+            served = int(row.get("tenant_served") or 0)
+            if policy.max_concurrency and running >= policy.max_concurrency:
+                capped.append(tenant)
+                continue
+
+            vt = (running + served) / policy.weight
+            priority = int(row.get("priority") or 0)
+            decision = {
+                "tenant": tenant,
+                "vt": round(vt, 3),
+                "weight": policy.weight,
+                "max_concurrency": policy.max_concurrency,
+                "tenant_running": running,
+                "tenant_served": served,
+                "tenant_pending": int(row.get("tenant_pending") or 0),
+                "priority": priority,
+            }
+            key = (vt, -priority, str(row.get("ready_at") or ""), int(row["id"]))
+            ranked.append((key, row, decision))
+
+        ranked.sort(key=lambda x: x[0])
+        total = len(candidates)
+        ordered = []
+        for rank, (_, row, decision) in enumerate(ranked):
+            decision.update({"rank": rank, "candidates": total, "capped": len(capped)})
+            ordered.append((row, decision))
+        return ordered, capped
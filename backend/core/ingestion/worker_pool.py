@@ -0,0 +1,306 @@
+# core/ingestion/worker_pool.py
+# -*- coding: utf-8 -*-
+"""
+IngestionWorkerPool（后台摄取 worker）
+- N 个线程轮询 ingestion_jobs，取各租户队首，经 FairScheduler 排序后用 UPDATE ... RETURNING 原子领取并持有租约
+- 心跳线程为在途作业续租，并回收租约过期（worker 崩溃/进程退出）的作业
+- 失败按指数退避重试，attempts 用完判失败
+- HTTP 侧只负责入队 + wake()，不再在请求线程里执行
+多进程部署时每个进程各自启动一个 pool，靠租约保证同一作业只被一个 worker 执行。
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from core.ingestion.job_runner import execute_ingestion_job, record_job_failure, record_job_success
+from core.ingestion.scheduler import FairScheduler
+
+
+@dataclass
+class _PoolStats:
+    claimed: int = 0
+    succeeded: int = 0
+    deduped: int = 0               # 内容去重跳过向量化（计入 succeeded）
+    failed: int = 0
+    retried: int = 0
+    lease_lost: int = 0
+    requeued_expired: int = 0
+    failed_expired: int = 0
+    claim_wait_s: float = 0.0      # 入队 -> 被领取的等待时长累计
+    claim_query_s: float = 0.0     # claim SQL 本身耗时累计
+    claim_queries: int = 0
+    claim_conflicts: int = 0       # 候选作业被其它 worker 抢先领取
+    capped_skips: int = 0          # 因租户并发上限被跳过的次数
+    busy_s: float = 0.0            # 执行作业的耗时累计
+
+
+class IngestionWorkerPool:
+    def __init__(
+        self,
+        deps_provider: Callable[[], Any],
+        *,
+        workers: int = 2,
+        lease_seconds: int = 60,
+        poll_interval_ms: int = 1000,
+        max_attempts: int = 3,
+        backoff_seconds: int = 10,
+        backoff_max_seconds: int = 600,
+        scheduler: Optional[FairScheduler] = None,
+    ) -> None:
+        self._deps_provider = deps_provider
+        self.scheduler = scheduler or FairScheduler()
+        self.workers = max(int(workers or 0), 0)
+        self.lease_seconds = max(int(lease_seconds or 60), 5)
+        self.poll_interval = max(int(poll_interval_ms or 1000), 50) / 1000.0
+        self.max_attempts = max(int(max_attempts or 1), 1)
+        self.backoff_seconds = max(int(backoff_seconds or 0), 0)
+        self.backoff_max_seconds = max(int(backoff_max_seconds or 0), self.backoff_seconds)
+
+        self.owner_prefix = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._deps = None
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._inflight: Dict[int, str] = {}            # job_id -> lease_owner
+        self._stats = _PoolStats()
+        self._completed_at: Deque[float] = deque()      # 最近完成时间（滑动窗口吞吐）
+        self._tenant_claims: Dict[str, int] = {}        # 本进程按租户的领取计数
+        self._started_at = 0.0
+
+    # -------- 生命周期 --------
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stop.is_set()
+
+    def start(self) -> None:
+        if not self.enabled or self.running:
+            return
+        self._deps = self._deps_provider()
+        self._stop.clear()
+        self._started_at = time.time()
+        self._threads = [
+            threading.Thread(target=self._worker_loop, args=(f"{self.owner_prefix}:w{i}",),
+                             name=f"ingest-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        self._threads.append(threading.Thread(target=self._heartbeat_loop, name="ingest-heartbeat", daemon=True))
+        for th in self._threads:
+            th.start()
+        print(f"[ingest-worker] started workers={self.workers} lease={self.lease_seconds}s owner={self.owner_prefix}")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """停止领取新作业；在途作业在 timeout 内跑完，否则其租约到期后由其它 worker 接手。"""
+        if not self._threads:
+            return
+        self._stop.set()
+        self._wake.set()
+        deadline = time.time() + timeout
+        for th in self._threads:
+            th.join(max(deadline - time.time(), 0))
+        self._threads = []
+        print("[ingest-worker] stopped")
+
+    def wake(self) -> None:
+        """有新作业入队时唤醒空闲 worker，不必等到下个轮询周期。"""
+        self._wake.set()
+
+    # -------- worker --------
+    def _worker_loop(self, owner: str) -> None:
+        while not self._stop.is_set():
+            t = time.time()
+            try:
+                job, decision = self._claim_next(owner)
+            except Exception as e:
+                print(f"[ingest-worker] claim failed: owner={owner} err={e}")
+                job, decision = None, {}
+            with self._lock:
+                self._stats.claim_queries += 1
+                self._stats.claim_query_s += time.time() - t
+
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+
+            with self._lock:
+                self._stats.claimed += 1
+                self._stats.claim_wait_s += max(float(job.get("wait_seconds") or 0.0), 0.0)
+                tenant = decision.get("tenant", "")
+                self._tenant_claims[tenant] = self._tenant_claims.get(tenant, 0) + 1
+            try:
+                self._process(job, owner, decision)
+            except Exception as e:
+                # 记录状态本身失败（如 SQLite 异常）：作业留在 running，租约到期后被回收
+                print(f"[ingest-worker] process failed: job_id={job.get('id')} owner={owner} err={e}")
+
+    def _claim_next(self, owner: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """按调度顺序逐个尝试领取；候选被其它 worker 抢走时顺延到下一个租户。"""
+        store = self._deps.datasource.ingestion_jobs
+        candidates = store.claim_candidates(window_seconds=self.scheduler.window_seconds)
+        if not candidates:
+            return None, {}
+        ordered, capped = self.scheduler.order(candidates)
+        if capped:
+            self._bump(capped_skips=len(capped))
+        for row, decision in ordered:
+            # 候选里的 running 数是列出时的快照：上限由 claim 在同一条 UPDATE 里再核对
+            job = store.claim(
+                int(row["id"]), owner, self.lease_seconds, max_running=int(decision.get("max_concurrency") or 0)
+            )
+            if job is not None:
+                return job, decision
+            self._bump(claim_conflicts=1)
+        return None, {}
+
+    def _process(self, job: Dict[str, Any], owner: str, decision: Optional[Dict[str, Any]] = None) -> None:
+        deps = self._deps
+        store = deps.datasource.ingestion_jobs
+        job_id = int(job["id"])
+        attempt = int(job.get("attempts") or 1)
+
+        with self._lock:
+            self._inflight[job_id] = owner
+        store.append_run(
+            job_id=job_id,
+            status="running",
+            message="job claimed",
+            meta={
+                "worker": owner,
+                "attempt": attempt,
+                "wait_s": round(float(job.get("wait_seconds") or 0.0), 3),
+                "schedule": decision or {},
+            },
+        )
+
+        t = time.time()
+        try:
+            result = execute_ingestion_job(job, deps)
+        except Exception as e:
+            self._on_error(job, owner, attempt, str(e))
+        else:
+            if record_job_success(job, result, deps, lease_owner=owner):
+                self._bump(succeeded=1, deduped=1 if result.get("deduped") else 0)
+            else:
+                self._bump(lease_lost=1)
+                print(f"[ingest-worker] lease lost before completion: job_id={job_id} owner={owner}")
+        finally:
+            with self._lock:
+                self._inflight.pop(job_id, None)
+                self._stats.busy_s += time.time() - t
+                self._completed_at.append(time.time())
+
+    def _on_error(self, job: Dict[str, Any], owner: str, attempt: int, error: str) -> None:
+        store = self._deps.datasource.ingestion_jobs
+        job_id = int(job["id"])
+        if attempt >= self.max_attempts:
+            if record_job_failure(job, error, self._deps, lease_owner=owner):
+                self._bump(failed=1)
+            else:
+                self._bump(lease_lost=1)
+            return
+
+        delay = self._backoff(attempt)
+        if store.retry_later(job_id, error, delay, lease_owner=owner):
+            self._bump(retried=1)
+            store.append_run(
+                job_id=job_id,
+                status="retry",
+                message=error,
+                meta={"worker": owner, "attempt": attempt, "retry_in_s": delay},
+            )
+        else:
+            self._bump(lease_lost=1)
+
+    def _backoff(self, attempt: int) -> int:
+        return int(min(self.backoff_seconds * (2 ** max(attempt - 1, 0)), self.backoff_max_seconds))
+
+    # -------- 心跳：续租 + 回收过期租约 --------
+    def _heartbeat_loop(self) -> None:
+        store = self._deps.datasource.ingestion_jobs
+        interval = max(self.lease_seconds / 3.0, 1.0)
+        while not self._stop.wait(interval):
+            with self._lock:
+                inflight = dict(self._inflight)
+            for job_id, owner in inflight.items():
+                try:
+                    if not store.renew_lease(job_id, owner, self.lease_seconds):
+                        print(f"[ingest-worker] renew lost: job_id={job_id} owner={owner}")
+                except Exception as e:
+                    print(f"[ingest-worker] renew failed: job_id={job_id} err={e}")
+            try:
+                res = store.requeue_expired(self.max_attempts)
+            except Exception as e:
+                print(f"[ingest-worker] requeue_expired failed: err={e}")
+                continue
+            if res["requeued"] or res["failed"]:
+                self._bump(requeued_expired=len(res["requeued"]), failed_expired=len(res["failed"]))
+                print(f"[ingest-worker] expired leases: requeued={res['requeued']} failed={res['failed']}")
+                if res["requeued"]:
+                    self.wake()
+
+    # -------- 指标 --------
+    def _bump(self, **kw: int) -> None:
+        with self._lock:
+            for k, v in kw.items():
+                setattr(self._stats, k, getattr(self._stats, k) + v)
+
+    def metrics(self, window_seconds: float = 60.0) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "running": self.running,
+            "workers": self.workers,
+        }
+        if not self.enabled:
+            return out
+
+        now = time.time()
+        with self._lock:
+            while self._completed_at and now - self._completed_at[0] > window_seconds:
+                self._completed_at.popleft()
+            recent = len(self._completed_at)
+            st = self._stats
+            inflight = len(self._inflight)
+            uptime = now - self._started_at if self._started_at else 0.0
+            done = st.succeeded + st.failed + st.retried
+            out.update({
+                "inflight": inflight,
+                "claimed": st.claimed,
+                "succeeded": st.succeeded,
+                "deduped": st.deduped,
+                "failed": st.failed,
+                "retried": st.retried,
+                "lease_lost": st.lease_lost,
+                "claim_conflicts": st.claim_conflicts,
+                "capped_skips": st.capped_skips,
+                "claims_by_tenant": dict(self._tenant_claims),
+                "requeued_expired": st.requeued_expired,
+                "failed_expired": st.failed_expired,
+                "avg_claim_wait_ms": round(st.claim_wait_s * 1000 / st.claimed, 2) if st.claimed else 0.0,
+                "avg_claim_query_ms": round(st.claim_query_s * 1000 / st.claim_queries, 2) if st.claim_queries else 0.0,
+                "avg_job_ms": round(st.busy_s * 1000 / done, 2) if done else 0.0,
+                "throughput_per_s": round(done / uptime, 3) if uptime > 0 else 0.0,
+                "recent_throughput_per_s": round(recent / window_seconds, 3),
+                "uptime_s": round(uptime, 1),
+            })
+
+        if self._deps is not None:
+            store = self._deps.datasource.ingestion_jobs
+            try:
+                out["queue_depth"] = store.count_ready()
+                out["jobs_by_status"] = store.count_by_status()
+            except Exception as e:
+                out["queue_error"] = str(e)
+        return out
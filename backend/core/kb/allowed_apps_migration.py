@@ -0,0 +1,197 @@
+# core/kb/allowed_apps_migration.py
+# -*- coding: utf-8 -*-
+"""
+allowed_apps 迁移：单值 TEXT -> TEXT_ARRAY，并合并按 app 各写一份的副本
+- Weaviate 不能原地改属性类型：写入新版本 collection（<collection>__v<时间戳>），校验后切换 alias（同 JD 蓝绿重建）
+- 副本判定：除 allowed_apps（及 ignore_fields）外全部属性相同；每组保留 uuid 最小的一条，allowed_apps 取并集
+- 被合并掉的副本在 kb_document_refs 中各留一条指向保留对象的引用（按 app 保留来源、哈希等元数据），
+  其 kb_documents 行标记为 deleted（对象已不存在）；各 app 的计数差由计数对账补上
+- 迁移期间写入旧 collection 的数据不会带过去：先暂停摄取 worker 与写入流量
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import weaviate.classes.config as wc
+
+from core.kb.kb_manager import allowed_apps_list
+from datasource.vectorstores.weaviate_store import WeaviateStore
+
+VERSION_SEP = "__v"
+DEFAULT_BATCH_SIZE = 200
+
+
+@dataclass
+class MigrationResult:
+    alias: str
+    source: str
+    target: Optional[str] = None
+    scanned: int = 0
+    groups: int = 0
+    duplicates: int = 0          # 被合并掉的副本数（= 省下的向量数）
+    written: int = 0
+    errors: int = 0
+    switched: bool = False
+    refs_created: int = 0        # 副本改为指向保留对象的引用数
+    problems: List[str] = field(default_factory=list)
+
+
+def _dup_key(props: Dict[str, Any], ignore: Iterable[str]) -> str:
+    skip = {"allowed_apps", *ignore}
+    rest = {k: v for k, v in props.items() if k not in skip}
+    raw = json.dumps(rest, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _target_properties(store: WeaviateStore, source: str) -> List[wc.Property]:
+    """沿用源 collection 的属性定义，只把 allowed_apps 改为 TEXT_ARRAY（field 分词）。"""
+    cfg = store.client.collections.get(source).config.get()
+    props: List[wc.Property] = []
+    for p in cfg.properties or []:
+        if p.name.lower() == "allowed_apps":
+            continue
+        kwargs: Dict[str, Any] = {"name": p.name, "data_type": p.data_type}
+        for attr in ("index_filterable", "index_searchable", "index_range_filters", "tokenization"):
+            val = getattr(p, attr, None)
+            if val is not None:
+                kwargs[attr] = val
+        props.append(wc.Property(**kwargs))
+    props.append(
+        wc.Property(name="allowed_apps", data_type=wc.DataType.TEXT_ARRAY, tokenization=wc.Tokenization.FIELD)
+    )
+    return props
+
+
+def migrate_allowed_apps(
+    store: WeaviateStore,
+    collection: str,
+    *,
+    kb_documents=None,
+    ignore_fields: Iterable[str] = (),
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    dry_run: bool = False,
+) -> MigrationResult:
+    """
+    两遍游标遍历：第一遍只算分组（不取向量），第二遍带向量把每组的保留对象写入新版本。
+    dry_run=True 只统计分组与副本数，不写任何东西。
+    """
+    if store.aliases is None and not dry_run:
+        raise RuntimeError("allowed_apps migration requires WeaviateStore(aliases=...)")
+    ignore = tuple(ignore_fields)
+    source = store.resolve(collection)
+    result = MigrationResult(alias=collection, source=source)
+
+    # 1) 分组：key -> 保留对象 uuid；保留对象 uuid -> 合并后的 allowed_apps
+    keep_by_key: Dict[str, str] = {}
+    merged: Dict[str, List[str]] = {}
+    dup_of: Dict[str, str] = {}   # 副本 uuid -> 保留对象 uuid
+    for item in store.iterate(source, batch_size=batch_size):
+        result.scanned += 1
+        props = item["properties"]
+        key = _dup_key(props, ignore)
+        keep = keep_by_key.get(key)
+        if keep is None:
+            keep_by_key[key] = item["id"]
+            merged[item["id"]] = allowed_apps_list(props.get("allowed_apps"))
+            continue
+        apps = merged[keep]
+        apps.extend(a for a in allowed_apps_list(props.get("allowed_apps")) if a not in apps)
+        dup_of[item["id"]] = keep
+    result.groups = len(keep_by_key)
+    result.duplicates = len(dup_of)
+    print(
+        f"[allowed-apps] scanned source={source} objects={result.scanned} "
+        f"groups={result.groups} duplicates={result.duplicates}"
+    )
+    if dry_run:
+        return result
+
+    # 2) 写入新版本
+    target = f"{collection}{VERSION_SEP}{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+    result.target = target
+    store.create_collection(target, _target_properties(store, source))
+
+    ids: List[str] = []
+    vectors: List[Any] = []
+    rows: List[Dict[str, Any]] = []
+
+    def flush() -> None:
+        if not ids:
+            return
+        res = store.upsert_many(target, vectors, rows, ids)
+        result.written += len(ids) - len(res.errors)
+        result.errors += len(res.errors)
+        for uid, err in list(res.errors.items())[:5]:
+            print(f"[allowed-apps] write FAILED: id={uid} err={err}")
+        ids.clear()
+        vectors.clear()
+        rows.clear()
+
+    for item in store.iterate(source, include_vector=True, batch_size=batch_size):
+        apps = merged.get(item["id"])
+        if apps is None:
+            continue
+        props = dict(item["properties"])
+        props["allowed_apps"] = sorted(apps)
+        ids.append(item["id"])
+        vectors.append(item.get("vector") or None)
+        rows.append(props)
+        if len(ids) >= batch_size:
+            flush()
+    flush()
+
+    # 3) 校验后切换
+    new_count = store.count(target)
+    if result.errors:
+        result.problems.append(f"errors={result.errors}")
+    if new_count != result.groups:
+        result.problems.append(f"count mismatch: collection={new_count} groups={result.groups}")
+    print(f"[allowed-apps] validate target={target} count={new_count} groups={result.groups}")
+    if result.problems:
+        print(f"[allowed-apps] NOT switched: {'; '.join(result.problems)}")
+        return result
+
+    store.switch_alias(collection, target)
+    result.switched = True
+    print(f"[allowed-apps] alias switched: {collection} -> {target} (was {source})")
+
+    if kb_documents is not None and dup_of:
+        result.refs_created = _repoint_duplicates(kb_documents, dup_of)
+    return result
+
+
+_REF_COLUMNS = (
+    "app_id", "kb_key", "wallet_id", "private_db_id", "source_url", "source_type",
+    "source_id", "file_type", "content_sha256", "source_etag", "source_size",
+)
+_DOC_COLUMNS = _REF_COLUMNS + ("parent_doc_id", "chunk_index")
+
+
+def _repoint_duplicates(kb_documents, dup_of: Dict[str, str]) -> int:
+    """
+    副本的 kb_documents 行改为 kb_document_refs 中指向保留对象的引用（ref_id 沿用副本 uuid），
+    各 app 的来源同步、按哈希去重仍能找到这份内容；副本行本身标记为 deleted。
+    保留对象没有 active 元数据行时由它的第一个副本的行接管（改记到保留对象 uuid 上），不建引用。
+    """
+    refs: List[Dict[str, Any]] = []
+    has_row: Dict[str, bool] = {}
+    for dup_id, keep_id in dup_of.items():
+        row = kb_documents.get(dup_id)
+        if not row or row.get("status") != "active":
+            continue
+        if keep_id not in has_row:
+            kept = kb_documents.get(keep_id)
+            has_row[keep_id] = bool(kept and kept.get("status") == "active")
+        if not has_row[keep_id]:
+            kb_documents.upsert(doc_id=keep_id, **{k: row.get(k) for k in _DOC_COLUMNS})
+            has_row[keep_id] = True
+            continue
+        refs.append({"ref_id": dup_id, "doc_id": keep_id, **{k: row.get(k) for k in _REF_COLUMNS}})
+    kb_documents.upsert_refs_many(refs)
+    kb_documents.mark_deleted_many(list(dup_of))
+    return len(refs)
@@ -0,0 +1,213 @@
+# core/kb/chunker.py
+# -*- coding: utf-8 -*-
+"""
+TextChunker（流式结构化切块）
+- 输入：整段文本或文本片段迭代器（如流式解析器逐块产出的文本），逐个 yield Chunk，不要求全文驻留内存
+- 结构优先：Markdown 标题 > 段落（空行）> 句子（含中文 。！？；…）> 硬切
+- chunk_size / overlap 按字符计；overlap 尽量按句子对齐，标题处开新块且不带 overlap
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+DEFAULT_CHUNK_SIZE = 800
+DEFAULT_CHUNK_OVERLAP = 100
+
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$")
+# 句末：中英文终止符（可带右引号/括号）或换行；英文句点需后跟空白，避免切开 3.14 / e.g
+_SENTENCE_END_RE = re.compile(r"(?:[。！？；!?;…]+|\.(?=\s|$))[”’」』）)\]\"']*[ \t]*|\n+")
+
+
+@dataclass
+class Chunk:
+    ordinal: int
+    text: str
+    heading: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.text)
+
+
+def split_sentences(text: str) -> List[str]:
+    """按句末切分，保留标点与尾随空白（拼回去与原文一致）。"""
+    out: List[str] = []
+    start = 0
+    for m in _SENTENCE_END_RE.finditer(text):
+        end = m.end()
+        if end > start:
+            out.append(text[start:end])
+            start = end
+    if start < len(text):
+        out.append(text[start:])
+    return out
+
+
+def _split_complete(text: str) -> Tuple[str, str]:
+    """(完整句子部分, 尚未结束的尾巴)；用于超长段落/单行的提前吐出。"""
+    last = None
+    for m in _SENTENCE_END_RE.finditer(text):
+        last = m
+    if last is None or last.end() == 0:
+        return "", text
+    return text[: last.end()], text[last.end():]
+
+
+class TextChunker:
+    def __init__(
+        self,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        overlap: int = DEFAULT_CHUNK_OVERLAP,
+        *,
+        min_chunk_chars: Optional[int] = None,
+    ) -> None:
+        self.chunk_size = max(int(chunk_size or DEFAULT_CHUNK_SIZE), 50)
+        # overlap 不超过一半，保证每块都有新内容
+        self.overlap = min(max(int(overlap or 0), 0), self.chunk_size // 2)
+        # 遇到标题时，已累积超过该长度才单独成块（否则标题并入当前块，避免碎块）
+        self.min_chunk_chars = (
+            self.chunk_size // 4 if min_chunk_chars is None else max(int(min_chunk_chars), 0)
+        )
+
+    # -------- 对外 --------
+    def chunks(self, source: Union[str, Iterable[str]]) -> Iterator[Chunk]:
+        segments = [source] if isinstance(source, str) else source
+        buf: List[str] = []
+        buf_len = 0
+        heading: Optional[str] = None
+        buf_heading: Optional[str] = None
+        ordinal = 0
+
+        def emit() -> Optional[Chunk]:
+            nonlocal ordinal
+            text = "".join(buf).strip()
+            if not text:
+                return None
+            chunk = Chunk(ordinal=ordinal, text=text, heading=buf_heading)
+            ordinal += 1
+            return chunk
+
+        for kind, piece in self._pieces(segments):
+            if kind == "heading":
+                if buf_len >= self.min_chunk_chars:
+                    chunk = emit()
+                    if chunk:
+                        yield chunk
+                    buf, buf_len = [], 0
+                heading = piece.strip().lstrip("#").strip()
+                piece = piece.rstrip("\n") + "\n"
+            if buf and buf_len + len(piece) > self.chunk_size:
+                chunk = emit()
+                if chunk:
+                    yield chunk
+                buf = self._overlap_tail(buf, room=self.chunk_size - len(piece))
+                buf_len = sum(len(p) for p in buf)
+                buf_heading = heading
+            if not buf:
+                buf_heading = heading
+            buf.append(piece)
+            buf_len += len(piece)
+
+        chunk = emit()
+        if chunk:
+            yield chunk
+
+    # -------- 内部：片段生成 --------
+    def _pieces(self, segments: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        """
+        产出 ("heading", 行) / ("text", 片段)，每个 text 片段长度 <= chunk_size。
+        段落以空行结束；超长段落/单行按完整句子提前吐出，不等整段读完。
+        """
+        para: List[str] = []
+        para_len = 0
+        rest = ""
+        limit = self.chunk_size * 4
+
+        def flush_para(final: bool) -> Iterator[Tuple[str, str]]:
+            nonlocal para, para_len
+            text = "".join(para)
+            para, para_len = [], 0
+            if not text.strip():
+                return
+            if final:
+                text = text.rstrip() + "\n\n"
+            yield from self._fit(text)
+
+        for seg in segments:
+            if not seg:
+                continue
+            rest += seg
+            lines = rest.split("\n")
+            rest = lines.pop()
+            for line in lines:
+                if not line.strip():
+                    yield from flush_para(final=True)
+                elif _HEADING_RE.match(line):
+                    yield from flush_para(final=True)
+                    yield "heading", line
+                else:
+                    para.append(line + "\n")
+                    para_len += len(line) + 1
+            if para_len + len(rest) > limit:
+                # 超长段落（含无换行的长文本）：先切出完整句子
+                done, rest = _split_complete("".join(para) + rest)
+                para, para_len = [], 0
+                if done:
+                    yield from self._fit(done)
+                if len(rest) > limit:
+                    yield from self._fit(rest[:limit])
+                    rest = rest[limit:]
+
+        if rest:
+            if _HEADING_RE.match(rest):
+                yield from flush_para(final=True)
+                yield "heading", rest
+            else:
+                para.append(rest)
+        yield from flush_para(final=True)
+
+    def _fit(self, text: str) -> Iterator[Tuple[str, str]]:
+        """段落不超长则整体作为一个片段；否则按句子，单句仍超长则硬切。"""
+        if len(text) <= self.chunk_size:
+            yield "text", text
+            return
+        for sentence in split_sentences(text):
+            while len(sentence) > self.chunk_size:
+                yield "text", sentence[: self.chunk_size]
+                sentence = sentence[self.chunk_size:]
+            if sentence:
+                yield "text", sentence
+
+    def _overlap_tail(self, buf: List[str], room: int) -> List[str]:
+        """从上一块末尾取 overlap（不超过新片段剩余空间）：优先整句，整句放不下则取末尾字符。"""
+        limit = min(self.overlap, room)
+        if limit <= 0:
+            return []
+        tail: List[str] = []
+        total = 0
+        for piece in reversed(buf):
+            if total + len(piece) > limit:
+                break
+            tail.insert(0, piece)
+            total += len(piece)
+        if tail:
+            return tail
+        last = buf[-1]
+        sentences = split_sentences(last)
+        for sentence in reversed(sentences):
+            if total + len(sentence) > limit:
+                break
+            tail.insert(0, sentence)
+            total += len(sentence)
+        return tail or [last[-limit:]]
+
+
+def chunk_text(
+    source: Union[str, Iterable[str]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    overlap: int = DEFAULT_CHUNK_OVERLAP,
+) -> Iterator[Chunk]:
+    return TextChunker(chunk_size, overlap).chunks(source)
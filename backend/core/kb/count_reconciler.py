@@ -0,0 +1,141 @@
+# core/kb/count_reconciler.py
+# -*- coding: utf-8 -*-
+"""
+KB 计数对账
+- 统计接口读 kb_doc_counters（触发器随 kb_documents 同事务维护）+ kb_count_adjustments 校正值
+- 本任务周期性地：按 kb_documents 重算计数（纠正绕过触发器的改动），
+  再对每个计数范围（整个 KB / 各私有库 / 各钱包）查一次 Weaviate 实际数，记录两者差值
+- 差值覆盖不经 kb_documents 的写入（如 JD 批量重建直接写向量库）以及两边不一致的历史数据
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from api.routers.kb import _count_scope, _kb_filters, _resolve_kb_config
+from datasource.vectorstores.weaviate_store import CollectionNotReady
+
+
+class KBCountReconciler:
+    def __init__(self, deps_provider: Callable[[], Any]) -> None:
+        self._deps_provider = deps_provider
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            "runs": 0,
+            "scopes_checked": 0,
+            "scopes_drifted": 0,
+            "errors": 0,
+            "last_run_at": None,
+            "last_cost_ms": None,
+        }
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -------- 对账 --------
+    def reconcile(self, app_id: Optional[str] = None, kb_key: Optional[str] = None) -> Dict[str, Any]:
+        """对账全部（或指定 app / KB）；返回 {checked, drifted: {app/kb: {scope: 实际数 - 原统计数}}, errors}。"""
+        deps = self._deps_provider()
+        t = time.time()
+        report: Dict[str, Any] = {"checked": 0, "drifted": {}, "errors": {}}
+        if deps.datasource.weaviate:
+            for a_id, k_key, cfg in self._targets(deps, app_id, kb_key):
+                name = f"{a_id}/{k_key}"
+                try:
+                    drifted = self.reconcile_kb(deps, a_id, k_key, cfg, report)
+                except Exception as e:
+                    report["errors"][name] = str(e)
+                    continue
+                if drifted:
+                    report["drifted"][name] = drifted
+        with self._lock:
+            self._stats["runs"] += 1
+            self._stats["scopes_checked"] += report["checked"]
+            self._stats["scopes_drifted"] += sum(len(v) for v in report["drifted"].values())
+            self._stats["errors"] += len(report["errors"])
+            self._stats["last_run_at"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+            self._stats["last_cost_ms"] = int((time.time() - t) * 1000)
+        if report["drifted"] or report["errors"]:
+            print(f"[kb][count] reconcile: drifted={report['drifted']} errors={report['errors']}")
+        return report
+
+    def reconcile_kb(self, deps, app_id: str, kb_key: str, cfg: dict, report: Dict[str, Any]) -> Dict[str, int]:
+        docs = deps.datasource.kb_documents
+        collection = str(cfg.get("collection") or "").strip()
+        if not collection:
+            return {}
+        docs.rebuild_counters(app_id=app_id, kb_key=kb_key)
+
+        scopes: List[tuple] = [(None, None)]
+        if str(cfg.get("type") or "").strip() == "user_upload":
+            known = docs.count_scopes(app_id=app_id, kb_key=kb_key)
+            scopes.extend((p, None) for p in known["private_db_ids"])
+            scopes.extend((None, w) for w in known["wallet_ids"])
+
+        drifted: Dict[str, int] = {}
+        for private_db_id, data_wallet_id in scopes:
+            scope, where = _count_scope(cfg, private_db_id, data_wallet_id)
+            filters = _kb_filters(cfg, app_id, private_db_id, data_wallet_id)
+            try:
+                actual = deps.datasource.weaviate.count(collection, filters=filters if filters else None)
+            except CollectionNotReady:
+                # collection 还没建好：留到下一轮，不记录校正值
+                return drifted
+            counted = docs.active_count(app_id=app_id, kb_key=kb_key, **where)
+            prev = docs.get_count_adjustment(app_id=app_id, kb_key=kb_key, scope=scope)
+            docs.save_count_adjustment(
+                app_id=app_id, kb_key=kb_key, scope=scope, weaviate_count=actual, sqlite_count=counted,
+            )
+            report["checked"] += 1
+            # 漂移 = 实际数与统计接口此前会给出的数之差
+            reported = counted + (int(prev.get("delta") or 0) if prev else 0)
+            if actual != reported:
+                drifted[scope or "*"] = actual - reported
+        return drifted
+
+    @staticmethod
+    def _targets(deps, app_id: Optional[str], kb_key: Optional[str]):
+        if app_id and kb_key:
+            yield app_id, kb_key, _resolve_kb_config(deps, app_id, kb_key)
+            return
+        for a_id in [app_id] if app_id else deps.app_registry.list_apps():
+            if not (deps.app_registry.plugins_root / a_id / "config.yaml").exists():
+                continue
+            try:
+                kb_cfg = (deps.app_registry.get(a_id).config or {}).get("knowledge_bases", {}) or {}
+            except Exception:
+                continue
+            if not isinstance(kb_cfg, dict):
+                continue
+            for k_key, cfg in kb_cfg.items():
+                if isinstance(cfg, dict) and cfg.get("collection"):
+                    yield a_id, str(k_key), cfg
+
+    # -------- 后台周期任务 --------
+    def start(self, interval_seconds: int) -> None:
+        if interval_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, args=(float(interval_seconds),), name="kb-count-reconcile", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"[kb][count] reconcile failed: err={e}")
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "running": bool(self._thread and self._thread.is_alive())}
@@ -0,0 +1,420 @@
+# core/kb/kb_builder.py
+# -*- coding: utf-8 -*-
+"""
+KBBuilder（分阶段批量写入引擎）
+
+source -> [prepare x P：下载/解析/切块，产出 BuildItem] -> 组批 -> [embed x E] -> [write x W]
+- 阶段之间是有界队列：下游慢时 submit / prepare 自动阻塞（背压）
+- embed 与 write 都按批进行；单批失败只影响该批涉及的 source，不中断整体
+- 每个 source 的全部 item 写完（或失败）后回调 on_done(SourceResult)
+- 各阶段的吞吐与延迟见 report()
+job_runner（单文档多块）与 JD 重建（多来源单对象）都跑在这套引擎上。
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_QUEUE_SIZE = 256
+_BATCH_LINGER_S = 0.2             # 未凑满的批次最多等这么久
+
+_SENTINEL = object()
+# prepare 返回 DEFERRED：该 source 由调用方自行收尾（如转去批量删除），引擎不回调 on_done
+DEFERRED = object()
+
+
+@dataclass
+class BuildItem:
+    object_id: str                 # 向量对象 ID（调用方保证稳定）
+    text: str                      # 待向量化文本
+    properties: Dict[str, Any]
+
+
+@dataclass
+class SourceResult:
+    ref: Any                       # submit 时传入的调用方标识
+    ok: bool
+    items: int = 0                 # prepare 产出的 item 数（0 表示跳过）
+    written: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class StageStats:
+    """单个流水线阶段的计数（线程安全由调用方的锁保证）"""
+    name: str
+    workers: int = 1
+    items: int = 0
+    batches: int = 0
+    busy_s: float = 0.0
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        calls = self.batches or self.items
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "batches": self.batches,
+            "busy_s": round(self.busy_s, 3),
+            "items_per_s": round(self.items / elapsed, 2) if elapsed > 0 else 0.0,
+            "avg_latency_ms": round(self.busy_s * 1000 / calls, 2) if calls else 0.0,
+        }
+
+
+class _Ticket:
+    """单个 source 的在途计数；sealed 且 pending 归零时完成。"""
+
+    __slots__ = ("ref", "pending", "items", "written", "sealed", "error", "fired")
+
+    def __init__(self, ref: Any) -> None:
+        self.ref = ref
+        self.pending = 0
+        self.items = 0
+        self.written = 0
+        self.sealed = False
+        self.error: Optional[str] = None
+        self.fired = False
+
+
+class KBBuilder:
+    def __init__(
+        self,
+        *,
+        prepare: Callable[[Any], Any],
+        embedding_client,
+        weaviate_store,
+        collection: str,
+        app_id: Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        prepare_workers: int = 1,
+        embed_workers: int = 1,
+        write_workers: int = 1,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        on_written: Optional[Callable[[List[BuildItem]], None]] = None,
+        on_done: Optional[Callable[[SourceResult], None]] = None,
+        on_batch_error: Optional[Callable[[str, List[BuildItem], Exception], None]] = None,
+        name: str = "kb-builder",
+    ) -> None:
+        """
+        prepare(source) -> Iterable[BuildItem] | None | DEFERRED；抛异常视为该 source 失败。
+        可以是生成器：item 边产出边进入下游，大文档切块不必整体驻留内存。
+        on_written(items) 在每批写入后以其中写入成功的 item 调用（如写 kb_documents / 侧索引），抛异常视为该批失败；
+        被 Weaviate 逐条拒绝的 item 按失败计入其 source。
+        """
+        self._prepare = prepare
+        self._embedding = embedding_client
+        self._weaviate = weaviate_store
+        self.collection = collection
+        self.app_id = app_id
+        self.batch_size = max(int(batch_size or DEFAULT_BATCH_SIZE), 1)
+        self.name = name
+        self._on_written = on_written
+        self._on_done = on_done
+        self._on_batch_error = on_batch_error
+
+        prepare_workers = max(int(prepare_workers or 1), 1)
+        embed_workers = max(int(embed_workers or 1), 1)
+        write_workers = max(int(write_workers or 1), 1)
+        queue_size = max(int(queue_size or DEFAULT_QUEUE_SIZE), 1)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.st_prepare = StageStats("prepare", workers=prepare_workers)
+        self.st_embed = StageStats("embed", workers=embed_workers)
+        self.st_write = StageStats("write", workers=write_workers)
+
+        self._source_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._item_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._embed_q: "queue.Queue" = queue.Queue(maxsize=embed_workers * 2)
+        self._write_q: "queue.Queue" = queue.Queue(maxsize=write_workers * 2)
+
+        self._counts = {"sources": 0, "items": 0, "written": 0, "failed_items": 0, "failed_sources": 0}
+        self._started_at = 0.0
+        self._closed_at = 0.0
+        self._threads: Dict[str, List[threading.Thread]] = {}
+
+    # -------- 生命周期 --------
+    def start(self) -> "KBBuilder":
+        if self._threads:
+            return self
+        self._started_at = time.time()
+        self._threads = {
+            "prepare": self._spawn(self._prepare_worker, self.st_prepare.workers, "prepare"),
+            "batch": self._spawn(self._batcher, 1, "batch"),
+            "embed": self._spawn(self._embed_worker, self.st_embed.workers, "embed"),
+            "write": self._spawn(self._write_worker, self.st_write.workers, "write"),
+        }
+        return self
+
+    def submit(self, source: Any, ref: Any = None) -> None:
+        """入队一个 source；队列满时阻塞（背压）。"""
+        self._source_q.put((source, _Ticket(source if ref is None else ref)))
+
+    def stop(self) -> None:
+        """不再处理尚未开始的 source（已产出的 item 仍会写完）；被跳过的 source 不回调。"""
+        self._stop.set()
+
+    def close(self) -> None:
+        """按阶段依次排空并等待全部线程退出。"""
+        if not self._threads:
+            return
+        for _ in self._threads["prepare"]:
+            self._source_q.put(_SENTINEL)
+        self._join("prepare")
+        self._item_q.put(_SENTINEL)
+        self._join("batch")
+        self._join("embed")
+        for _ in self._threads["write"]:
+            self._write_q.put(_SENTINEL)
+        self._join("write")
+        self._closed_at = time.time()
+        self._threads = {}
+
+    def __enter__(self) -> "KBBuilder":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.stop()
+        self.close()
+
+    # -------- 指标 --------
+    def queue_sizes(self) -> Dict[str, int]:
+        return {
+            "source": self._source_q.qsize(),
+            "item": self._item_q.qsize(),
+            "embed": self._embed_q.qsize(),
+            "write": self._write_q.qsize(),
+        }
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        end = self._closed_at or time.time()
+        elapsed = end - self._started_at if self._started_at else 0.0
+        with self._lock:
+            return {st.name: st.report(elapsed) for st in (self.st_prepare, self.st_embed, self.st_write)}
+
+    # -------- 内部：线程 --------
+    def _spawn(self, target, n: int, stage: str) -> List[threading.Thread]:
+        threads = [
+            threading.Thread(target=target, name=f"{self.name}-{stage}-{i}", daemon=True) for i in range(n)
+        ]
+        for th in threads:
+            th.start()
+        return threads
+
+    def _join(self, stage: str) -> None:
+        for th in self._threads.get(stage, []):
+            th.join()
+
+    # -------- 内部：各阶段 --------
+    def _prepare_worker(self) -> None:
+        while True:
+            item = self._source_q.get()
+            if item is _SENTINEL:
+                return
+            if self._stop.is_set():
+                continue
+            source, ticket = item
+            busy = 0.0
+            t = time.time()
+            deferred = False
+            try:
+                produced = self._prepare(source)
+                busy += time.time() - t
+                if produced is DEFERRED:
+                    deferred = True
+                elif produced is not None:
+                    it = iter(produced)
+                    while True:
+                        t = time.time()
+                        try:
+                            build_item = next(it)
+                        except StopIteration:
+                            busy += time.time() - t
+                            break
+                        busy += time.time() - t
+                        with self._lock:
+                            ticket.pending += 1
+                            ticket.items += 1
+                            self._counts["items"] += 1
+                        self._item_q.put((build_item, ticket))   # 下游满时阻塞 = 背压
+            except Exception as e:
+                ticket.error = str(e)
+            finally:
+                with self._lock:
+                    self.st_prepare.items += 1
+                    self.st_prepare.busy_s += busy
+                    self._counts["sources"] += 1
+                    ticket.sealed = True
+                if deferred:
+                    ticket.fired = True
+                else:
+                    self._maybe_done(ticket)
+
+    def _batcher(self) -> None:
+        batch: List[Any] = []
+        while True:
+            try:
+                item = self._item_q.get(timeout=_BATCH_LINGER_S if batch else None)
+            except queue.Empty:
+                # 上游暂时没有新 item：不凑满也先发出，避免尾批一直等到 close
+                self._embed_q.put(batch)
+                batch = []
+                continue
+            if item is _SENTINEL:
+                break
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._embed_q.put(batch)
+                batch = []
+        if batch:
+            self._embed_q.put(batch)
+        for _ in range(self.st_embed.workers):
+            self._embed_q.put(_SENTINEL)
+
+    def _embed_worker(self) -> None:
+        while True:
+            batch = self._embed_q.get()
+            if batch is _SENTINEL:
+                return
+            t = time.time()
+            try:
+                vectors = self._embedding.embed([b[0].text for b in batch], app_id=self.app_id)
+                if len(vectors) != len(batch):
+                    raise RuntimeError(f"embedding count mismatch: got {len(vectors)} expected {len(batch)}")
+            except Exception as e:
+                self._fail_batch("embed", batch, e)
+                continue
+            finally:
+                with self._lock:
+                    self.st_embed.batches += 1
+                    self.st_embed.items += len(batch)
+                    self.st_embed.busy_s += time.time() - t
+            self._write_q.put((vectors, batch))
+
+    def _write_worker(self) -> None:
+        while True:
+            item = self._write_q.get()
+            if item is _SENTINEL:
+                return
+            vectors, batch = item
+            items = [b[0] for b in batch]
+            t = time.time()
+            try:
+                res = self._weaviate.upsert_many(
+                    collection=self.collection,
+                    vectors=vectors,
+                    properties_list=[i.properties for i in items],
+                    ids=[i.object_id for i in items],
+                )
+                # 服务端逐条拒绝的对象不算写入：只把成功的交给 on_written，失败的按批失败处理其 source
+                failed = [b for b in batch if b[0].object_id in res.errors]
+                written = [b for b in batch if b[0].object_id not in res.errors]
+                if written and self._on_written is not None:
+                    self._on_written([b[0] for b in written])
+            except Exception as e:
+                self._fail_batch("write", batch, e)
+                continue
+            finally:
+                with self._lock:
+                    self.st_write.batches += 1
+                    self.st_write.items += len(batch)
+                    self.st_write.busy_s += time.time() - t
+
+            if failed:
+                first = failed[0][0].object_id
+                self._fail_batch(
+                    "write",
+                    failed,
+                    RuntimeError(f"{len(failed)} objects rejected, e.g. id={first}: {res.errors[first]}"),
+                )
+            tickets = []
+            with self._lock:
+                self._counts["written"] += len(written)
+                for _, ticket in written:
+                    ticket.written += 1
+                    ticket.pending -= 1
+                    tickets.append(ticket)
+            for ticket in tickets:
+                self._maybe_done(ticket)
+
+    def _fail_batch(self, stage: str, batch: List[Any], err: Exception) -> None:
+        if self._on_batch_error is not None:
+            try:
+                self._on_batch_error(stage, [b[0] for b in batch], err)
+            except Exception:
+                pass
+        else:
+            print(f"[{self.name}] batch {stage} FAILED: n={len(batch)} err={err}")
+        tickets = []
+        with self._lock:
+            self._counts["failed_items"] += len(batch)
+            for _, ticket in batch:
+                ticket.pending -= 1
+                if ticket.error is None:
+                    ticket.error = f"{stage}: {err}"
+                tickets.append(ticket)
+        for ticket in tickets:
+            self._maybe_done(ticket)
+
+    def _maybe_done(self, ticket: _Ticket) -> None:
+        with self._lock:
+            if ticket.fired or not ticket.sealed or ticket.pending > 0:
+                return
+            ticket.fired = True
+            ok = ticket.error is None
+            if not ok:
+                self._counts["failed_sources"] += 1
+        if self._on_done is None:
+            return
+        try:
+            self._on_done(
+                SourceResult(ref=ticket.ref, ok=ok, items=ticket.items, written=ticket.written, error=ticket.error)
+            )
+        except Exception as e:
+            print(f"[{self.name}] on_done callback failed: err={e}")
+
+
+def build_items(
+    items: Iterable[BuildItem],
+    *,
+    embedding_client,
+    weaviate_store,
+    collection: str,
+    app_id: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    embed_workers: int = 1,
+    write_workers: int = 1,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    on_written: Optional[Callable[[List[BuildItem]], None]] = None,
+) -> Tuple[SourceResult, Dict[str, Dict[str, Any]]]:
+    """
+    单个 source 的便捷入口：items（可为惰性生成器）走 embed/write 流水线并等待完成。
+    返回 (SourceResult, 阶段报告)；失败时 ok=False、error 为首个失败原因。
+    """
+    results: List[SourceResult] = []
+    builder = KBBuilder(
+        prepare=lambda src: src,
+        embedding_client=embedding_client,
+        weaviate_store=weaviate_store,
+        collection=collection,
+        app_id=app_id,
+        batch_size=batch_size,
+        embed_workers=embed_workers,
+        write_workers=write_workers,
+        queue_size=queue_size,
+        on_written=on_written,
+        on_done=results.append,
+    )
+    with builder:
+        builder.submit(items, ref=collection)
+    result = results[0] if results else SourceResult(ref=collection, ok=False, error="not processed")
+    return result, builder.report()
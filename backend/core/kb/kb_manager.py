@@ -52,6 +52,48 @@ def _score_from_meta(meta: Dict[str, Any]) -> float:
     return 0.0
 
 
+def kb_return_fields(cfg: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    检索时从 Weaviate 取回的属性（服务端投影，避免把 metadata_json 之类的大字段整条拉回）
+    - 配置 return_fields: [..] 按配置；return_fields: "*" 或 ["*"] 取全部（返回 None）
+    - 未配置：text_field + 该 KB 的过滤字段
+    """
+    fields = cfg.get("return_fields")
+    if fields == "*" or (isinstance(fields, list) and "*" in fields):
+        return None
+    if isinstance(fields, list) and fields:
+        return [str(f) for f in fields if f]
+
+    out = [str(cfg.get("text_field") or "text").strip() or "text"]
+    if str(cfg.get("type") or "").strip() == "user_upload":
+        out.extend(["wallet_id", "private_db_id"])
+        if cfg.get("use_allowed_apps_filter"):
+            out.append("allowed_apps")
+    return out
+
+
+def allowed_apps_filter(app_id: str) -> Dict[str, Any]:
+    """allowed_apps 过滤条件：包含该 app 即可见（TEXT_ARRAY 与迁移前的单值 TEXT 都适用）。"""
+    return {"contains_any": [app_id]}
+
+
+def allowed_apps_list(value: Any) -> List[str]:
+    """allowed_apps 属性值（单值字符串 / 列表 / 空）-> 去重保序的 app_id 列表。"""
+    items = [value] if isinstance(value, str) else list(value or [])
+    return list(dict.fromkeys(str(a) for a in items if a))
+
+
+def allowed_apps_value(weaviate, collection: str, app_ids: Any) -> Any:
+    """
+    写入 allowed_apps 的取值：TEXT_ARRAY 写去重后的列表；
+    迁移前的旧 collection（属性仍是 TEXT）只能写单个 app_id。
+    """
+    apps = allowed_apps_list(app_ids)
+    if weaviate is not None and weaviate.property_type(collection, "allowed_apps") == "text":
+        return apps[0] if apps else ""
+    return apps
+
+
 class KnowledgeBaseManager:
     """
     KB 统一检索入口（中台核心组件）
@@ -113,7 +155,7 @@ class KnowledgeBaseManager:
                 # 如果在写入 user_upload KB 的时候给每条 chunk/文档存了 allowed_apps
                 # 那就按 app_id 再过滤一层（可选但强烈建议）
                 if cfg.get("use_allowed_apps_filter"):
-                    filters["allowed_apps"] = identity.app_id
+                    filters["allowed_apps"] = allowed_apps_filter(identity.app_id)
 
 
             # 4) weaviate search
@@ -123,6 +165,7 @@ class KnowledgeBaseManager:
                     query_vector=qvec,
                     top_k=max(top_k, 0),
                     filters=filters if filters else None,
+                    return_properties=kb_return_fields(cfg),
                 )
             except Exception:
                 continue
@@ -132,7 +175,12 @@ class KnowledgeBaseManager:
                 props = h.get("properties") or {}
                 meta = h.get("metadata") or {}
 
-                text = props.get("text") or props.get("content") or ""
+                text = (
+                    props.get(str(cfg.get("text_field") or "text"))
+                    or props.get("text")
+                    or props.get("content")
+                    or ""
+                )
                 if not text:
                     continue
 
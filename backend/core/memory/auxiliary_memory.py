@@ -8,6 +8,7 @@ import uuid
 from ..embedding.embedding_client import EmbeddingClient
 from identity.models import Identity
 from datasource.base import Datasource
+from datasource.vectorstores.weaviate_store import CollectionNotReady
 
 
 class AuxiliaryMemory:
@@ -18,6 +19,14 @@ class AuxiliaryMemory:
     """
 
     COLLECTION_NAME = "MemoryVectors"
+    PROPERTIES = [
+        wc.Property(name="memory_key", data_type=wc.DataType.TEXT),
+        wc.Property(name="wallet_id", data_type=wc.DataType.TEXT),
+        wc.Property(name="app_id", data_type=wc.DataType.TEXT),
+        wc.Property(name="uid", data_type=wc.DataType.TEXT),
+        wc.Property(name="role", data_type=wc.DataType.TEXT),
+        wc.Property(name="text", data_type=wc.DataType.TEXT),
+    ]
 
     def __init__(self, ds: Datasource, embedding_client: EmbeddingClient):
         self.ds = ds
@@ -41,7 +50,8 @@ class AuxiliaryMemory:
         vector = self.embedding.embed_one(text, app_id=identity.app_id)
 
         if not self._schema_ready:
-            self._ensure_collection()
+            # 写入不能丢：等到后台创建完成（最多 create_timeout_seconds），不按请求线程的短等待快速失败
+            self._ensure_collection(wait=self.ds.weaviate.create_timeout_seconds)
             self._schema_ready = True
 
         properties = {
@@ -68,7 +78,11 @@ class AuxiliaryMemory:
         if not self.ds.weaviate or not query:
             return []
         if not self._schema_ready:
-            self._ensure_collection()
+            try:
+                self._ensure_collection()
+            except CollectionNotReady:
+                # 辅助记忆只是补充上下文：collection 还在后台创建时本次不检索，不阻塞查询
+                return []
             self._schema_ready = True
 
         top_k = max(top_k, 1)
@@ -79,6 +93,7 @@ class AuxiliaryMemory:
             query_vector=qvector,
             top_k=top_k,
             filters={"memory_key": identity.memory_key},
+            return_properties=["uid", "role", "text"],
         )
 
         results = []
@@ -104,15 +119,9 @@ class AuxiliaryMemory:
     # 建表
     # ---------------------------------------------------
 
-    def _ensure_collection(self):
+    def _ensure_collection(self, wait: Optional[float] = None):
         self.ds.weaviate.ensure_collection(
             name=self.COLLECTION_NAME,
-            properties=[
-                wc.Property(name="memory_key", data_type=wc.DataType.TEXT),
-                wc.Property(name="wallet_id", data_type=wc.DataType.TEXT),
-                wc.Property(name="app_id", data_type=wc.DataType.TEXT),
-                wc.Property(name="uid", data_type=wc.DataType.TEXT),
-                wc.Property(name="role", data_type=wc.DataType.TEXT),
-                wc.Property(name="text", data_type=wc.DataType.TEXT),
-            ],
+            properties=self.PROPERTIES,
+            wait=wait,
         )
@@ -118,6 +118,19 @@ class MemoryManager:
         json_cache: Dict[str, dict] = {}
         out: List[Dict[str, Any]] = []
 
+        # 同一会话的多条 context 往往指向少量文件：去重后并发拉取
+        urls = [r.get("url") for r in rows if r.get("url") and r.get("content_sha256")]
+        fetched = self.ds.minio.get_text_many(bucket, urls)
+        # 与逐个读取时一致：读不到的历史文件直接报错，不静默丢消息；连接/限流错误原样抛出
+        fetched.raise_for_errors()
+        for url, raw in fetched.results.items():
+            if not raw:
+                continue
+            try:
+                json_cache[url] = json.loads(raw)
+            except Exception:
+                continue
+
         for r in rows:
             url = r.get("url")
             sha = r.get("content_sha256")
@@ -127,13 +140,7 @@ class MemoryManager:
                 continue
 
             if url not in json_cache:
-                raw = self.ds.minio.get_text(bucket=bucket, key=url)
-                if not raw:
-                    continue
-                try:
-                    json_cache[url] = json.loads(raw)
-                except Exception:
-                    continue
+                continue
 
             data = json_cache[url]
             for msg in data.get("messages", []):
@@ -117,18 +117,19 @@ class PrimaryMemory:
 
         # 读取未摘要内容
         parts: List[str] = []
-        json_cache: dict = {}
 
         if not self.ds.minio:
             raise RuntimeError("MinIO is not enabled")
 
         bucket = self.ds.bucket
 
+        fetched = self.ds.minio.get_text_many(bucket, [item["url"] for item in unsummarized])
+        fetched.raise_for_errors()
+        json_cache = fetched.results
+
         for item in unsummarized:
             key = item["url"]
-            if key not in json_cache:
-                json_cache[key] = self.ds.minio.get_text(bucket=bucket, key=key) or ""
-            raw = json_cache[key]
+            raw = json_cache.get(key) or ""
             if not raw:
                 continue
 
@@ -11,6 +11,7 @@ from datasource.connections.minio_connection import MinioConnection
 from datasource.connections.weaviate_connection import WeaviateConnection
 
 from datasource.objectstores.minio_store import MinIOStore
+from datasource.objectstores.object_cache import ObjectCache
 from datasource.vectorstores.weaviate_store import WeaviateStore
 
 from datasource.sqlstores.identity_session_store import IdentitySessionStore
@@ -22,6 +23,8 @@ from datasource.sqlstores.ingestion_log_store import IngestionLogStore
 from datasource.sqlstores.kb_document_store import KBDocumentStore
 from datasource.sqlstores.ingestion_job_store import IngestionJobStore
 from datasource.sqlstores.private_db_store import PrivateDBStore
+from datasource.sqlstores.rebuild_state_store import RebuildStateStore
+from datasource.sqlstores.collection_alias_store import CollectionAliasStore
 
 class Datasource:
     """
@@ -46,6 +49,8 @@ class Datasource:
         self.kb_documents = KBDocumentStore(self.sqlite_conn)
         self.ingestion_jobs = IngestionJobStore(self.sqlite_conn)
         self.private_dbs = PrivateDBStore(self.sqlite_conn)
+        self.rebuild_state = RebuildStateStore(self.sqlite_conn)
+        self.collection_aliases = CollectionAliasStore(self.sqlite_conn)
 
         # ---------- MinIO ----------
         self.minio_conn = None
@@ -64,8 +69,22 @@ class Datasource:
                 access_key=self.settings.minio_access_key,
                 secret_key=self.settings.minio_secret_key,
                 secure=self.settings.minio_secure,
+                pool_size=self.settings.minio_pool_size,
+            )
+            cache = None
+            if self.settings.minio_cache_enabled:
+                cache = ObjectCache(
+                    max_bytes=self.settings.minio_cache_max_bytes,
+                    ttl_seconds=self.settings.minio_cache_ttl_seconds,
+                    max_object_bytes=self.settings.minio_cache_max_object_bytes,
+                    disk_dir=self.settings.minio_cache_dir or None,
+                    disk_max_bytes=self.settings.minio_cache_disk_max_bytes,
+                )
+            self.minio = MinIOStore(
+                self.minio_conn,
+                cache=cache,
+                part_size=self.settings.minio_part_size,
             )
-            self.minio = MinIOStore(self.minio_conn)
             # MinIOStore 内部已处理“已存在则跳过”
             self.minio.create_bucket(self.bucket)
 
@@ -80,7 +99,12 @@ class Datasource:
                 grpc_port=self.settings.weaviate_grpc_port,
                 api_key=self.settings.weaviate_api_key,
             )
-            self.weaviate = WeaviateStore(self.weaviate_conn)
+            self.weaviate = WeaviateStore(
+                self.weaviate_conn,
+                aliases=self.collection_aliases,
+                ready_wait_seconds=self.settings.weaviate_ready_wait_seconds,
+                create_timeout_seconds=self.settings.weaviate_create_timeout_seconds,
+            )
 
     def close(self):
         # SQLite 是唯一需要显式 close 的资源
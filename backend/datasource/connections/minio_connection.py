@@ -1,8 +1,16 @@
 # datasource/connections/minio_connection.py
+import os
 from typing import Optional
+
+import certifi
+import urllib3
 from minio import Minio
+from urllib3.util import Retry, Timeout
+
 from .common import HealthResult
 
+DEFAULT_POOL_SIZE = 10  # 与 minio 默认 PoolManager(maxsize=10) 一致
+
 
 class MinioConnection:
     """
@@ -11,11 +19,19 @@ class MinioConnection:
     - 提供健康检查
     - 不包含 bucket 名称，不包含业务逻辑
     """
-    def __init__(self, endpoint: str, access_key: str, secret_key: str, secure: bool) -> None:
+    def __init__(
+        self,
+        endpoint: str,
+        access_key: str,
+        secret_key: str,
+        secure: bool,
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ) -> None:
         self.endpoint = endpoint
         self.access_key = access_key
         self.secret_key = secret_key
         self.secure = secure
+        self.pool_size = max(int(pool_size or DEFAULT_POOL_SIZE), 1)
         self._client: Optional[Minio] = None
 
     @property
@@ -26,9 +42,23 @@ class MinioConnection:
                 access_key=self.access_key,
                 secret_key=self.secret_key,
                 secure=self.secure,
+                http_client=self._http_client(),
             )
         return self._client
 
+    def _http_client(self) -> Optional[urllib3.PoolManager]:
+        """连接池大小与批量并发对齐；默认大小时沿用 minio 自带配置。"""
+        if self.pool_size == DEFAULT_POOL_SIZE:
+            return None
+        timeout = 300
+        return urllib3.PoolManager(
+            timeout=Timeout(connect=timeout, read=timeout),
+            maxsize=self.pool_size,
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+            retries=Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+        )
+
     def health(self, enabled: bool = True) -> HealthResult:
         if not enabled:
             return HealthResult(status="disabled", details="minio disabled")
@@ -10,8 +10,9 @@ from __future__ import annotations
 import os
 import sqlite3
 import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Iterable, Optional
+from typing import Any, Iterable, Iterator, Optional
 
 
 CORE_DDL = r"""
@@ -171,12 +172,53 @@ CREATE TABLE IF NOT EXISTS ingestion_jobs (
   options_json  TEXT,
   result_json   TEXT,
   error_message TEXT,
+  attempts      INTEGER NOT NULL DEFAULT 0,
+  lease_owner   TEXT,              -- 当前持有租约的 worker
+  lease_expires_at TEXT,           -- 租约到期时间，过期视为 worker 崩溃
+  next_run_at   TEXT,              -- 重试退避：早于该时间不可被领取
+  claimed_at    TEXT,              -- 最近一次被领取的时间（公平调度统计用）
+  priority      INTEGER NOT NULL DEFAULT 0,  -- 租户内优先级，越大越先
+  batch_id      TEXT,              -- 批量提交时所属批次
   created_at    TEXT NOT NULL DEFAULT (datetime('now')),
   updated_at    TEXT NOT NULL DEFAULT (datetime('now')),
   started_at    TEXT,
   finished_at   TEXT
 );
 
+CREATE TABLE IF NOT EXISTS ingestion_batches (
+  id            TEXT PRIMARY KEY,
+  wallet_id     TEXT NOT NULL,
+  app_id        TEXT NOT NULL,
+  kb_key        TEXT NOT NULL,
+  source_prefix TEXT,              -- 按 minio:// 前缀提交时记录前缀
+  total         INTEGER NOT NULL DEFAULT 0,
+  created_at    TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingestion_batches_wallet
+  ON ingestion_batches (wallet_id, created_at DESC);
+
+-- 前缀同步状态（kb_sync 作业）：每个 app/kb/钱包/私有库/前缀一行
+CREATE TABLE IF NOT EXISTS ingestion_sync_state (
+  sync_key      TEXT PRIMARY KEY,
+  wallet_id     TEXT NOT NULL,
+  app_id        TEXT NOT NULL,
+  kb_key        TEXT NOT NULL,
+  data_wallet_id TEXT,
+  private_db_id TEXT,
+  source_prefix TEXT NOT NULL,     -- minio://bucket/prefix
+  watermark     TEXT,              -- 已同步对象的最大 last_modified（UTC ISO）
+  last_job_id   INTEGER,
+  last_batch_id TEXT,
+  last_synced_at TEXT,
+  stats_json    TEXT,
+  created_at    TEXT NOT NULL DEFAULT (datetime('now')),
+  updated_at    TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingestion_sync_state_app
+  ON ingestion_sync_state (app_id, kb_key);
+
 CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status
   ON ingestion_jobs (status, created_at DESC);
 
@@ -212,6 +254,10 @@ CREATE TABLE IF NOT EXISTS kb_documents (
   source_id     TEXT,
   file_type     TEXT,
   content_sha256 TEXT,
+  parent_doc_id TEXT,              -- 切块写入时所属的源文档 ID（整文档写入为空）
+  chunk_index   INTEGER,           -- 块序号（从 0 开始）
+  source_etag   TEXT,              -- 摄取时源对象的 ETag（前缀同步比对用）
+  source_size   INTEGER,           -- 摄取时源对象的字节数
   status        TEXT NOT NULL DEFAULT 'active',
   created_at    TEXT NOT NULL DEFAULT (datetime('now')),
   updated_at    TEXT NOT NULL DEFAULT (datetime('now'))
@@ -226,6 +272,149 @@ CREATE INDEX IF NOT EXISTS idx_kb_documents_wallet
 
 CREATE INDEX IF NOT EXISTS idx_kb_documents_status
   ON kb_documents (status, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_kb_documents_sha256
+  ON kb_documents (content_sha256, app_id, kb_key);
+
+-- KB 来源引用：不单独持有向量、指向已有文档的来源（内容去重命中的来源等）
+-- doc_id 是主键，同一份向量的其它来源无法再占一行 kb_documents，记在这里供前缀同步与去重识别
+CREATE TABLE IF NOT EXISTS kb_document_refs (
+  ref_id         TEXT PRIMARY KEY,
+  doc_id         TEXT NOT NULL,     -- 持有向量的文档：kb_documents.doc_id，切块文档为 parent_doc_id
+  app_id         TEXT NOT NULL,
+  kb_key         TEXT NOT NULL,
+  wallet_id      TEXT,
+  private_db_id  TEXT,
+  source_url     TEXT,
+  source_type    TEXT,
+  source_id      TEXT,
+  file_type      TEXT,
+  content_sha256 TEXT,
+  source_etag    TEXT,
+  source_size    INTEGER,
+  status         TEXT NOT NULL DEFAULT 'active',
+  created_at     TEXT NOT NULL DEFAULT (datetime('now')),
+  updated_at     TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_kb_document_refs_source
+  ON kb_document_refs (app_id, kb_key, source_url);
+
+CREATE INDEX IF NOT EXISTS idx_kb_document_refs_doc
+  ON kb_document_refs (doc_id, status);
+
+CREATE INDEX IF NOT EXISTS idx_kb_document_refs_sha256
+  ON kb_document_refs (content_sha256, app_id, kb_key);
+
+-- KB 文档计数（按 app/kb/钱包/私有库聚合 active 文档数）：由 kb_documents 上的触发器在同一事务内维护
+CREATE TABLE IF NOT EXISTS kb_doc_counters (
+  app_id        TEXT NOT NULL,
+  kb_key        TEXT NOT NULL,
+  wallet_id     TEXT NOT NULL DEFAULT '',
+  private_db_id TEXT NOT NULL DEFAULT '',
+  active        INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (app_id, kb_key, wallet_id, private_db_id)
+);
+
+-- KB 计数校正：对账任务记录的「Weaviate 实际数 - kb_documents 计数」（覆盖绕过 kb_documents 的写入）
+CREATE TABLE IF NOT EXISTS kb_count_adjustments (
+  app_id          TEXT NOT NULL,
+  kb_key          TEXT NOT NULL,
+  scope           TEXT NOT NULL,   -- '' 整个 KB / private_db:<id> / wallet:<id>
+  delta           INTEGER NOT NULL DEFAULT 0,
+  weaviate_count  INTEGER NOT NULL DEFAULT 0,
+  sqlite_count    INTEGER NOT NULL DEFAULT 0,
+  reconciled_at   TEXT NOT NULL DEFAULT (datetime('now')),
+  PRIMARY KEY (app_id, kb_key, scope)
+);
+
+-- 重建任务侧索引：collection 内对象的内容 hash（增量跳过用）
+CREATE TABLE IF NOT EXISTS rebuild_hash_index (
+  collection  TEXT NOT NULL,
+  object_id   TEXT NOT NULL,
+  hash        TEXT NOT NULL,
+  updated_at  TEXT NOT NULL DEFAULT (datetime('now')),
+  PRIMARY KEY (collection, object_id)
+);
+
+-- JD 等批量重建：每家公司的 manifest 版本与断点
+CREATE TABLE IF NOT EXISTS rebuild_company_state (
+  collection     TEXT NOT NULL,
+  company        TEXT NOT NULL,
+  crawl_date     TEXT NOT NULL,
+  manifest_etag  TEXT NOT NULL DEFAULT '',
+  files_total    INTEGER NOT NULL DEFAULT 0,
+  files_done     INTEGER NOT NULL DEFAULT 0,   -- 连续完成的前缀长度（断点）
+  status         TEXT NOT NULL DEFAULT 'running',  -- running / done
+  updated_at     TEXT NOT NULL DEFAULT (datetime('now')),
+  PRIMARY KEY (collection, company)
+);
+
+-- 批量重建运行记录
+CREATE TABLE IF NOT EXISTS rebuild_runs (
+  id           INTEGER PRIMARY KEY AUTOINCREMENT,
+  collection   TEXT NOT NULL,
+  status       TEXT NOT NULL DEFAULT 'running',  -- running / success / interrupted / failed
+  params_json  TEXT,
+  stats_json   TEXT,
+  started_at   TEXT NOT NULL DEFAULT (datetime('now')),
+  finished_at  TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_rebuild_runs_collection
+  ON rebuild_runs (collection, started_at DESC);
+
+-- 逻辑 collection 名 -> 物理 collection（蓝绿重建原子切换）
+CREATE TABLE IF NOT EXISTS collection_aliases (
+  alias       TEXT PRIMARY KEY,
+  target      TEXT NOT NULL,
+  previous    TEXT,
+  updated_at  TEXT NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+
+def _counter_delta(row: str, delta: str) -> str:
+    scope = (
+        f"{row}.app_id, {row}.kb_key, COALESCE({row}.wallet_id, ''), COALESCE({row}.private_db_id, '')"
+    )
+    match = (
+        f"app_id = {row}.app_id AND kb_key = {row}.kb_key "
+        f"AND wallet_id = COALESCE({row}.wallet_id, '') AND private_db_id = COALESCE({row}.private_db_id, '')"
+    )
+    # 不用 INSERT OR IGNORE：外层 upsert 的冲突策略会覆盖触发器内的 OR IGNORE
+    return f"""
+  INSERT INTO kb_doc_counters(app_id, kb_key, wallet_id, private_db_id, active)
+  SELECT {scope}, 0 WHERE NOT EXISTS (SELECT 1 FROM kb_doc_counters WHERE {match});
+  UPDATE kb_doc_counters SET active = active {delta} 1 WHERE {match};"""
+
+
+# upsert 的 DO UPDATE 分支同样触发 UPDATE 触发器：先减旧范围再加新范围，范围/状态不变时净值为 0
+_KB_COUNTER_TRIGGERS = {
+    "trg_kb_documents_count_insert": (
+        "AFTER INSERT ON kb_documents WHEN NEW.status = 'active' BEGIN"
+        + _counter_delta("NEW", "+") + "\nEND"
+    ),
+    "trg_kb_documents_count_update_old": (
+        "AFTER UPDATE OF status, app_id, kb_key, wallet_id, private_db_id ON kb_documents "
+        "WHEN OLD.status = 'active' BEGIN" + _counter_delta("OLD", "-") + "\nEND"
+    ),
+    "trg_kb_documents_count_update_new": (
+        "AFTER UPDATE OF status, app_id, kb_key, wallet_id, private_db_id ON kb_documents "
+        "WHEN NEW.status = 'active' BEGIN" + _counter_delta("NEW", "+") + "\nEND"
+    ),
+    "trg_kb_documents_count_delete": (
+        "AFTER DELETE ON kb_documents WHEN OLD.status = 'active' BEGIN"
+        + _counter_delta("OLD", "-") + "\nEND"
+    ),
+}
+
+_KB_COUNTER_BACKFILL = """
+INSERT OR REPLACE INTO kb_doc_counters(app_id, kb_key, wallet_id, private_db_id, active)
+SELECT app_id, kb_key, COALESCE(wallet_id, ''), COALESCE(private_db_id, ''), COUNT(*)
+  FROM kb_documents
+ WHERE status = 'active'
+ GROUP BY app_id, kb_key, COALESCE(wallet_id, ''), COALESCE(private_db_id, '')
 """
 
 
@@ -251,7 +440,18 @@ class SQLiteConnection:
         self._ensure_column("ingestion_logs", "wallet_id", "wallet_id TEXT")
         self._ensure_column("ingestion_jobs", "data_wallet_id", "data_wallet_id TEXT")
         self._ensure_column("ingestion_jobs", "private_db_id", "private_db_id TEXT")
+        self._ensure_column("ingestion_jobs", "attempts", "attempts INTEGER NOT NULL DEFAULT 0")
+        self._ensure_column("ingestion_jobs", "lease_owner", "lease_owner TEXT")
+        self._ensure_column("ingestion_jobs", "lease_expires_at", "lease_expires_at TEXT")
+        self._ensure_column("ingestion_jobs", "next_run_at", "next_run_at TEXT")
+        self._ensure_column("ingestion_jobs", "claimed_at", "claimed_at TEXT")
+        self._ensure_column("ingestion_jobs", "priority", "priority INTEGER NOT NULL DEFAULT 0")
+        self._ensure_column("ingestion_jobs", "batch_id", "batch_id TEXT")
         self._ensure_column("kb_documents", "private_db_id", "private_db_id TEXT")
+        self._ensure_column("kb_documents", "parent_doc_id", "parent_doc_id TEXT")
+        self._ensure_column("kb_documents", "chunk_index", "chunk_index INTEGER")
+        self._ensure_column("kb_documents", "source_etag", "source_etag TEXT")
+        self._ensure_column("kb_documents", "source_size", "source_size INTEGER")
         self._ensure_index(
             "CREATE INDEX IF NOT EXISTS idx_app_registry_owner ON app_registry (owner_wallet_id, created_at DESC)"
         )
@@ -267,6 +467,46 @@ class SQLiteConnection:
         self._ensure_index(
             "CREATE INDEX IF NOT EXISTS idx_kb_documents_private_db ON kb_documents (private_db_id, created_at DESC)"
         )
+        self._ensure_index(
+            "CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_claim ON ingestion_jobs (status, next_run_at, created_at)"
+        )
+        self._ensure_index(
+            "CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_lease ON ingestion_jobs (status, lease_expires_at)"
+        )
+        self._ensure_index(
+            "CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_tenant "
+            "ON ingestion_jobs (status, wallet_id, app_id, priority DESC, created_at)"
+        )
+        self._ensure_index(
+            "CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_claimed ON ingestion_jobs (claimed_at)"
+        )
+        self._ensure_index(
+            "CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_batch ON ingestion_jobs (batch_id, status)"
+        )
+        self._ensure_index(
+            "CREATE INDEX IF NOT EXISTS idx_kb_documents_sha256 ON kb_documents (content_sha256, app_id, kb_key)"
+        )
+        self._ensure_index(
+            "CREATE INDEX IF NOT EXISTS idx_kb_documents_parent ON kb_documents (parent_doc_id, chunk_index)"
+        )
+        self._ensure_index(
+            "CREATE INDEX IF NOT EXISTS idx_kb_documents_source ON kb_documents (app_id, kb_key, source_url)"
+        )
+        self._ensure_kb_doc_counters()
+
+    def _ensure_kb_doc_counters(self) -> None:
+        """
+        kb_doc_counters 的维护触发器（依赖 _ensure_column 补齐的列，所以不放在 CORE_DDL 里）。
+        计数表为空而 kb_documents 有 active 数据时（首次升级）从 kb_documents 回填。
+        """
+        with self._lock, self._conn:
+            for name, ddl in _KB_COUNTER_TRIGGERS.items():
+                self._conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {ddl}")
+            empty = self._conn.execute("SELECT 1 FROM kb_doc_counters LIMIT 1").fetchone() is None
+            if empty and self._conn.execute(
+                "SELECT 1 FROM kb_documents WHERE status = 'active' LIMIT 1"
+            ).fetchone():
+                self._conn.execute(_KB_COUNTER_BACKFILL)
 
     def _ensure_column(self, table: str, column: str, ddl: str) -> None:
         try:
@@ -295,6 +535,22 @@ class SQLiteConnection:
         with self._lock, self._conn:
             return self._conn.execute(sql, params)
 
+    def executemany(self, sql: str, seq_of_params: Iterable[Iterable[Any]]) -> sqlite3.Cursor:
+        with self._lock, self._conn:
+            return self._conn.executemany(sql, seq_of_params)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """多条写语句放在同一事务里（持锁期间其它线程不可写）。"""
+        with self._lock, self._conn:
+            yield self._conn
+
+    def execute_returning(self, sql: str, params: Iterable[Any] = ()) -> list[dict]:
+        """写语句 + RETURNING：在同一事务内取回结果行。"""
+        with self._lock, self._conn:
+            cur = self._conn.execute(sql, params)
+            return [dict(r) for r in cur.fetchall()]
+
     def query_all(self, sql: str, params: Iterable[Any] = ()) -> list[dict]:
         with self._lock:
             cur = self._conn.execute(sql, params)
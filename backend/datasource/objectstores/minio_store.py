@@ -1,9 +1,80 @@
 # datasource/objectstores/minio_store.py
 from __future__ import annotations
+import hashlib
 import io, json
-from typing import Optional, List
-from minio.error import S3Error
-from ..connections.minio_connection import MinioConnection
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional, List, Iterator, BinaryIO, Tuple
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error, ServerError
+from ..connections.minio_connection import MinioConnection, DEFAULT_POOL_SIZE
+from .object_cache import ObjectCache
+
+
+DEFAULT_PART_SIZE = 16 * 1024 * 1024  # multipart 分片大小（MinIO 要求 >= 5MiB）
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 1024 * 1024       # 流式读取块大小
+DELETE_CHUNK_SIZE = 1000               # 单次 DeleteObjects 的 key 数（S3 上限）
+
+
+class HashingReader:
+    """
+    包装任意 read() 流：边读边计算 sha256 与字节数。
+    用于“单遍上传 + 哈希”，避免整文件读入内存。
+    """
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.size = 0
+        self._sha = hashlib.sha256()
+
+    def read(self, n: int = -1) -> bytes:
+        data = self.raw.read(n)
+        if data:
+            self._sha.update(data)
+            self.size += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+_MISSING_CODES = ("NoSuchKey", "NoSuchObject", "ResourceNotFound")
+
+
+@dataclass
+class BatchResult:
+    """批量操作结果：按 key 分别记录成功值与错误信息（exceptions 为原始异常，批量删除时为空）。"""
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    exceptions: Dict[str, Exception] = field(default_factory=dict, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def raise_for_errors(self) -> None:
+        """
+        有错误时抛出，语义同逐个读取：连接失败、限流等原样抛出原始异常（优先），
+        只有对象不存在（NoSuchKey）时才抛 FileNotFoundError。
+        """
+        missing: List[str] = []
+        for key in self.errors:
+            exc = self.exceptions.get(key)
+            if isinstance(exc, S3Error) and exc.code in _MISSING_CODES:
+                missing.append(key)
+            elif exc is not None:
+                raise exc
+            else:
+                raise RuntimeError(f"{key}: {self.errors[key]}")
+        if missing:
+            raise FileNotFoundError(f"MinIO objects not found: {sorted(missing)[:5]}")
+
+
+def _etag_of(resp) -> str:
+    headers = getattr(resp, "headers", None) or {}
+    return str(headers.get("ETag") or headers.get("etag") or "").strip()
 
 
 class MinIOStore:
@@ -13,10 +84,20 @@ class MinIOStore:
     - 不创建 bucket（由上层决定）
     - 不提供 make_key（由上层决定）
     - 提供最纯粹的存储 API
+    - 可选 ObjectCache：读穿透缓存，TTL 后用 ETag 条件请求续期
     """
 
-    def __init__(self, conn: MinioConnection):
+    def __init__(
+        self,
+        conn: MinioConnection,
+        cache: Optional[ObjectCache] = None,
+        part_size: int = DEFAULT_PART_SIZE,
+    ):
         self.conn = conn
+        self.cache = cache
+        self.part_size = max(int(part_size or DEFAULT_PART_SIZE), MIN_PART_SIZE)
+        # 批量并发与 urllib3 连接池大小对齐，避免线程排队等连接
+        self.max_workers = int(getattr(conn, "pool_size", DEFAULT_POOL_SIZE) or DEFAULT_POOL_SIZE)
 
     @property
     def client(self):
@@ -31,29 +112,234 @@ class MinIOStore:
             self.client.make_bucket(bucket)
 
     def delete_bucket(self, bucket: str) -> None:
-        for obj in self.client.list_objects(bucket, recursive=True):
-            self.client.remove_object(bucket, obj.object_name)
+        res = self.delete_many(bucket, self.iter_keys(bucket), keep_results=False)
+        if res.errors:
+            raise RuntimeError(f"delete_bucket failed: bucket={bucket} errors={len(res.errors)}")
         self.client.remove_bucket(bucket)
 
     # -------- Object API --------
     def put_bytes(self, bucket: str, key: str, data: bytes, content_type: Optional[str] = None) -> str:
         self.client.put_object(bucket, key, io.BytesIO(data), len(data), content_type=content_type)
+        if self.cache:
+            self.cache.invalidate(bucket, key)
         return key
 
     def get_bytes(self, bucket: str, key: str) -> bytes:
-        resp = self.client.get_object(bucket, key)
+        if not self.cache:
+            return self._fetch(bucket, key)[0]
+
+        entry = self.cache.get(bucket, key)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.record_hit(entry)
+            return entry.data
+
+        if entry is not None and entry.etag:
+            try:
+                data, etag = self._fetch(bucket, key, if_none_match=entry.etag)
+            except ServerError as e:
+                if e.status_code != 304:
+                    raise
+                self.cache.touch(bucket, key)
+                self.cache.record_hit(entry, revalidated=True)
+                return entry.data
+        else:
+            data, etag = self._fetch(bucket, key)
+
+        self.cache.record_miss(len(data))
+        self.cache.put(bucket, key, data, etag)
+        return data
+
+    def put_stream(
+        self,
+        bucket: str,
+        key: str,
+        stream: BinaryIO,
+        length: int = -1,
+        content_type: Optional[str] = None,
+        part_size: Optional[int] = None,
+    ) -> str:
+        """
+        流式上传：length=-1 时走 multipart，按 part_size 分片读取，
+        内存占用与分片大小相关而非文件大小。
+        """
+        size = max(int(part_size or self.part_size), MIN_PART_SIZE)
+        self.client.put_object(
+            bucket,
+            key,
+            stream,
+            length,
+            content_type=content_type or "application/octet-stream",
+            part_size=size if length < 0 else 0,
+        )
+        if self.cache:
+            self.cache.invalidate(bucket, key)
+        return key
+
+    def get_stream(
+        self,
+        bucket: str,
+        key: str,
+        *,
+        offset: int = 0,
+        length: int = 0,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Iterator[bytes]:
+        """流式读取（可带 offset/length 做 Range 读），按块 yield，不经过缓存。"""
+        resp = self.client.get_object(bucket, key, offset=offset, length=length)
+        try:
+            for chunk in resp.stream(chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    def get_range(self, bucket: str, key: str, offset: int, length: int) -> bytes:
+        resp = self.client.get_object(bucket, key, offset=offset, length=length)
         try:
             return resp.read()
         finally:
             resp.close()
             resp.release_conn()
 
+    def stat(self, bucket: str, key: str) -> Optional[dict]:
+        """对象元信息；不存在返回 None。"""
+        try:
+            obj = self.client.stat_object(bucket, key)
+        except S3Error as e:
+            if e.code in _MISSING_CODES:
+                return None
+            raise
+        return {
+            "key": key,
+            "size": int(obj.size or 0),
+            "etag": str(obj.etag or "").strip('"'),
+            "last_modified": obj.last_modified,
+            "content_type": obj.content_type,
+        }
+
+    def _fetch(self, bucket: str, key: str, if_none_match: str = "") -> tuple[bytes, str]:
+        headers = {"If-None-Match": if_none_match} if if_none_match else None
+        resp = self.client.get_object(bucket, key, request_headers=headers)
+        try:
+            return resp.read(), _etag_of(resp)
+        finally:
+            resp.close()
+            resp.release_conn()
+
     def delete(self, bucket: str, key: str) -> None:
         self.client.remove_object(bucket, key)
+        if self.cache:
+            self.cache.invalidate(bucket, key)
+
+    def cache_stats(self) -> Optional[dict]:
+        return self.cache.stats() if self.cache else None
+
+    # -------- Batch API（有界线程池 + 批量删除） --------
+    def _run_many(self, keys: List[str], fn: Callable[[str], Any], max_workers: Optional[int]) -> BatchResult:
+        out = BatchResult()
+        if not keys:
+            return out
+        workers = max(1, min(int(max_workers or self.max_workers), len(keys)))
+
+        def _one(key: str) -> Tuple[str, Any, Optional[Exception]]:
+            try:
+                return key, fn(key), None
+            except Exception as e:
+                return key, None, e
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for key, value, err in pool.map(_one, keys):
+                if err is not None:
+                    out.errors[key] = str(err)
+                    out.exceptions[key] = err
+                else:
+                    out.results[key] = value
+        return out
+
+    def get_many(self, bucket: str, keys: Iterable[str], *, max_workers: Optional[int] = None) -> BatchResult:
+        """并发读取多个对象：results[key] = bytes（走缓存）。"""
+        uniq = list(dict.fromkeys(keys))
+        return self._run_many(uniq, lambda k: self.get_bytes(bucket, k), max_workers)
+
+    def get_text_many(
+        self, bucket: str, keys: Iterable[str], *, encoding="utf-8", max_workers: Optional[int] = None
+    ) -> BatchResult:
+        uniq = list(dict.fromkeys(keys))
+        return self._run_many(uniq, lambda k: self.get_text(bucket, k, encoding), max_workers)
+
+    def get_json_many(self, bucket: str, keys: Iterable[str], *, max_workers: Optional[int] = None) -> BatchResult:
+        uniq = list(dict.fromkeys(keys))
+        return self._run_many(uniq, lambda k: self.get_json(bucket, k), max_workers)
+
+    def put_many(
+        self,
+        bucket: str,
+        items: Dict[str, bytes],
+        content_type: Optional[str] = None,
+        *,
+        max_workers: Optional[int] = None,
+    ) -> BatchResult:
+        """并发写入：items = {key: bytes}，results[key] = key。"""
+        return self._run_many(
+            list(items.keys()),
+            lambda k: self.put_bytes(bucket, k, items[k], content_type),
+            max_workers,
+        )
+
+    def delete_many(self, bucket: str, keys: Iterable[str], *, keep_results: bool = True) -> BatchResult:
+        """
+        批量删除：使用 S3 DeleteObjects，每次取 DELETE_CHUNK_SIZE 个 key（块内去重）提交一批；
+        keys 可以是生成器（如 list_objects 的结果），任一时刻只展开一块。
+        keep_results=False 时不记录成功的 key（只记错误），删除整个 bucket 等大批量场景内存不随 key 数增长。
+        """
+        out = BatchResult()
+        it = iter(keys)
+        while True:
+            chunk = list(dict.fromkeys(islice(it, DELETE_CHUNK_SIZE)))
+            if not chunk:
+                break
+            failed = set()
+            for err in self.client.remove_objects(bucket, (DeleteObject(k) for k in chunk)):
+                name = getattr(err, "name", "") or ""
+                failed.add(name)
+                out.errors[name] = f"{getattr(err, 'code', '')}: {getattr(err, 'message', '')}".strip(": ")
+            for k in chunk:
+                if k in failed:
+                    continue
+                if keep_results:
+                    out.results[k] = True
+                if self.cache:
+                    self.cache.invalidate(bucket, k)
+        return out
 
     def list(self, bucket: str, prefix: str = "", recursive=True) -> List[str]:
         return [o.object_name for o in self.client.list_objects(bucket, prefix, recursive)]
 
+    def iter_keys(self, bucket: str, prefix: str = "", recursive: bool = True) -> Iterator[str]:
+        """流式列出对象 key（不含“目录”），不会一次性展开到内存。"""
+        for o in self.client.list_objects(bucket, prefix, recursive):
+            if not o.is_dir:
+                yield o.object_name
+
+    def iter_objects(self, bucket: str, prefix: str = "", recursive: bool = True) -> Iterator[dict]:
+        """流式列出对象元信息（key / size / etag / last_modified），字段同 stat()，不额外发 HEAD 请求。"""
+        for o in self.client.list_objects(bucket, prefix, recursive):
+            if o.is_dir:
+                continue
+            yield {
+                "key": o.object_name,
+                "size": int(o.size or 0),
+                "etag": str(o.etag or "").strip('"'),
+                "last_modified": o.last_modified,
+            }
+
+    def iter_prefixes(self, bucket: str, prefix: str = "") -> Iterator[str]:
+        """非递归列出 prefix 下一级“目录”（以 / 结尾），流式返回。"""
+        for o in self.client.list_objects(bucket, prefix, recursive=False):
+            if o.is_dir:
+                yield o.object_name
+
     # -------- Text / JSON API（轻量方便） --------
     def put_text(self, bucket: str, key: str, text: str, encoding="utf-8") -> str:
         return self.put_bytes(bucket, key, text.encode(encoding), "text/plain")
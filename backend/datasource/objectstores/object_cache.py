@@ -0,0 +1,282 @@
+# datasource/objectstores/object_cache.py
+# -*- coding: utf-8 -*-
+"""
+ObjectCache（MinIO 读穿透缓存）
+- 内存层：按字节数限容的 LRU
+- 磁盘层：可选，内存淘汰后仍可命中，进程重启可复用
+- TTL 过期后不直接丢弃，由 MinIOStore 带 ETag 做条件请求（304 即续期）
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+_DISK_TRIM_EVERY = 64
+
+
+@dataclass
+class CacheEntry:
+    data: bytes
+    etag: str = ""
+    validated_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0              # TTL 内直接命中
+    revalidated: int = 0       # TTL 过期但 304 续期
+    misses: int = 0            # 需要完整拉取
+    disk_hits: int = 0         # 内存未命中、磁盘命中
+    evictions: int = 0
+    bytes_saved: int = 0       # 因命中/304 未经网络传输的字节数
+    bytes_fetched: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.revalidated + self.misses
+        if total <= 0:
+            return 0.0
+        return (self.hits + self.revalidated) / total
+
+    def as_dict(self) -> dict:
+        out = asdict(self)
+        out["hit_ratio"] = round(self.hit_ratio, 4)
+        return out
+
+
+def _cache_key(bucket: str, key: str) -> Tuple[str, str]:
+    return bucket, key
+
+
+class ObjectCache:
+    """线程安全的对象缓存（不访问网络，网络交互由 MinIOStore 负责）"""
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 30.0,
+        max_object_bytes: int = 4 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        self.max_bytes = max(int(max_bytes), 0)
+        self.ttl_seconds = max(float(ttl_seconds), 0.0)
+        self.max_object_bytes = max(int(max_object_bytes), 0)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = max(int(disk_max_bytes), 0)
+
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        self._disk_writes = 0
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    # -------- 查询 --------
+    def get(self, bucket: str, key: str) -> Optional[CacheEntry]:
+        ck = _cache_key(bucket, key)
+        with self._lock:
+            entry = self._entries.get(ck)
+            if entry is not None:
+                self._entries.move_to_end(ck)
+                return entry
+
+        entry = self._disk_read(bucket, key)
+        if entry is None:
+            return None
+        with self._lock:
+            self._stats.disk_hits += 1
+            self._store_locked(ck, entry)
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return (time.time() - entry.validated_at) < self.ttl_seconds
+
+    def cacheable(self, size: int) -> bool:
+        if self.max_bytes <= 0:
+            return False
+        limit = self.max_object_bytes or self.max_bytes
+        return 0 <= size <= min(limit, self.max_bytes)
+
+    # -------- 写入 / 续期 / 失效 --------
+    def put(self, bucket: str, key: str, data: bytes, etag: str = "") -> None:
+        if not self.cacheable(len(data)):
+            self.invalidate(bucket, key)
+            return
+        entry = CacheEntry(data=data, etag=etag or "", validated_at=time.time())
+        with self._lock:
+            self._store_locked(_cache_key(bucket, key), entry)
+        self._disk_write(bucket, key, entry)
+
+    def touch(self, bucket: str, key: str) -> None:
+        """304 后续期：只更新校验时间。"""
+        ck = _cache_key(bucket, key)
+        with self._lock:
+            entry = self._entries.get(ck)
+            if entry is None:
+                return
+            entry.validated_at = time.time()
+        self._disk_write_meta(bucket, key, entry)
+
+    def invalidate(self, bucket: str, key: str) -> None:
+        ck = _cache_key(bucket, key)
+        with self._lock:
+            entry = self._entries.pop(ck, None)
+            if entry is not None:
+                self._bytes -= entry.size
+        self._disk_remove(bucket, key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.disk_dir:
+            for p in self.disk_dir.glob("*.bin"):
+                self._unlink(p)
+                self._unlink(p.with_suffix(".meta"))
+
+    # -------- 指标 --------
+    def record_hit(self, entry: CacheEntry, *, revalidated: bool = False) -> None:
+        with self._lock:
+            if revalidated:
+                self._stats.revalidated += 1
+            else:
+                self._stats.hits += 1
+            self._stats.bytes_saved += entry.size
+
+    def record_miss(self, fetched_bytes: int) -> None:
+        with self._lock:
+            self._stats.misses += 1
+            self._stats.bytes_fetched += max(int(fetched_bytes), 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = self._stats.as_dict()
+            out["enabled"] = True
+            out["entries"] = len(self._entries)
+            out["memory_bytes"] = self._bytes
+            out["max_bytes"] = self.max_bytes
+            out["ttl_seconds"] = self.ttl_seconds
+            out["disk_enabled"] = bool(self.disk_dir)
+        return out
+
+    # -------- 内部：内存 LRU --------
+    def _store_locked(self, ck: Tuple[str, str], entry: CacheEntry) -> None:
+        old = self._entries.pop(ck, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._entries[ck] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self._stats.evictions += 1
+
+    # -------- 内部：磁盘层 --------
+    def _disk_path(self, bucket: str, key: str) -> Optional[Path]:
+        if not self.disk_dir:
+            return None
+        digest = hashlib.sha256(f"{bucket}/{key}".encode("utf-8")).hexdigest()
+        return self.disk_dir / f"{digest}.bin"
+
+    def _disk_read(self, bucket: str, key: str) -> Optional[CacheEntry]:
+        path = self._disk_path(bucket, key)
+        if path is None or not path.exists():
+            return None
+        try:
+            meta = json.loads(path.with_suffix(".meta").read_text(encoding="utf-8"))
+            data = path.read_bytes()
+        except Exception:
+            return None
+        if meta.get("bucket") != bucket or meta.get("key") != key:
+            return None
+        return CacheEntry(
+            data=data,
+            etag=str(meta.get("etag") or ""),
+            validated_at=float(meta.get("validated_at") or 0.0),
+        )
+
+    def _disk_write(self, bucket: str, key: str, entry: CacheEntry) -> None:
+        path = self._disk_path(bucket, key)
+        if path is None:
+            return
+        try:
+            tmp = path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+            tmp.write_bytes(entry.data)
+            os.replace(tmp, path)
+            self._disk_write_meta(bucket, key, entry)
+            self._disk_writes += 1
+            if self._disk_writes % _DISK_TRIM_EVERY == 0:
+                self._disk_trim()
+        except Exception as e:
+            print(f"[minio-cache] disk write failed: bucket={bucket} key={key} err={e}")
+
+    def _disk_write_meta(self, bucket: str, key: str, entry: CacheEntry) -> None:
+        path = self._disk_path(bucket, key)
+        if path is None or not path.exists():
+            return
+        meta = {
+            "bucket": bucket,
+            "key": key,
+            "etag": entry.etag,
+            "validated_at": entry.validated_at,
+        }
+        try:
+            path.with_suffix(".meta").write_text(json.dumps(meta), encoding="utf-8")
+        except Exception:
+            pass
+
+    def _disk_remove(self, bucket: str, key: str) -> None:
+        path = self._disk_path(bucket, key)
+        if path is None:
+            return
+        self._unlink(path)
+        self._unlink(path.with_suffix(".meta"))
+
+    def _disk_trim(self) -> None:
+        """磁盘层按 mtime 淘汰最旧文件，直到总量回到 disk_max_bytes 以内。"""
+        if not self.disk_dir or self.disk_max_bytes <= 0:
+            return
+        files = []
+        total = 0
+        for p in self.disk_dir.glob("*.bin"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        if total <= self.disk_max_bytes:
+            return
+        files.sort()
+        for _, size, p in files:
+            if total <= self.disk_max_bytes:
+                break
+            self._unlink(p)
+            self._unlink(p.with_suffix(".meta"))
+            total -= size
+
+    @staticmethod
+    def _unlink(path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except Exception:
+            pass
@@ -0,0 +1,50 @@
+# rag/datasource/sqlstores/collection_alias_store.py
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+from ..connections.sqlite_connection import SQLiteConnection
+
+Row = Dict[str, Any]
+
+
+class CollectionAliasStore:
+    """
+    逻辑 collection 名 -> 物理 collection 的指针
+    - 蓝绿重建写新版本 collection，校验通过后改这一行即完成切换
+    - 单行 UPSERT，读方要么看到旧版本要么看到新版本
+    """
+
+    def __init__(self, conn: SQLiteConnection | None = None) -> None:
+        self.conn = conn or SQLiteConnection()
+
+    def get(self, alias: str) -> Optional[Row]:
+        return self.conn.query_one("SELECT * FROM collection_aliases WHERE alias = ?", (alias,))
+
+    def resolve_map(self) -> Dict[str, str]:
+        rows = self.conn.query_all("SELECT alias, target FROM collection_aliases")
+        return {r["alias"]: r["target"] for r in rows}
+
+    def list(self) -> List[Row]:
+        return self.conn.query_all("SELECT * FROM collection_aliases ORDER BY alias")
+
+    def set(self, alias: str, target: str) -> Optional[str]:
+        """切换指针，返回切换前的 target（无则 None）。"""
+        prev = self.get(alias)
+        self.conn.execute(
+            """
+            INSERT INTO collection_aliases(alias, target, previous)
+            VALUES (?, ?, NULL)
+            ON CONFLICT(alias) DO UPDATE SET
+              previous = collection_aliases.target,
+              target = excluded.target,
+              updated_at = datetime('now')
+            """,
+            (alias, target),
+        )
+        return prev["target"] if prev else None
+
+    def delete(self, alias: str) -> None:
+        self.conn.execute("DELETE FROM collection_aliases WHERE alias = ?", (alias,))
@@ -4,15 +4,25 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from ..connections.sqlite_connection import SQLiteConnection
 
 Row = Dict[str, Any]
 
 
+def _job_where(job_id: int, lease_owner: Optional[str]) -> Tuple[str, Tuple[Any, ...]]:
+    if lease_owner:
+        return "id = ? AND lease_owner = ?", (job_id, lease_owner)
+    return "id = ?", (job_id,)
+
+
 class IngestionJobStore:
-    """摄取作业存储（队列 + 运行记录）"""
+    """
+    摄取作业存储（队列 + 运行记录）
+    - 后台 worker 先取各租户队首（claim_candidates），由调度器排序后 claim 原子领取并持有租约
+    - 租约过期（worker 崩溃）由 requeue_expired 放回队列或判失败
+    """
 
     def __init__(self, conn: SQLiteConnection | None = None) -> None:
         self.conn = conn or SQLiteConnection()
@@ -30,15 +40,16 @@ class IngestionJobStore:
         file_type: Optional[str] = None,
         content_sha256: Optional[str] = None,
         options: Optional[dict] = None,
+        priority: int = 0,
     ) -> int:
         options_json = json.dumps(options or {}, ensure_ascii=False)
         cur = self.conn.execute(
             """
             INSERT INTO ingestion_jobs(
               wallet_id, data_wallet_id, private_db_id, app_id, kb_key, job_type,
-              source_url, file_type, content_sha256, status, options_json
+              source_url, file_type, content_sha256, status, options_json, priority
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?)
             """,
             (
                 wallet_id,
@@ -51,10 +62,176 @@ class IngestionJobStore:
                 file_type,
                 content_sha256,
                 options_json,
+                int(priority or 0),
             ),
         )
         return int(cur.lastrowid)
 
+    def create_batch(
+        self,
+        *,
+        batch_id: str,
+        wallet_id: str,
+        data_wallet_id: Optional[str] = None,
+        private_db_id: Optional[str] = None,
+        app_id: str,
+        kb_key: str,
+        job_type: str,
+        sources: List[Tuple[str, Optional[str], Optional[dict]]],
+        options: Optional[dict] = None,
+        priority: int = 0,
+        source_prefix: Optional[str] = None,
+    ) -> int:
+        """
+        批量入队：批次行 + 全部作业在同一事务里写入（executemany）。
+        sources 为 [(source_url, file_type, metadata)]；metadata 合并进各自的 options。
+        """
+        base_options = dict(options or {})
+
+        def _job_params():
+            for source_url, file_type, metadata in sources:
+                job_options = base_options
+                if metadata:
+                    job_options = dict(base_options)
+                    job_options["metadata"] = {**(base_options.get("metadata") or {}), **metadata}
+                yield (
+                    wallet_id,
+                    data_wallet_id,
+                    private_db_id,
+                    app_id,
+                    kb_key,
+                    job_type,
+                    source_url,
+                    file_type,
+                    json.dumps(job_options, ensure_ascii=False),
+                    int(priority or 0),
+                    batch_id,
+                )
+
+        with self.conn.transaction() as tx:
+            tx.execute(
+                """
+                INSERT INTO ingestion_batches(id, wallet_id, app_id, kb_key, source_prefix, total)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (batch_id, wallet_id, app_id, kb_key, source_prefix, len(sources)),
+            )
+            tx.executemany(
+                """
+                INSERT INTO ingestion_jobs(
+                  wallet_id, data_wallet_id, private_db_id, app_id, kb_key, job_type,
+                  source_url, file_type, status, options_json, priority, batch_id
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?)
+                """,
+                _job_params(),
+            )
+        return len(sources)
+
+    def get_batch(self, batch_id: str) -> Optional[Row]:
+        return self.conn.query_one("SELECT * FROM ingestion_batches WHERE id = ?", (batch_id,))
+
+    def batch_progress(self, batch_id: str) -> Dict[str, int]:
+        """按状态计数；额外的 deduped 为因内容去重而跳过向量化的成功作业数。"""
+        rows = self.conn.query_all(
+            """
+            SELECT status,
+                   COUNT(*) AS n,
+                   SUM(CASE WHEN json_extract(result_json, '$.deduped') THEN 1 ELSE 0 END) AS deduped
+              FROM ingestion_jobs
+             WHERE batch_id = ?
+             GROUP BY status
+            """,
+            (batch_id,),
+        )
+        out = {r["status"]: int(r["n"]) for r in rows}
+        out["deduped"] = sum(int(r["deduped"] or 0) for r in rows)
+        return out
+
+    def inflight_sources(
+        self,
+        *,
+        app_id: str,
+        kb_key: str,
+        url_prefix: str,
+        private_db_id: Optional[str] = None,
+    ) -> set:
+        """前缀下尚在排队/执行的 kb_ingest 作业来源（前缀同步不重复入队）。"""
+        rows = self.conn.query_all(
+            """
+            SELECT DISTINCT source_url FROM ingestion_jobs
+             WHERE app_id = ?
+               AND kb_key = ?
+               AND job_type = 'kb_ingest'
+               AND status IN ('pending', 'running')
+               AND COALESCE(private_db_id, '') = ?
+               AND substr(source_url, 1, ?) = ?
+            """,
+            (app_id, kb_key, private_db_id or "", len(url_prefix), url_prefix),
+        )
+        return {r["source_url"] for r in rows}
+
+    # -------- 前缀同步状态 --------
+    def get_sync_state(self, sync_key: str) -> Optional[Row]:
+        return self.conn.query_one("SELECT * FROM ingestion_sync_state WHERE sync_key = ?", (sync_key,))
+
+    def list_sync_states(self, *, app_id: str, kb_key: Optional[str] = None, limit: int = 50) -> List[Row]:
+        if kb_key:
+            return self.conn.query_all(
+                "SELECT * FROM ingestion_sync_state WHERE app_id = ? AND kb_key = ? ORDER BY updated_at DESC LIMIT ?",
+                (app_id, kb_key, int(limit)),
+            )
+        return self.conn.query_all(
+            "SELECT * FROM ingestion_sync_state WHERE app_id = ? ORDER BY updated_at DESC LIMIT ?",
+            (app_id, int(limit)),
+        )
+
+    def save_sync_state(
+        self,
+        *,
+        sync_key: str,
+        wallet_id: str,
+        app_id: str,
+        kb_key: str,
+        data_wallet_id: Optional[str],
+        private_db_id: Optional[str],
+        source_prefix: str,
+        watermark: Optional[str],
+        last_job_id: int,
+        last_batch_id: Optional[str],
+        stats: Optional[dict] = None,
+    ) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO ingestion_sync_state(
+              sync_key, wallet_id, app_id, kb_key, data_wallet_id, private_db_id, source_prefix,
+              watermark, last_job_id, last_batch_id, last_synced_at, stats_json
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), ?)
+            ON CONFLICT(sync_key) DO UPDATE SET
+              wallet_id = excluded.wallet_id,
+              watermark = COALESCE(excluded.watermark, ingestion_sync_state.watermark),
+              last_job_id = excluded.last_job_id,
+              last_batch_id = COALESCE(excluded.last_batch_id, ingestion_sync_state.last_batch_id),
+              last_synced_at = excluded.last_synced_at,
+              stats_json = excluded.stats_json,
+              updated_at = datetime('now')
+            """,
+            (
+                sync_key,
+                wallet_id,
+                app_id,
+                kb_key,
+                data_wallet_id,
+                private_db_id,
+                source_prefix,
+                watermark,
+                int(last_job_id),
+                last_batch_id,
+                json.dumps(stats, ensure_ascii=False) if stats else None,
+            ),
+        )
+
     def get(self, job_id: int) -> Optional[Row]:
         return self.conn.query_one(
             "SELECT * FROM ingestion_jobs WHERE id = ?",
@@ -69,6 +246,7 @@ class IngestionJobStore:
         private_db_id: Optional[str] = None,
         app_id: Optional[str] = None,
         status: Optional[str] = None,
+        batch_id: Optional[str] = None,
         limit: int = 50,
         offset: int = 0,
     ) -> List[Row]:
@@ -89,6 +267,9 @@ class IngestionJobStore:
         if status:
             clauses.append("status = ?")
             params.append(status)
+        if batch_id:
+            clauses.append("batch_id = ?")
+            params.append(batch_id)
         where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
         params.extend([limit, offset])
         return self.conn.query_all(
@@ -113,33 +294,233 @@ class IngestionJobStore:
             (job_id,),
         )
 
-    def mark_success(self, job_id: int, result: Optional[dict] = None) -> None:
+    def mark_success(self, job_id: int, result: Optional[dict] = None, *, lease_owner: Optional[str] = None) -> bool:
+        """lease_owner 非空时只在仍持有租约时生效（防止覆盖已被重新领取的作业）。"""
         result_json = json.dumps(result or {}, ensure_ascii=False)
-        self.conn.execute(
-            """
+        where, params = _job_where(job_id, lease_owner)
+        cur = self.conn.execute(
+            f"""
             UPDATE ingestion_jobs
                SET status = 'success',
                    result_json = ?,
                    finished_at = datetime('now'),
                    updated_at = datetime('now'),
-                   error_message = NULL
-             WHERE id = ?
+                   error_message = NULL,
+                   lease_owner = NULL,
+                   lease_expires_at = NULL,
+                   next_run_at = NULL
+             WHERE {where}
             """,
-            (result_json, job_id),
+            (result_json, *params),
         )
+        return cur.rowcount > 0
 
-    def mark_failed(self, job_id: int, error_message: str) -> None:
-        self.conn.execute(
-            """
+    def mark_failed(self, job_id: int, error_message: str, *, lease_owner: Optional[str] = None) -> bool:
+        where, params = _job_where(job_id, lease_owner)
+        cur = self.conn.execute(
+            f"""
             UPDATE ingestion_jobs
                SET status = 'failed',
                    error_message = ?,
                    finished_at = datetime('now'),
+                   updated_at = datetime('now'),
+                   lease_owner = NULL,
+                   lease_expires_at = NULL,
+                   next_run_at = NULL
+             WHERE {where}
+            """,
+            (error_message, *params),
+        )
+        return cur.rowcount > 0
+
+    # -------- worker 队列 --------
+    def claim_candidates(self, *, window_seconds: int = 300) -> List[Row]:
+        """
+        每个租户（wallet_id + app_id）队首的一条可运行作业，附带该租户的
+        running 数与最近 window_seconds 内被领取次数，供公平调度排序。
+        """
+        return self.conn.query_all(
+            """
+            WITH running AS (
+              SELECT wallet_id, app_id, COUNT(*) AS n
+                FROM ingestion_jobs
+               WHERE status = 'running'
+               GROUP BY wallet_id, app_id
+            ),
+            served AS (
+              SELECT wallet_id, app_id, COUNT(*) AS n
+                FROM ingestion_jobs
+               WHERE claimed_at >= datetime('now', ?)
+               GROUP BY wallet_id, app_id
+            ),
+            ready AS (
+              SELECT id, wallet_id, app_id, priority,
+                     COALESCE(next_run_at, created_at) AS ready_at,
+                     ROW_NUMBER() OVER (
+                       PARTITION BY wallet_id, app_id
+                       ORDER BY priority DESC, COALESCE(next_run_at, created_at), id
+                     ) AS tenant_rank,
+                     COUNT(*) OVER (PARTITION BY wallet_id, app_id) AS tenant_pending
+                FROM ingestion_jobs
+               WHERE status = 'pending'
+                 AND (next_run_at IS NULL OR next_run_at <= datetime('now'))
+            )
+            SELECT r.id, r.wallet_id, r.app_id, r.priority, r.ready_at, r.tenant_pending,
+                   COALESCE(ru.n, 0) AS tenant_running,
+                   COALESCE(sv.n, 0) AS tenant_served
+              FROM ready r
+              LEFT JOIN running ru ON ru.wallet_id = r.wallet_id AND ru.app_id = r.app_id
+              LEFT JOIN served sv ON sv.wallet_id = r.wallet_id AND sv.app_id = r.app_id
+             WHERE r.tenant_rank = 1
+            """,
+            (f"-{int(window_seconds)} seconds",),
+        )
+
+    def claim(self, job_id: int, owner: str, lease_seconds: int, *, max_running: int = 0) -> Optional[Row]:
+        """
+        原子领取指定的 pending 作业（UPDATE ... WHERE status='pending' RETURNING，多进程安全）
+        已被其它 worker 抢先领取时返回 None。
+        max_running > 0 时在同一条 UPDATE 里检查该租户（wallet_id + app_id）的 running 数，
+        达到上限也返回 None：并发 worker / 多进程不会越过租户并发上限。
+        返回行额外带 wait_seconds：从入队/可重试时刻到被领取的等待时长。
+        """
+        rows = self.conn.execute_returning(
+            """
+            UPDATE ingestion_jobs
+               SET status = 'running',
+                   lease_owner = ?,
+                   lease_expires_at = datetime('now', ?),
+                   attempts = attempts + 1,
+                   claimed_at = datetime('now'),
+                   started_at = COALESCE(started_at, datetime('now')),
                    updated_at = datetime('now')
              WHERE id = ?
+               AND status = 'pending'
+               AND (next_run_at IS NULL OR next_run_at <= datetime('now'))
+               AND (
+                 ? <= 0
+                 OR (
+                   SELECT COUNT(*)
+                     FROM ingestion_jobs r
+                    WHERE r.status = 'running'
+                      AND r.wallet_id IS ingestion_jobs.wallet_id
+                      AND r.app_id IS ingestion_jobs.app_id
+                 ) < ?
+               )
+            RETURNING *,
+                      (julianday('now') - julianday(COALESCE(next_run_at, created_at))) * 86400.0
+                        AS wait_seconds
             """,
-            (error_message, job_id),
+            (owner, f"+{int(lease_seconds)} seconds", job_id, int(max_running or 0), int(max_running or 0)),
+        )
+        return rows[0] if rows else None
+
+    def renew_lease(self, job_id: int, owner: str, lease_seconds: int) -> bool:
+        cur = self.conn.execute(
+            """
+            UPDATE ingestion_jobs
+               SET lease_expires_at = datetime('now', ?),
+                   updated_at = datetime('now')
+             WHERE id = ? AND status = 'running' AND lease_owner = ?
+            """,
+            (f"+{int(lease_seconds)} seconds", job_id, owner),
+        )
+        return cur.rowcount > 0
+
+    def retry_later(self, job_id: int, error_message: str, delay_seconds: int, *, lease_owner: str) -> bool:
+        """失败但仍可重试：放回 pending，退避 delay_seconds 后才可再次领取。"""
+        cur = self.conn.execute(
+            """
+            UPDATE ingestion_jobs
+               SET status = 'pending',
+                   error_message = ?,
+                   next_run_at = datetime('now', ?),
+                   lease_owner = NULL,
+                   lease_expires_at = NULL,
+                   updated_at = datetime('now')
+             WHERE id = ? AND lease_owner = ?
+            """,
+            (error_message, f"+{int(delay_seconds)} seconds", job_id, lease_owner),
+        )
+        return cur.rowcount > 0
+
+    def requeue_expired(self, max_attempts: int) -> Dict[str, List[int]]:
+        """
+        回收租约过期的 running 作业（worker 崩溃/卡死）：
+        - attempts 未用完：放回 pending
+        - 已用完：判失败
+        只处理带租约的作业；内联执行（无租约）的作业不受影响。
+        """
+        failed = self.conn.execute_returning(
+            """
+            UPDATE ingestion_jobs
+               SET status = 'failed',
+                   error_message = 'lease expired (worker lost)',
+                   finished_at = datetime('now'),
+                   updated_at = datetime('now'),
+                   lease_owner = NULL,
+                   lease_expires_at = NULL
+             WHERE status = 'running'
+               AND lease_expires_at IS NOT NULL
+               AND lease_expires_at < datetime('now')
+               AND attempts >= ?
+            RETURNING id
+            """,
+            (int(max_attempts),),
+        )
+        requeued = self.conn.execute_returning(
+            """
+            UPDATE ingestion_jobs
+               SET status = 'pending',
+                   error_message = 'lease expired (worker lost)',
+                   updated_at = datetime('now'),
+                   lease_owner = NULL,
+                   lease_expires_at = NULL,
+                   next_run_at = NULL
+             WHERE status = 'running'
+               AND lease_expires_at IS NOT NULL
+               AND lease_expires_at < datetime('now')
+            RETURNING id
+            """,
+        )
+        return {
+            "requeued": [int(r["id"]) for r in requeued],
+            "failed": [int(r["id"]) for r in failed],
+        }
+
+    def requeue(self, job_id: int) -> bool:
+        """手动重跑：非 running 的作业重置为 pending（重新计 attempts）。"""
+        cur = self.conn.execute(
+            """
+            UPDATE ingestion_jobs
+               SET status = 'pending',
+                   attempts = 0,
+                   error_message = NULL,
+                   next_run_at = NULL,
+                   finished_at = NULL,
+                   updated_at = datetime('now')
+             WHERE id = ? AND status != 'running'
+            """,
+            (job_id,),
+        )
+        return cur.rowcount > 0
+
+    def count_by_status(self) -> Dict[str, int]:
+        rows = self.conn.query_all(
+            "SELECT status, COUNT(*) AS total FROM ingestion_jobs GROUP BY status"
+        )
+        return {str(r["status"]): int(r["total"]) for r in rows}
+
+    def count_ready(self) -> int:
+        """当前可被领取的 pending 数（不含退避中的）。"""
+        row = self.conn.query_one(
+            """
+            SELECT COUNT(*) AS total FROM ingestion_jobs
+             WHERE status = 'pending'
+               AND (next_run_at IS NULL OR next_run_at <= datetime('now'))
+            """
         )
+        return int(row["total"] if row else 0)
 
     def append_run(
         self,
@@ -3,12 +3,127 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 from ..connections.sqlite_connection import SQLiteConnection
 
 Row = Dict[str, Any]
 
+_UPSERT_SQL = """
+INSERT INTO kb_documents(
+  doc_id, app_id, kb_key, wallet_id, private_db_id,
+  source_url, source_type, source_id, file_type, content_sha256,
+  parent_doc_id, chunk_index, source_etag, source_size, status
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(doc_id) DO UPDATE SET
+  app_id = excluded.app_id,
+  kb_key = excluded.kb_key,
+  wallet_id = COALESCE(excluded.wallet_id, kb_documents.wallet_id),
+  private_db_id = COALESCE(excluded.private_db_id, kb_documents.private_db_id),
+  source_url = COALESCE(excluded.source_url, kb_documents.source_url),
+  source_type = COALESCE(excluded.source_type, kb_documents.source_type),
+  source_id = COALESCE(excluded.source_id, kb_documents.source_id),
+  file_type = COALESCE(excluded.file_type, kb_documents.file_type),
+  content_sha256 = COALESCE(excluded.content_sha256, kb_documents.content_sha256),
+  parent_doc_id = COALESCE(excluded.parent_doc_id, kb_documents.parent_doc_id),
+  chunk_index = COALESCE(excluded.chunk_index, kb_documents.chunk_index),
+  source_etag = COALESCE(excluded.source_etag, kb_documents.source_etag),
+  source_size = COALESCE(excluded.source_size, kb_documents.source_size),
+  status = excluded.status,
+  updated_at = datetime('now')
+"""
+
+
+_REF_UPSERT_SQL = """
+INSERT INTO kb_document_refs(
+  ref_id, doc_id, app_id, kb_key, wallet_id, private_db_id,
+  source_url, source_type, source_id, file_type, content_sha256,
+  source_etag, source_size, status
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'active')
+ON CONFLICT(ref_id) DO UPDATE SET
+  doc_id = excluded.doc_id,
+  source_url = COALESCE(excluded.source_url, kb_document_refs.source_url),
+  source_type = COALESCE(excluded.source_type, kb_document_refs.source_type),
+  source_id = COALESCE(excluded.source_id, kb_document_refs.source_id),
+  file_type = COALESCE(excluded.file_type, kb_document_refs.file_type),
+  content_sha256 = COALESCE(excluded.content_sha256, kb_document_refs.content_sha256),
+  source_etag = excluded.source_etag,
+  source_size = excluded.source_size,
+  status = 'active',
+  updated_at = datetime('now')
+"""
+
+# 引用有效：自身 active 且指向的文档（单条或切块）仍有 active 行；目标被删后引用自然失效
+_LIVE_REF = """
+r.status = 'active'
+AND (
+  EXISTS (SELECT 1 FROM kb_documents d WHERE d.doc_id = r.doc_id AND d.status = 'active')
+  OR EXISTS (SELECT 1 FROM kb_documents d WHERE d.parent_doc_id = r.doc_id AND d.status = 'active')
+)
+"""
+
+
+def _ref_params(
+    *,
+    ref_id: str,
+    doc_id: str,
+    app_id: str,
+    kb_key: str,
+    wallet_id: Optional[str] = None,
+    private_db_id: Optional[str] = None,
+    source_url: Optional[str] = None,
+    source_type: Optional[str] = None,
+    source_id: Optional[str] = None,
+    file_type: Optional[str] = None,
+    content_sha256: Optional[str] = None,
+    source_etag: Optional[str] = None,
+    source_size: Optional[int] = None,
+) -> tuple:
+    return (
+        ref_id, doc_id, app_id, kb_key, wallet_id, private_db_id,
+        source_url, source_type, source_id, file_type, content_sha256,
+        source_etag, source_size,
+    )
+
+
+def _upsert_params(
+    *,
+    doc_id: str,
+    app_id: str,
+    kb_key: str,
+    wallet_id: Optional[str] = None,
+    private_db_id: Optional[str] = None,
+    source_url: Optional[str] = None,
+    source_type: Optional[str] = None,
+    source_id: Optional[str] = None,
+    file_type: Optional[str] = None,
+    content_sha256: Optional[str] = None,
+    parent_doc_id: Optional[str] = None,
+    chunk_index: Optional[int] = None,
+    source_etag: Optional[str] = None,
+    source_size: Optional[int] = None,
+    status: str = "active",
+) -> tuple:
+    return (
+        doc_id,
+        app_id,
+        kb_key,
+        wallet_id,
+        private_db_id,
+        source_url,
+        source_type,
+        source_id,
+        file_type,
+        content_sha256,
+        parent_doc_id,
+        chunk_index,
+        source_etag,
+        source_size,
+        status,
+    )
+
 
 class KBDocumentStore:
     """KB 文档元数据存储（向量存储之外的索引层）"""
@@ -29,49 +144,236 @@ class KBDocumentStore:
         source_id: Optional[str] = None,
         file_type: Optional[str] = None,
         content_sha256: Optional[str] = None,
+        parent_doc_id: Optional[str] = None,
+        chunk_index: Optional[int] = None,
+        source_etag: Optional[str] = None,
+        source_size: Optional[int] = None,
         status: str = "active",
     ) -> None:
         self.conn.execute(
-            """
-            INSERT INTO kb_documents(
-              doc_id, app_id, kb_key, wallet_id, private_db_id,
-              source_url, source_type, source_id, file_type, content_sha256, status
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(doc_id) DO UPDATE SET
-              app_id = excluded.app_id,
-              kb_key = excluded.kb_key,
-              wallet_id = COALESCE(excluded.wallet_id, kb_documents.wallet_id),
-              private_db_id = COALESCE(excluded.private_db_id, kb_documents.private_db_id),
-              source_url = COALESCE(excluded.source_url, kb_documents.source_url),
-              source_type = COALESCE(excluded.source_type, kb_documents.source_type),
-              source_id = COALESCE(excluded.source_id, kb_documents.source_id),
-              file_type = COALESCE(excluded.file_type, kb_documents.file_type),
-              content_sha256 = COALESCE(excluded.content_sha256, kb_documents.content_sha256),
-              status = excluded.status,
-              updated_at = datetime('now')
-            """,
-            (
-                doc_id,
-                app_id,
-                kb_key,
-                wallet_id,
-                private_db_id,
-                source_url,
-                source_type,
-                source_id,
-                file_type,
-                content_sha256,
-                status,
+            _UPSERT_SQL,
+            _upsert_params(
+                doc_id=doc_id,
+                app_id=app_id,
+                kb_key=kb_key,
+                wallet_id=wallet_id,
+                private_db_id=private_db_id,
+                source_url=source_url,
+                source_type=source_type,
+                source_id=source_id,
+                file_type=file_type,
+                content_sha256=content_sha256,
+                parent_doc_id=parent_doc_id,
+                chunk_index=chunk_index,
+                source_etag=source_etag,
+                source_size=source_size,
+                status=status,
             ),
         )
 
+    def upsert_many(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """批量 upsert（单事务 executemany）；rows 的键同 upsert 的参数。"""
+        params = [_upsert_params(**row) for row in rows]
+        if not params:
+            return 0
+        self.conn.executemany(_UPSERT_SQL, params)
+        return len(params)
+
     def get(self, doc_id: str) -> Optional[Row]:
         return self.conn.query_one(
             "SELECT * FROM kb_documents WHERE doc_id = ?",
             (doc_id,),
         )
 
+    def find_active_by_hash(
+        self,
+        *,
+        app_id: str,
+        kb_key: str,
+        content_sha256: str,
+        wallet_id: Optional[str] = None,
+        private_db_id: Optional[str] = None,
+    ) -> Optional[Row]:
+        """
+        同一 app/kb/钱包/私有库范围内内容哈希相同的 active 文档（最早的一条）；
+        范围内没有自己的文档时，再看范围内的有效来源引用，返回其指向的文档。
+        """
+        if not content_sha256:
+            return None
+        params = (content_sha256, app_id, kb_key, wallet_id or "", private_db_id or "")
+        row = self.conn.query_one(
+            """
+            SELECT * FROM kb_documents
+             WHERE content_sha256 = ?
+               AND app_id = ?
+               AND kb_key = ?
+               AND COALESCE(wallet_id, '') = ?
+               AND COALESCE(private_db_id, '') = ?
+               AND status = 'active'
+             ORDER BY created_at
+             LIMIT 1
+            """,
+            params,
+        )
+        if row:
+            return row
+        return self.conn.query_one(
+            """
+            SELECT d.* FROM kb_document_refs r
+              JOIN kb_documents d
+                ON (d.doc_id = r.doc_id OR d.parent_doc_id = r.doc_id)
+             WHERE r.content_sha256 = ?
+               AND r.app_id = ?
+               AND r.kb_key = ?
+               AND COALESCE(r.wallet_id, '') = ?
+               AND COALESCE(r.private_db_id, '') = ?
+               AND r.status = 'active'
+               AND d.status = 'active'
+             ORDER BY d.created_at
+             LIMIT 1
+            """,
+            params,
+        )
+
+    def source_states(
+        self,
+        *,
+        app_id: str,
+        kb_key: str,
+        url_prefix: str,
+        wallet_id: Optional[str] = None,
+        private_db_id: Optional[str] = None,
+    ) -> Dict[str, Row]:
+        """
+        范围内 source_url 以 url_prefix 开头的 active 文档与有效来源引用，按来源聚合：
+        {source_url: {source_etag, source_size, updated_at, docs, refs}}
+        （切块文档一个来源多行；docs=0 表示该来源只是指向其它文档的引用，没有自己的向量）。
+        """
+        scope = (app_id, kb_key, wallet_id or "", private_db_id or "", len(url_prefix), url_prefix)
+        rows = self.conn.query_all(
+            f"""
+            SELECT source_url,
+                   MAX(source_etag) AS source_etag,
+                   MAX(source_size) AS source_size,
+                   MAX(updated_at) AS updated_at,
+                   SUM(is_doc) AS docs,
+                   SUM(1 - is_doc) AS refs
+              FROM (
+                SELECT source_url, source_etag, source_size, updated_at, 1 AS is_doc
+                  FROM kb_documents
+                 WHERE app_id = ?
+                   AND kb_key = ?
+                   AND COALESCE(wallet_id, '') = ?
+                   AND COALESCE(private_db_id, '') = ?
+                   AND status = 'active'
+                   AND substr(source_url, 1, ?) = ?
+                UNION ALL
+                SELECT r.source_url, r.source_etag, r.source_size, r.updated_at, 0 AS is_doc
+                  FROM kb_document_refs r
+                 WHERE r.app_id = ?
+                   AND r.kb_key = ?
+                   AND COALESCE(r.wallet_id, '') = ?
+                   AND COALESCE(r.private_db_id, '') = ?
+                   AND substr(r.source_url, 1, ?) = ?
+                   AND {_LIVE_REF}
+              )
+             GROUP BY source_url
+            """,
+            scope + scope,
+        )
+        return {r["source_url"]: r for r in rows}
+
+    # -------- 来源引用 --------
+    def upsert_ref(self, **row: Any) -> None:
+        """记录（或刷新）一个指向已有文档的来源；键同 _ref_params。"""
+        self.conn.execute(_REF_UPSERT_SQL, _ref_params(**row))
+
+    def upsert_refs_many(self, rows: Iterable[Dict[str, Any]]) -> int:
+        params = [_ref_params(**row) for row in rows]
+        if not params:
+            return 0
+        self.conn.executemany(_REF_UPSERT_SQL, params)
+        return len(params)
+
+    def drop_source_refs(
+        self,
+        *,
+        app_id: str,
+        kb_key: str,
+        source_urls: Iterable[str],
+        wallet_id: Optional[str] = None,
+        private_db_id: Optional[str] = None,
+    ) -> None:
+        """范围内这些来源的引用作废（来源已删除，或已写入自己的向量）。"""
+        params = [
+            (app_id, kb_key, wallet_id or "", private_db_id or "", url)
+            for url in dict.fromkeys(source_urls) if url
+        ]
+        if not params:
+            return
+        self.conn.executemany(
+            """
+            UPDATE kb_document_refs
+               SET status = 'deleted',
+                   updated_at = datetime('now')
+             WHERE app_id = ?
+               AND kb_key = ?
+               AND COALESCE(wallet_id, '') = ?
+               AND COALESCE(private_db_id, '') = ?
+               AND source_url = ?
+               AND status = 'active'
+            """,
+            params,
+        )
+
+    def drop_refs_to(self, doc_ids: Iterable[str], *, app_id: Optional[str] = None) -> None:
+        """指向这些文档的引用作废（文档内容已重写）；给 app_id 时只作废该 app 的引用。"""
+        params = [(doc_id, app_id, app_id) for doc_id in dict.fromkeys(doc_ids) if doc_id]
+        if not params:
+            return
+        self.conn.executemany(
+            """
+            UPDATE kb_document_refs
+               SET status = 'deleted',
+                   updated_at = datetime('now')
+             WHERE doc_id = ?
+               AND (? IS NULL OR app_id = ?)
+               AND status = 'active'
+            """,
+            params,
+        )
+
+    def list_doc_ids_by_sources(
+        self,
+        *,
+        app_id: str,
+        kb_key: str,
+        source_urls: Iterable[str],
+        wallet_id: Optional[str] = None,
+        private_db_id: Optional[str] = None,
+        chunk_size: int = 500,
+    ) -> Dict[str, List[str]]:
+        """{source_url: [doc_id]}（active）；按 chunk_size 分批 IN 查询，避免超出 SQLite 参数上限。"""
+        urls = [u for u in source_urls if u]
+        out: Dict[str, List[str]] = {}
+        for i in range(0, len(urls), chunk_size):
+            part = urls[i : i + chunk_size]
+            rows = self.conn.query_all(
+                f"""
+                SELECT source_url, doc_id FROM kb_documents
+                 WHERE app_id = ?
+                   AND kb_key = ?
+                   AND COALESCE(wallet_id, '') = ?
+                   AND COALESCE(private_db_id, '') = ?
+                   AND status = 'active'
+                   AND source_url IN ({','.join('?' * len(part))})
+                """,
+                (app_id, kb_key, wallet_id or "", private_db_id or "", *part),
+            )
+            for r in rows:
+                out.setdefault(r["source_url"], []).append(r["doc_id"])
+        return out
+
     def list(
         self,
         *,
@@ -150,6 +452,198 @@ class KBDocumentStore:
         )
         return int(row["total"] if row else 0)
 
+    # ---------- 计数（kb_doc_counters 由触发器维护，O(范围数) 而非 O(文档数)） ----------
+    def active_count(
+        self,
+        *,
+        app_id: str,
+        kb_key: str,
+        wallet_id: Optional[str] = None,
+        private_db_id: Optional[str] = None,
+    ) -> int:
+        clauses = ["app_id = ?", "kb_key = ?"]
+        params: List[Any] = [app_id, kb_key]
+        if wallet_id:
+            clauses.append("wallet_id = ?")
+            params.append(wallet_id)
+        if private_db_id:
+            clauses.append("private_db_id = ?")
+            params.append(private_db_id)
+        row = self.conn.query_one(
+            f"SELECT COALESCE(SUM(active), 0) AS total FROM kb_doc_counters WHERE {' AND '.join(clauses)}",
+            tuple(params),
+        )
+        return int(row["total"] if row else 0)
+
+    def count_scopes(self, *, app_id: str, kb_key: str) -> Dict[str, List[str]]:
+        """
+        该 KB 下需要逐个核对的私有库与钱包：有 active 文档的，加上已有校正值的
+        （统计接口为 kb_documents 没记录的范围也会落校正值，不纳入就永远停在首次查询的数）。
+        """
+        rows = self.conn.query_all(
+            """
+            SELECT wallet_id, private_db_id FROM kb_doc_counters
+             WHERE app_id = ? AND kb_key = ? AND active > 0
+            """,
+            (app_id, kb_key),
+        )
+        private_db_ids = {r["private_db_id"] for r in rows if r["private_db_id"]}
+        wallet_ids = {r["wallet_id"] for r in rows if r["wallet_id"]}
+        for r in self.conn.query_all(
+            "SELECT scope FROM kb_count_adjustments WHERE app_id = ? AND kb_key = ? AND scope != ''",
+            (app_id, kb_key),
+        ):
+            kind, _, value = str(r["scope"]).partition(":")
+            if value and kind == "private_db":
+                private_db_ids.add(value)
+            elif value and kind == "wallet":
+                wallet_ids.add(value)
+        return {"private_db_ids": sorted(private_db_ids), "wallet_ids": sorted(wallet_ids)}
+
+    def rebuild_counters(self, *, app_id: str, kb_key: str) -> None:
+        """按 kb_documents 重算该 KB 的计数（纠正绕过触发器的改动，如手工修库）。"""
+        with self.conn.transaction() as cur:
+            cur.execute("DELETE FROM kb_doc_counters WHERE app_id = ? AND kb_key = ?", (app_id, kb_key))
+            cur.execute(
+                """
+                INSERT INTO kb_doc_counters(app_id, kb_key, wallet_id, private_db_id, active)
+                SELECT app_id, kb_key, COALESCE(wallet_id, ''), COALESCE(private_db_id, ''), COUNT(*)
+                  FROM kb_documents
+                 WHERE app_id = ? AND kb_key = ? AND status = 'active'
+                 GROUP BY COALESCE(wallet_id, ''), COALESCE(private_db_id, '')
+                """,
+                (app_id, kb_key),
+            )
+
+    def get_count_adjustment(self, *, app_id: str, kb_key: str, scope: str) -> Optional[Row]:
+        return self.conn.query_one(
+            "SELECT * FROM kb_count_adjustments WHERE app_id = ? AND kb_key = ? AND scope = ?",
+            (app_id, kb_key, scope),
+        )
+
+    def save_count_adjustment(
+        self,
+        *,
+        app_id: str,
+        kb_key: str,
+        scope: str,
+        weaviate_count: int,
+        sqlite_count: int,
+    ) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO kb_count_adjustments(app_id, kb_key, scope, delta, weaviate_count, sqlite_count)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(app_id, kb_key, scope) DO UPDATE SET
+              delta = excluded.delta,
+              weaviate_count = excluded.weaviate_count,
+              sqlite_count = excluded.sqlite_count,
+              reconciled_at = datetime('now')
+            """,
+            (app_id, kb_key, scope, int(weaviate_count) - int(sqlite_count), int(weaviate_count), int(sqlite_count)),
+        )
+
+    def list_chunk_ids(self, parent_doc_id: str, *, from_index: int = 0) -> List[str]:
+        """源文档下 active 块的 doc_id（按块序号）；from_index 用于找出重写后多余的旧块。"""
+        rows = self.conn.query_all(
+            """
+            SELECT doc_id FROM kb_documents
+             WHERE parent_doc_id = ?
+               AND chunk_index >= ?
+               AND status = 'active'
+             ORDER BY chunk_index
+            """,
+            (parent_doc_id, int(from_index)),
+        )
+        return [r["doc_id"] for r in rows]
+
+    def set_content_sha256(self, parent_doc_id: str, content_sha256: str) -> None:
+        """分段解析的文档写完后才知道内容哈希，回填到该文档的全部 active 块。"""
+        self.conn.execute(
+            """
+            UPDATE kb_documents
+               SET content_sha256 = ?,
+                   updated_at = datetime('now')
+             WHERE parent_doc_id = ?
+               AND status = 'active'
+            """,
+            (content_sha256, parent_doc_id),
+        )
+
+    def promote_ref(self, doc_id: str, *, app_id: str) -> Optional[Row]:
+        """
+        app_id 不再使用 doc_id（共享对象去掉了该 app）而 kb_documents 行归它所有时：
+        若其它 app 有指向该文档的 active 引用，把最早的一条提升为该行的归属（app/范围/来源），
+        引用随之作废并返回；没有可提升的引用返回 None（调用方自行标记删除）。
+        """
+        with self.conn.transaction() as cur:
+            ref = cur.execute(
+                """
+                SELECT * FROM kb_document_refs
+                 WHERE doc_id = ? AND app_id != ? AND status = 'active'
+                 ORDER BY created_at
+                 LIMIT 1
+                """,
+                (doc_id, app_id),
+            ).fetchone()
+            if ref is None:
+                return None
+            ref = dict(ref)
+            cur.execute(
+                """
+                UPDATE kb_documents
+                   SET app_id = ?,
+                       kb_key = ?,
+                       wallet_id = ?,
+                       private_db_id = ?,
+                       source_url = ?,
+                       source_type = ?,
+                       source_id = ?,
+                       source_etag = ?,
+                       source_size = ?,
+                       updated_at = datetime('now')
+                 WHERE doc_id = ?
+                """,
+                (
+                    ref["app_id"], ref["kb_key"], ref["wallet_id"], ref["private_db_id"],
+                    ref["source_url"], ref["source_type"], ref["source_id"],
+                    ref["source_etag"], ref["source_size"], doc_id,
+                ),
+            )
+            cur.execute(
+                "UPDATE kb_document_refs SET status = 'deleted', updated_at = datetime('now') WHERE ref_id = ?",
+                (ref["ref_id"],),
+            )
+        return ref
+
+    def set_source_columns(self, doc_id: str, *, source_etag: Optional[str], source_size: Optional[int]) -> None:
+        """同一来源内容未变、对象被重新上传（ETag 变了）：刷新文档（含全部块）记录的 ETag/大小。"""
+        self.conn.execute(
+            """
+            UPDATE kb_documents
+               SET source_etag = ?,
+                   source_size = ?,
+                   updated_at = datetime('now')
+             WHERE (doc_id = ? OR parent_doc_id = ?)
+               AND status = 'active'
+            """,
+            (source_etag, source_size, doc_id, doc_id),
+        )
+
+    def mark_deleted_many(self, doc_ids: Iterable[str]) -> None:
+        params = [(doc_id,) for doc_id in doc_ids if doc_id]
+        if not params:
+            return
+        self.conn.executemany(
+            """
+            UPDATE kb_documents
+               SET status = 'deleted',
+                   updated_at = datetime('now')
+             WHERE doc_id = ?
+            """,
+            params,
+        )
+
     def mark_deleted(self, doc_id: str) -> None:
         self.conn.execute(
             """
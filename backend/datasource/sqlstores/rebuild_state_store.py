@@ -0,0 +1,145 @@
+# rag/datasource/sqlstores/rebuild_state_store.py
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..connections.sqlite_connection import SQLiteConnection
+
+Row = Dict[str, Any]
+
+
+class RebuildStateStore:
+    """
+    批量重建任务的本地状态（与向量库解耦）
+    - rebuild_hash_index：collection 内 {object_id -> hash}，用于增量跳过
+    - rebuild_company_state：每家公司的 manifest ETag/日期 + 断点
+    - rebuild_runs：每次运行的参数与统计
+    """
+
+    def __init__(self, conn: SQLiteConnection | None = None) -> None:
+        self.conn = conn or SQLiteConnection()
+
+    # -------- hash 侧索引 --------
+    def count_hashes(self, collection: str) -> int:
+        row = self.conn.query_one(
+            "SELECT COUNT(*) AS total FROM rebuild_hash_index WHERE collection = ?",
+            (collection,),
+        )
+        return int(row["total"] if row else 0)
+
+    def load_hashes(self, collection: str) -> Dict[str, str]:
+        rows = self.conn.query_all(
+            "SELECT object_id, hash FROM rebuild_hash_index WHERE collection = ?",
+            (collection,),
+        )
+        return {r["object_id"]: r["hash"] for r in rows}
+
+    def upsert_hashes(self, collection: str, items: Iterable[Tuple[str, str]]) -> None:
+        params = [(collection, oid, h) for oid, h in items if oid and h]
+        if not params:
+            return
+        self.conn.executemany(
+            """
+            INSERT INTO rebuild_hash_index(collection, object_id, hash)
+            VALUES (?, ?, ?)
+            ON CONFLICT(collection, object_id) DO UPDATE SET
+              hash = excluded.hash,
+              updated_at = datetime('now')
+            """,
+            params,
+        )
+
+    def delete_hashes(self, collection: str, object_ids: Iterable[str]) -> None:
+        params = [(collection, oid) for oid in object_ids if oid]
+        if not params:
+            return
+        self.conn.executemany(
+            "DELETE FROM rebuild_hash_index WHERE collection = ? AND object_id = ?",
+            params,
+        )
+
+    def replace_hashes(self, collection: str, mapping: Dict[str, Optional[str]]) -> None:
+        """用 Weaviate 快照整体重置侧索引。"""
+        self.conn.execute("DELETE FROM rebuild_hash_index WHERE collection = ?", (collection,))
+        self.upsert_hashes(collection, ((k, v) for k, v in mapping.items() if v))
+
+    def purge_collection(self, collection: str) -> None:
+        """collection 被回收后清理其侧索引与断点（Weaviate 会把首字母大写，这里忽略大小写）。"""
+        for table in ("rebuild_hash_index", "rebuild_company_state"):
+            self.conn.execute(f"DELETE FROM {table} WHERE lower(collection) = lower(?)", (collection,))
+
+    # -------- 公司断点 --------
+    def get_company(self, collection: str, company: str) -> Optional[Row]:
+        return self.conn.query_one(
+            "SELECT * FROM rebuild_company_state WHERE collection = ? AND company = ?",
+            (collection, company),
+        )
+
+    def start_company(
+        self,
+        collection: str,
+        company: str,
+        *,
+        crawl_date: str,
+        manifest_etag: str,
+        files_total: int,
+        files_done: int = 0,
+    ) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO rebuild_company_state(
+              collection, company, crawl_date, manifest_etag, files_total, files_done, status
+            )
+            VALUES (?, ?, ?, ?, ?, ?, 'running')
+            ON CONFLICT(collection, company) DO UPDATE SET
+              crawl_date = excluded.crawl_date,
+              manifest_etag = excluded.manifest_etag,
+              files_total = excluded.files_total,
+              files_done = excluded.files_done,
+              status = 'running',
+              updated_at = datetime('now')
+            """,
+            (collection, company, crawl_date, manifest_etag or "", int(files_total), int(files_done)),
+        )
+
+    def checkpoint_company(self, collection: str, company: str, *, files_done: int, done: bool = False) -> None:
+        self.conn.execute(
+            """
+            UPDATE rebuild_company_state
+            SET files_done = ?, status = ?, updated_at = datetime('now')
+            WHERE collection = ? AND company = ?
+            """,
+            (int(files_done), "done" if done else "running", collection, company),
+        )
+
+    # -------- 运行记录 --------
+    def start_run(self, collection: str, params: Optional[Dict[str, Any]] = None) -> int:
+        cur = self.conn.execute(
+            "INSERT INTO rebuild_runs(collection, params_json) VALUES (?, ?)",
+            (collection, json.dumps(params, ensure_ascii=False) if params else None),
+        )
+        return int(cur.lastrowid)
+
+    def finish_run(self, run_id: int, *, status: str, stats: Optional[Dict[str, Any]] = None) -> None:
+        self.conn.execute(
+            """
+            UPDATE rebuild_runs
+            SET status = ?, stats_json = ?, finished_at = datetime('now')
+            WHERE id = ?
+            """,
+            (status, json.dumps(stats, ensure_ascii=False) if stats else None, int(run_id)),
+        )
+
+    def list_runs(self, collection: str, *, limit: int = 20) -> List[Row]:
+        return self.conn.query_all(
+            """
+            SELECT * FROM rebuild_runs
+            WHERE collection = ?
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (collection, int(limit)),
+        )
@@ -0,0 +1,231 @@
+# rag/datasource/vectorstores/schema_registry.py
+# -*- coding: utf-8 -*-
+"""
+SchemaRegistry（collection schema 状态缓存）
+- 按 collection 记录已核对过的「期望属性集合」指纹与服务端已有属性名
+- is_current()：指纹命中直接返回（零网络调用）
+- sync()：未命中时拉一次 schema 做 diff，只为缺失属性发 add_property
+- check_drift()：后台周期性重拉已缓存 collection 的 schema；属性缺失则补齐，collection 不见了则作废缓存
+- property_type()：已缓存的属性数据类型（写入方据此兼容迁移前后不同类型的同名属性）
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import weaviate.classes.config as wc
+
+
+def _type_name(data_type: Any) -> str:
+    return str(getattr(data_type, "value", data_type) or "")
+
+
+def fingerprint(properties: List[wc.Property]) -> str:
+    items = sorted(f"{p.name.lower()}:{_type_name(p.dataType)}" for p in properties)
+    return hashlib.sha1("|".join(items).encode("utf-8")).hexdigest()
+
+
+def _is_missing_class_error(err: Exception) -> bool:
+    if getattr(err, "status_code", None) == 404:
+        return True
+    msg = str(err).lower()
+    return "could not find class" in msg or "not found in schema" in msg or "does not exist" in msg
+
+
+@dataclass
+class _SchemaState:
+    fingerprints: Set[str] = field(default_factory=set)         # 已核对通过的期望属性集合
+    known: Set[str] = field(default_factory=set)                # 服务端已有属性名（小写）
+    types: Dict[str, str] = field(default_factory=dict)         # 服务端属性名（小写）-> 数据类型（如 text / text[]）
+    desired: Dict[str, wc.Property] = field(default_factory=dict)  # 各调用方期望属性的并集（用于漂移修复）
+    checked_at: float = 0.0
+
+
+class SchemaRegistry:
+    def __init__(
+        self,
+        client_provider: Callable[[], Any],
+        on_invalidated: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._client_provider = client_provider
+        # 漂移检查发现 collection 不见了时回调（WeaviateStore 借此清掉自己的就绪状态）
+        self._on_invalidated = on_invalidated
+        self._lock = threading.Lock()
+        self._states: Dict[str, _SchemaState] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "schema_fetches": 0,
+            "properties_added": 0,
+            "drift_checks": 0,
+            "drift_repaired": 0,
+            "drift_invalidated": 0,
+        }
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -------- 热路径 --------
+    def is_current(self, collection: str, properties: List[wc.Property]) -> bool:
+        fp = fingerprint(properties)
+        with self._lock:
+            state = self._states.get(collection)
+            if state is None:
+                self._stats["misses"] += 1
+                return False
+            if fp in state.fingerprints:
+                self._stats["hits"] += 1
+                return True
+            # 新的属性组合但都已存在（如不同调用方传入子集）：记下指纹，仍然零调用
+            if all(p.name.lower() in state.known for p in properties):
+                state.fingerprints.add(fp)
+                for p in properties:
+                    state.desired.setdefault(p.name.lower(), p)
+                self._stats["hits"] += 1
+                return True
+            self._stats["misses"] += 1
+            return False
+
+    def sync(self, collection: str, properties: List[wc.Property]) -> List[str]:
+        """拉一次 schema，与期望属性 diff，只补缺失属性；返回新增的属性名。"""
+        types = self._fetch_properties(collection)
+        if types is None:
+            return []
+        known = set(types)
+        added = self._add_missing(collection, properties, known, types)
+        with self._lock:
+            state = self._states.setdefault(collection, _SchemaState())
+            state.known = known
+            state.types = types
+            # 有属性没补上时不记指纹，下次 ensure 继续尝试
+            if all(p.name.lower() in known for p in properties):
+                state.fingerprints.add(fingerprint(properties))
+            for p in properties:
+                state.desired.setdefault(p.name.lower(), p)
+            state.checked_at = time.time()
+        return added
+
+    def property_type(self, collection: str, name: str) -> Optional[str]:
+        with self._lock:
+            state = self._states.get(collection)
+            return state.types.get(name.lower()) if state is not None else None
+
+    def invalidate(self, collection: str) -> None:
+        with self._lock:
+            self._states.pop(collection, None)
+
+    # -------- 漂移检查 --------
+    def check_drift(self) -> Dict[str, Any]:
+        """对已缓存的 collection 重拉 schema：缺属性则补齐；collection 不存在则作废缓存（下次 ensure 重建）。"""
+        with self._lock:
+            targets = {name: list(st.desired.values()) for name, st in self._states.items()}
+        report: Dict[str, Any] = {"checked": 0, "repaired": {}, "invalidated": [], "errors": {}}
+        for collection, desired in targets.items():
+            report["checked"] += 1
+            try:
+                types = self._fetch_properties(collection)
+            except Exception as e:
+                report["errors"][collection] = str(e)
+                continue
+            if types is None:
+                self.invalidate(collection)
+                if self._on_invalidated is not None:
+                    self._on_invalidated(collection)
+                report["invalidated"].append(collection)
+                continue
+            known = set(types)
+            added = self._add_missing(collection, desired, known, types)
+            with self._lock:
+                state = self._states.get(collection)
+                if state is not None:
+                    state.known = known
+                    state.types = types
+                    state.checked_at = time.time()
+            if added:
+                report["repaired"][collection] = added
+        with self._lock:
+            self._stats["drift_checks"] += 1
+            self._stats["drift_repaired"] += len(report["repaired"])
+            self._stats["drift_invalidated"] += len(report["invalidated"])
+        if report["repaired"] or report["invalidated"]:
+            print(
+                f"[weaviate][schema] drift: repaired={report['repaired']} "
+                f"invalidated={report['invalidated']}"
+            )
+        return report
+
+    def start(self, interval_seconds: int) -> None:
+        if interval_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, args=(float(interval_seconds),), name="weaviate-schema-check", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.check_drift()
+            except Exception as e:
+                print(f"[weaviate][schema] drift check failed: err={e}")
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "collections": len(self._states),
+                "drift_check_running": bool(self._thread and self._thread.is_alive()),
+            }
+
+    # -------- 内部 --------
+    def _fetch_properties(self, collection: str) -> Optional[Dict[str, str]]:
+        """服务端属性 {名称（小写）: 数据类型}；collection 不存在返回 None。"""
+        with self._lock:
+            self._stats["schema_fetches"] += 1
+        try:
+            cfg = self._client_provider().collections.get(collection).config.get()
+        except Exception as e:
+            if _is_missing_class_error(e):
+                return None
+            raise
+        return {p.name.lower(): _type_name(getattr(p, "data_type", "")) for p in (cfg.properties or [])}
+
+    def _add_missing(
+        self,
+        collection: str,
+        properties: List[wc.Property],
+        known: Set[str],
+        types: Dict[str, str],
+    ) -> List[str]:
+        missing = [p for p in properties if p.name.lower() not in known]
+        if not missing:
+            return []
+        col = self._client_provider().collections.get(collection)
+        added: List[str] = []
+        for p in missing:
+            try:
+                col.config.add_property(p)
+            except Exception as e:
+                # 并发补字段时另一方先加上了：视为成功
+                if "already exists" not in str(e).lower():
+                    print(
+                        f"[weaviate][schema] add_property failed: col={collection} prop={p.name} err={e}"
+                    )
+                    continue
+            known.add(p.name.lower())
+            types[p.name.lower()] = _type_name(p.dataType)
+            added.append(p.name)
+        with self._lock:
+            self._stats["properties_added"] += len(added)
+        return added
@@ -6,12 +6,19 @@ WeaviateStore（新版，无业务，无 schema）
 - 不自动创建 collection
 - 不写任何业务字段（memory_id / app）
 - schema 全由 Memory/Kb 模块控制
+- 可选 alias：逻辑 collection 名经 CollectionAliasStore 解析为物理名（蓝绿重建）
 """
 
 from __future__ import annotations
 
+import math
+import threading
 import time
-from typing import List, Dict, Any, Optional
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 
 import weaviate
 import weaviate.classes.config as wc
@@ -19,6 +26,49 @@ import weaviate.classes.query as wq
 from weaviate.classes.query import Filter
 
 from datasource.connections.weaviate_connection import WeaviateConnection
+from datasource.vectorstores.schema_registry import SchemaRegistry
+from datasource.sqlstores.collection_alias_store import CollectionAliasStore
+
+
+ALIAS_CACHE_TTL = 2.0       # alias 映射的本地缓存时间（秒），跨进程切换最多延迟这么久
+DEFAULT_DELETE_CHUNK = 500  # 单次 delete_many 的 id 数（远低于服务端 QUERY_MAXIMUM_RESULTS）
+DEFAULT_ITERATE_BATCH = 500  # iterate 每次游标请求取回的对象数
+READY_WAIT_SECONDS = 2.0    # 请求线程等待 collection 就绪的上限，超时即 CollectionNotReady
+CREATE_TIMEOUT_SECONDS = 30.0  # 后台任务等待新建 collection 可见的上限
+
+
+class CollectionNotReady(RuntimeError):
+    """collection 仍在后台创建/等待可见；调用方应在 retry_after 秒后重试。"""
+
+    def __init__(self, collection: str, retry_after: int = 1) -> None:
+        super().__init__(f"collection {collection} is not ready, retry after {retry_after}s")
+        self.collection = collection
+        self.retry_after = retry_after
+
+
+@dataclass
+class DeleteResult:
+    """按 id 批量删除的结果：失败按 chunk 记录，不影响其它 chunk"""
+    requested: int = 0
+    deleted: int = 0
+    chunks: int = 0
+    failed_ids: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed_ids
+
+
+@dataclass
+class UpsertResult:
+    """批量写入的结果：ids 与输入一一对应，errors 为 {id: 服务端错误信息}"""
+    ids: List[str] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
 
 
 def _safe_name(name: str) -> str:
@@ -29,13 +79,94 @@ def _safe_name(name: str) -> str:
     return s
 
 
+# filters 取值：标量 = 等值；dict = {操作符: 参数}，同一属性可组合多个操作符（AND）
+# 例：{"allowed_apps": {"contains_any": ["a", "b"]}, "created_ts": {"gte": 1, "lt": 9}}
+FILTER_OPS = ("eq", "ne", "in", "contains_any", "contains_all", "gt", "gte", "lt", "lte")
+
+
+def _op_args(prop: str, op: str, arg: Any) -> List[Any]:
+    values = list(arg) if isinstance(arg, (list, tuple, set)) else [arg]
+    if not values:
+        raise ValueError(f"filter {prop}.{op} requires a non-empty list")
+    return values
+
+
+def _clause(prop: str, op: str, arg: Any) -> Filter:
+    f = Filter.by_property(prop)
+    if op == "eq":
+        return f.equal(arg)
+    if op == "ne":
+        return f.not_equal(arg)
+    if op in ("in", "contains_any"):
+        # 标量属性：取值在列表中；数组属性：与列表有交集
+        return f.contains_any(_op_args(prop, op, arg))
+    if op == "contains_all":
+        return f.contains_all(_op_args(prop, op, arg))
+    if op == "gt":
+        return f.greater_than(arg)
+    if op == "gte":
+        return f.greater_or_equal(arg)
+    if op == "lt":
+        return f.less_than(arg)
+    if op == "lte":
+        return f.less_or_equal(arg)
+    raise ValueError(f"unsupported filter operator: {prop}.{op} (supported: {', '.join(FILTER_OPS)})")
+
+
 def _build_filters(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
     if not filters:
         return None
-    clauses = [Filter.by_property(k).equal(v) for k, v in filters.items()]
+    clauses = []
+    for k, v in filters.items():
+        if isinstance(v, dict):
+            clauses.extend(_clause(k, op, arg) for op, arg in v.items())
+        else:
+            clauses.append(Filter.by_property(k).equal(v))
     return Filter.all_of(clauses)
 
 
+def _match_op(actual: Any, op: str, arg: Any) -> bool:
+    """客户端版 _clause：数组属性与 Weaviate 一致，等值/包含按元素判断。"""
+    items = list(actual) if isinstance(actual, (list, tuple)) else [actual]
+    if op == "eq":
+        return arg in items
+    if op == "ne":
+        return arg not in items
+    if op in ("in", "contains_any"):
+        return any(v in items for v in _op_args("", op, arg))
+    if op == "contains_all":
+        return all(v in items for v in _op_args("", op, arg))
+    if op in ("gt", "gte", "lt", "lte"):
+        if actual is None:
+            return False
+        try:
+            if op == "gt":
+                return actual > arg
+            if op == "gte":
+                return actual >= arg
+            if op == "lt":
+                return actual < arg
+            return actual <= arg
+        except TypeError:
+            return False
+    raise ValueError(f"unsupported filter operator: {op}")
+
+
+def _matches(props: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """客户端版 _build_filters（游标不支持服务端过滤时使用）。"""
+    for k, v in filters.items():
+        conds = v.items() if isinstance(v, dict) else [("eq", v)]
+        if not all(_match_op(props.get(k), op, arg) for op, arg in conds):
+            return False
+    return True
+
+
+def _projection(fields: Optional[List[str]], default: Any = None) -> Any:
+    """return_properties 投影：去重保序；空/None 表示取全部属性（沿用各查询原来的默认值）。"""
+    picked = list(dict.fromkeys(str(f) for f in fields or [] if f))
+    return picked or default
+
+
 def _is_missing_class_error(err: Exception) -> bool:
     msg = str(err).lower()
     return "could not find class" in msg or "not found in schema" in msg
@@ -49,10 +180,58 @@ def _is_already_exists_error(err: Exception) -> bool:
 class WeaviateStore:
     """纯向量数据库客户端"""
 
-    def __init__(self, conn: WeaviateConnection):
+    def __init__(
+        self,
+        conn: WeaviateConnection,
+        aliases: Optional[CollectionAliasStore] = None,
+        *,
+        ready_wait_seconds: float = READY_WAIT_SECONDS,
+        create_timeout_seconds: float = CREATE_TIMEOUT_SECONDS,
+    ):
         self.conn = conn
         self.client: weaviate.WeaviateClient = conn.client
         self._ensured: set[str] = set()
+        self.ready_wait_seconds = max(float(ready_wait_seconds), 0.0)
+        self.create_timeout_seconds = max(float(create_timeout_seconds), 1.0)
+        # collection -> 就绪任务（同一 collection 的并发首次访问共用一个 future）
+        self._ready: Dict[str, Future] = {}
+        self._ready_lock = threading.Lock()
+        self._ready_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weaviate-ready")
+        self.schema = SchemaRegistry(lambda: self.client, on_invalidated=self._forget_ready)
+        self.aliases = aliases
+        self._alias_map: Dict[str, str] = {}
+        self._alias_loaded_at = 0.0
+        self._alias_lock = threading.Lock()
+
+    # ---------------- Alias ----------------
+
+    def resolve(self, name: str) -> str:
+        """逻辑名 -> 物理 collection 名；未配置 alias 时原样返回。"""
+        col = _safe_name(name)
+        if self.aliases is None:
+            return col
+        now = time.time()
+        if now - self._alias_loaded_at >= ALIAS_CACHE_TTL:
+            with self._alias_lock:
+                if now - self._alias_loaded_at >= ALIAS_CACHE_TTL:
+                    try:
+                        self._alias_map = self.aliases.resolve_map()
+                    except Exception as e:
+                        # 读不到指针时沿用上一份映射
+                        print(f"[weaviate][alias] load failed (keep cached): err={e}")
+                    self._alias_loaded_at = now
+        return self._alias_map.get(col, col)
+
+    def switch_alias(self, alias: str, target: str) -> Optional[str]:
+        """原子切换 alias 指向，返回旧 target。"""
+        if self.aliases is None:
+            raise RuntimeError("alias store is not configured")
+        prev = self.aliases.set(_safe_name(alias), _safe_name(target))
+        self._alias_loaded_at = 0.0
+        return prev
+
+    def _get(self, collection: str):
+        return self.client.collections.get(self.resolve(collection))
 
     # ---------------- Collection 管理 ----------------
 
@@ -67,75 +246,112 @@ class WeaviateStore:
         )
 
 
-    def ensure_collection(self, name: str, properties: List[wc.Property]):
-        """Memory/Kb 模块用：确保 collection 存在（幂等）"""
-        col = _safe_name(name)
+    def ensure_collection(
+        self,
+        name: str,
+        properties: List[wc.Property],
+        *,
+        wait: Optional[float] = None,
+        index_timestamps: bool = False,
+    ):
+        """
+        Memory/Kb 模块用：确保 collection 存在（幂等）
+        - 已就绪：只查本地 schema 缓存（属性集合变化时才拉一次 schema 补字段）
+        - 未就绪：等待共享的后台就绪任务，最多 wait 秒（默认 ready_wait_seconds），超时抛 CollectionNotReady；
+          请求线程内不做任何 sleep 轮询
+        - index_timestamps：新建时为创建/更新时间建倒排索引（iter_updated_since 需要）；对已存在的 collection 无效
+        """
+        col = self.resolve(name)
 
         if col in self._ensured:
-            self._ensure_properties(col, properties)
+            # 热路径：期望属性集合已核对过，不发任何 schema 请求
+            if not self.schema.is_current(col, properties):
+                self.schema.sync(col, properties)
             return
 
-        # 1) 先用 list_all 判断是否存在（这是会真实访问服务端的）
+        fut = self.prepare_collection(name, properties, index_timestamps=index_timestamps)
+        timeout = self.ready_wait_seconds if wait is None else max(float(wait), 0.0)
         try:
-            existing_names = set(self.list_collections())
-        except Exception as e:
-            print(f"[weaviate][ensure_collection] list_collections failed: err={e}")
-            raise
-
-        exists = col in existing_names
-        if not exists:
-            # 2) 不存在：创建
+            fut.result(timeout=timeout)
+        except FutureTimeout:
+            raise CollectionNotReady(col, retry_after=max(math.ceil(timeout), 1)) from None
+
+    def prepare_collection(
+        self, name: str, properties: List[wc.Property], *, index_timestamps: bool = False
+    ) -> Future:
+        """提交（或复用）collection 的后台就绪任务，不阻塞；启动预热与首次访问共用。"""
+        col = self.resolve(name)
+        with self._ready_lock:
+            fut = self._ready.get(col)
+            # 失败的任务不复用，下次访问重新尝试
+            if fut is None or (fut.done() and fut.exception() is not None):
+                fut = self._ready_pool.submit(self._make_ready, col, list(properties), index_timestamps)
+                self._ready[col] = fut
+        return fut
+
+    def _make_ready(self, col: str, properties: List[wc.Property], index_timestamps: bool = False) -> None:
+        """后台线程：不存在则创建，等待其可见（有上限的退避轮询），再核对属性。"""
+        existing_names = set(self.list_collections())
+        if col not in existing_names:
             try:
                 self.client.collections.create(
                     name=col,
                     properties=properties,
                     vector_config=wc.Configure.Vectors.self_provided(),
+                    inverted_index_config=(
+                        wc.Configure.inverted_index(index_timestamps=True) if index_timestamps else None
+                    ),
                 )
             except Exception as e_create:
-                if _is_already_exists_error(e_create):
-                    exists = True
-                else:
+                if not _is_already_exists_error(e_create):
                     print(f"[weaviate][ensure_collection] create FAILED: col={col} err={e_create}")
                     raise
-
-            # 3) 创建后轮询验证（处理一致性延迟）
-            #    总等待约 0.4 * (1..10) = 22 秒（可按需调整）
-            if not exists:
-                for i in range(10):
-                    time.sleep(0.4 * (i + 1))
-                    try:
-                        existing_names = set(self.list_collections())
-                    except Exception as e_list:
-                        print(f"[weaviate][ensure_collection] post-create list failed: i={i} err={e_list}")
-                        continue
-                    if col in existing_names:
-                        exists = True
-                        break
-
-        # 4) 已存在：才尝试补字段
-        self._ensure_properties(col, properties)
+            # 创建后等待可见（处理一致性延迟）
+            deadline = time.time() + self.create_timeout_seconds
+            delay = 0.2
+            while col not in existing_names:
+                if time.time() >= deadline:
+                    raise TimeoutError(f"collection {col} not visible after {self.create_timeout_seconds:.0f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 2.0)
+                try:
+                    existing_names = set(self.list_collections())
+                except Exception as e_list:
+                    print(f"[weaviate][ensure_collection] post-create list failed: col={col} err={e_list}")
+
+        # 已存在：拉一次 schema 做 diff，只补缺失字段（结果缓存，之后走热路径）
+        self.schema.sync(col, properties)
         self._ensured.add(col)
 
-    def _ensure_properties(self, col: str, properties: List[wc.Property]) -> None:
-        try:
-            existing = self.client.collections.get(col)
-        except Exception as e_get:
-            if _is_missing_class_error(e_get):
-                return
-            raise
-        for p in properties:
-            try:
-                existing.config.add_property(p)
-            except Exception as e:
-                msg = str(e).lower()
-                if "already exists" in msg:
-                    # 正常幂等场景，静默跳过
-                    pass
-                else:
-                    print(
-                        f"[weaviate][ensure_collection] add_property unexpected error: "
-                        f"col={col} prop={p.name} err={e}"
-                    )
+    def _not_ready(self, collection: str) -> CollectionNotReady:
+        """读写时发现 collection 不存在：作废就绪状态并提交重建，调用方快速失败。"""
+        col = self.resolve(collection)
+        self._ensured.discard(col)
+        self.schema.invalidate(col)
+        with self._ready_lock:
+            self._ready.pop(col, None)
+        return CollectionNotReady(col, retry_after=max(math.ceil(self.ready_wait_seconds), 1))
+
+    def property_type(self, collection: str, name: str) -> Optional[str]:
+        """已缓存 schema 中属性的数据类型（如 "text" / "text[]"）；未缓存或不存在返回 None。"""
+        return self.schema.property_type(self.resolve(collection), name)
+
+    def check_schema_drift(self) -> Dict[str, Any]:
+        """漂移检查（后台线程也走 schema.check_drift）：被删掉的 collection 经回调移出 _ensured，下次 ensure 重新创建。"""
+        return self.schema.check_drift()
+
+    def _forget_ready(self, col: str) -> None:
+        self._ensured.discard(col)
+        with self._ready_lock:
+            self._ready.pop(col, None)
+
+    def drop_collection(self, name: str) -> None:
+        """按物理名删除 collection（不经 alias 解析；用于旧版本回收）。"""
+        col = _safe_name(name)
+        self.client.collections.delete(col)
+        self._ensured.discard(col)
+        self.schema.invalidate(col)
+
     def list_collections(self) -> List[str]:
         cols = self.client.collections.list_all()
         result = []
@@ -152,7 +368,7 @@ class WeaviateStore:
         properties: Dict[str, Any],
         object_id: Optional[str] = None,
     ) -> str:
-        col = self.client.collections.get(_safe_name(collection))
+        col = self._get(collection)
 
         if object_id:
             try:
@@ -175,7 +391,7 @@ class WeaviateStore:
         properties_list: List[Dict[str, Any]],
         ids: Optional[List[str]] = None,
     ) -> List[str]:
-        col = self.client.collections.get(_safe_name(collection))
+        col = self._get(collection)
         out: List[str] = []
 
         with col.batch.dynamic() as batch:
@@ -191,6 +407,30 @@ class WeaviateStore:
 
         return out
 
+    def upsert_many(
+        self,
+        collection: str,
+        vectors: List[List[float]],
+        properties_list: List[Dict[str, Any]],
+        ids: Optional[List[Optional[str]]] = None,
+    ) -> UpsertResult:
+        """
+        批量写入并逐条报告失败（batch 内同 uuid 即整条覆盖，语义同 upsert）
+        - 未给 id 的对象在客户端生成 uuid，失败对象才能对回输入位置
+        """
+        col = self._get(collection)
+        out = UpsertResult(
+            ids=[str(ids[i]) if ids and ids[i] else str(uuid.uuid4()) for i in range(len(properties_list))]
+        )
+        with col.batch.dynamic() as batch:
+            for uid, props, vec in zip(out.ids, properties_list, vectors):
+                batch.add_object(properties=props, vector=vec, uuid=uid)
+        for err in col.batch.failed_objects:
+            uid = err.original_uuid or getattr(err.object_, "uuid", None)
+            if uid is not None:
+                out.errors[str(uid)] = str(err.message)
+        return out
+
     # ---------------- 搜索 ----------------
 
     def search(
@@ -199,14 +439,17 @@ class WeaviateStore:
         query_vector: List[float],
         top_k: int = 8,
         filters: Optional[Dict[str, Any]] = None,
+        return_properties: Optional[List[str]] = None,
     ) -> List[Dict[str, Any]]:
-        col = self.client.collections.get(_safe_name(collection))
+        """return_properties：只取这些属性（服务端投影）；None 取全部。"""
+        col = self._get(collection)
         where = _build_filters(filters)
 
         res = col.query.near_vector(
             near_vector=query_vector,
             limit=top_k,
             return_metadata=wq.MetadataQuery(distance=True),
+            return_properties=_projection(return_properties),
             filters=where,
         )
 
@@ -234,8 +477,9 @@ class WeaviateStore:
         alpha: float = 0.5,
         top_k: int = 8,
         filters: Optional[Dict[str, Any]] = None,
+        return_properties: Optional[List[str]] = None,
     ) -> List[Dict[str, Any]]:
-        col = self.client.collections.get(_safe_name(collection))
+        col = self._get(collection)
 
         where = _build_filters(filters)
 
@@ -246,6 +490,7 @@ class WeaviateStore:
             limit=top_k,
             filters=where,
             return_metadata=wq.MetadataQuery(score=True),
+            return_properties=_projection(return_properties),
         )
 
         hits = []
@@ -262,21 +507,15 @@ class WeaviateStore:
     # ---------------- 列表/统计 ----------------
 
     def count(self, collection: str, filters: Optional[Dict[str, Any]] = None) -> int:
-        col = self.client.collections.get(_safe_name(collection))
+        col = self._get(collection)
         where = _build_filters(filters)
-        last_err = None
-        for i in range(5):
-            try:
-                res = col.aggregate.over_all(filters=where, total_count=True)
-                return int(getattr(res, "total_count", 0) or 0)
-            except Exception as e:
-                if not _is_missing_class_error(e):
-                    raise
-                last_err = e
-                time.sleep(0.4 * (i + 1))
-        if last_err:
-            raise last_err
-        return 0
+        try:
+            res = col.aggregate.over_all(filters=where, total_count=True)
+        except Exception as e:
+            if _is_missing_class_error(e):
+                raise self._not_ready(collection) from e
+            raise
+        return int(getattr(res, "total_count", 0) or 0)
 
     def fetch_objects(
         self,
@@ -286,29 +525,23 @@ class WeaviateStore:
         offset: int = 0,
         filters: Optional[Dict[str, Any]] = None,
         include_vector: bool = False,
+        return_properties: Optional[List[str]] = None,
     ) -> List[Dict[str, Any]]:
-        col = self.client.collections.get(_safe_name(collection))
+        col = self._get(collection)
         where = _build_filters(filters)
-        last_err = None
-        for i in range(5):
-            try:
-                res = col.query.fetch_objects(
-                    limit=limit,
-                    offset=offset,
-                    filters=where,
-                    include_vector=include_vector,
-                    return_metadata=wq.MetadataQuery(creation_time=True, last_update_time=True),
-                    return_properties=True,
-                )
-                last_err = None
-                break
-            except Exception as e:
-                if not _is_missing_class_error(e):
-                    raise
-                last_err = e
-                time.sleep(0.4 * (i + 1))
-        if last_err:
-            raise last_err
+        try:
+            res = col.query.fetch_objects(
+                limit=limit,
+                offset=offset,
+                filters=where,
+                include_vector=include_vector,
+                return_metadata=wq.MetadataQuery(creation_time=True, last_update_time=True),
+                return_properties=_projection(return_properties, default=True),
+            )
+        except Exception as e:
+            if _is_missing_class_error(e):
+                raise self._not_ready(collection) from e
+            raise
 
         out = []
         for obj in getattr(res, "objects", []) or []:
@@ -323,8 +556,181 @@ class WeaviateStore:
             )
         return out
 
+    def iterate(
+        self,
+        collection: str,
+        *,
+        filters: Optional[Dict[str, Any]] = None,
+        properties: Optional[List[str]] = None,
+        include_vector: bool = False,
+        batch_size: int = DEFAULT_ITERATE_BATCH,
+        after: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        游标（after=uuid）遍历 collection，按 uuid 顺序逐条产出 {id, properties, created_at, updated_at[, vector]}
+        - 每页代价恒定，不受 offset 深度与 QUERY_MAXIMUM_RESULTS 限制；适合全量导出、对账、快照
+        - after：从该 uuid 之后继续（上一轮最后一条的 id），用于分页续取
+        - filters：Weaviate 的游标不支持 where 过滤，只能全量遍历后在客户端过滤（扫描整个 collection）；
+          按范围分页的接口不要用它，改用 fetch_objects(offset) 或按 id 取
+        """
+        col = self._get(collection)
+        batch_size = max(int(batch_size), 1)
+        fields = _projection(properties, default=True)
+        req = fields
+        if filters and isinstance(fields, list):
+            # 客户端过滤需要过滤字段本身
+            req = _projection(fields + list(filters))
+        cursor = after
+        while True:
+            try:
+                res = col.query.fetch_objects(
+                    limit=batch_size,
+                    after=cursor,
+                    include_vector=include_vector,
+                    return_metadata=wq.MetadataQuery(creation_time=True, last_update_time=True),
+                    return_properties=req,
+                )
+            except Exception as e:
+                if _is_missing_class_error(e):
+                    raise self._not_ready(collection) from e
+                raise
+
+            objs = getattr(res, "objects", []) or []
+            for obj in objs:
+                props = getattr(obj, "properties", {}) or {}
+                if filters:
+                    if not _matches(props, filters):
+                        continue
+                    if req is not fields:
+                        props = {k: v for k, v in props.items() if k in fields}
+                meta = getattr(obj, "metadata", None)
+                item = {
+                    "id": str(getattr(obj, "uuid", "")),
+                    "properties": props,
+                    "created_at": getattr(meta, "creation_time", None),
+                    "updated_at": getattr(meta, "last_update_time", None),
+                }
+                if include_vector:
+                    item["vector"] = getattr(obj, "vector", None)
+                yield item
+            if len(objs) < batch_size:
+                return
+            cursor = str(objs[-1].uuid)
+
+    def fetch_property_map(
+        self,
+        collection: str,
+        prop: str,
+        *,
+        batch_size: int = 1000,
+    ) -> Dict[str, Any]:
+        """
+        游标遍历整个 collection，只取单个属性：
+        返回 {uuid: value}，用于增量判断等需要全量快照的场景。
+        """
+        return {
+            item["id"]: item["properties"].get(prop)
+            for item in self.iterate(collection, properties=[prop], batch_size=batch_size)
+        }
+
+    def fetch_objects_by_ids(
+        self,
+        collection: str,
+        object_ids: Iterable[str],
+        *,
+        include_vector: bool = False,
+        return_properties: Optional[List[str]] = None,
+        chunk_size: int = DEFAULT_DELETE_CHUNK,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        按 id 批量取对象：每 chunk 一次 fetch_objects(where=id contains_any)
+        返回 {id: {id, properties, created_at, updated_at[, vector]}}；不存在的 id 不出现在结果中。
+        """
+        col = self._get(collection)
+        ids = list(dict.fromkeys(str(i) for i in object_ids if i))
+        chunk_size = max(int(chunk_size or DEFAULT_DELETE_CHUNK), 1)
+        out: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            try:
+                res = col.query.fetch_objects(
+                    limit=len(chunk),
+                    filters=Filter.by_id().contains_any(chunk),
+                    include_vector=include_vector,
+                    return_metadata=wq.MetadataQuery(creation_time=True, last_update_time=True),
+                    return_properties=_projection(return_properties, default=True),
+                )
+            except Exception as e:
+                if _is_missing_class_error(e):
+                    raise self._not_ready(collection) from e
+                raise
+            for obj in getattr(res, "objects", []) or []:
+                meta = getattr(obj, "metadata", None)
+                item = {
+                    "id": str(getattr(obj, "uuid", "")),
+                    "properties": getattr(obj, "properties", {}) or {},
+                    "created_at": getattr(meta, "creation_time", None),
+                    "updated_at": getattr(meta, "last_update_time", None),
+                }
+                if include_vector:
+                    item["vector"] = getattr(obj, "vector", None)
+                out[item["id"]] = item
+        return out
+
+    def iter_updated_since(
+        self,
+        collection: str,
+        since: datetime,
+        *,
+        properties: Optional[List[str]] = None,
+        batch_size: int = DEFAULT_ITERATE_BATCH,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        服务端按 lastUpdateTime >= since 过滤、按更新时间升序分页，逐条产出 {id, properties, created_at, updated_at}
+        - 只读变更过的对象，代价与变更数成正比（不扫全量）；需要 collection 创建时 index_timestamps=True，
+          否则 Weaviate 报错，调用方可回退到 iterate 全量扫描
+        - 以「最后一条的更新时间 + 同一时间戳已取条数」续页，不受 offset 深度限制
+        """
+        col = self._get(collection)
+        batch_size = max(int(batch_size), 1)
+        cursor = since
+        skip = 0
+        while True:
+            try:
+                res = col.query.fetch_objects(
+                    limit=batch_size,
+                    offset=skip,
+                    filters=Filter.by_update_time().greater_or_equal(cursor),
+                    sort=wq.Sort.by_update_time(ascending=True),
+                    return_metadata=wq.MetadataQuery(creation_time=True, last_update_time=True),
+                    return_properties=_projection(properties, default=True),
+                )
+            except Exception as e:
+                if _is_missing_class_error(e):
+                    raise self._not_ready(collection) from e
+                raise
+            objs = getattr(res, "objects", []) or []
+            for obj in objs:
+                meta = getattr(obj, "metadata", None)
+                yield {
+                    "id": str(getattr(obj, "uuid", "")),
+                    "properties": getattr(obj, "properties", {}) or {},
+                    "created_at": getattr(meta, "creation_time", None),
+                    "updated_at": getattr(meta, "last_update_time", None),
+                }
+            if len(objs) < batch_size:
+                return
+            last = getattr(objs[-1].metadata, "last_update_time", None)
+            if last is None:
+                return
+            same = sum(1 for o in objs if getattr(o.metadata, "last_update_time", None) == last)
+            if last == cursor:
+                skip += same
+            else:
+                cursor, skip = last, same
+
     def fetch_object_by_id(self, collection: str, object_id: str) -> Optional[Dict[str, Any]]:
-        col = self.client.collections.get(_safe_name(collection))
+        col = self._get(collection)
         res = col.query.fetch_object_by_id(
             uuid=object_id,
             return_properties=True,
@@ -342,11 +748,64 @@ class WeaviateStore:
     # ---------------- 删除 ----------------
 
     def delete_by_id(self, collection: str, object_id: str):
-        col = self.client.collections.get(_safe_name(collection))
+        col = self._get(collection)
         col.data.delete_by_id(object_id)
 
+    def delete_by_ids(
+        self,
+        collection: str,
+        object_ids: Iterable[str],
+        *,
+        chunk_size: int = DEFAULT_DELETE_CHUNK,
+    ) -> DeleteResult:
+        """
+        批量按 id 删除：每 chunk 一次 delete_many(where=id contains_any)
+        - object_ids 可以是生成器，按 chunk 消费
+        - 不存在的 id 视为已删除
+        - chunk 异常或服务端逐条失败都计入 failed_ids，由调用方决定是否重试
+        """
+        col = self._get(collection)
+        chunk_size = max(int(chunk_size or DEFAULT_DELETE_CHUNK), 1)
+        out = DeleteResult()
+
+        def flush(chunk: List[str]) -> None:
+            out.chunks += 1
+            try:
+                res = col.data.delete_many(
+                    where=Filter.by_id().contains_any(chunk),
+                    verbose=True,
+                )
+            except Exception as e:
+                out.failed_ids.extend(chunk)
+                out.errors.append(f"chunk {out.chunks} (n={len(chunk)}): {e}")
+                return
+            failed = [
+                str(o.uuid) for o in (getattr(res, "objects", None) or [])
+                if not getattr(o, "successful", True)
+            ]
+            out.failed_ids.extend(failed)
+            out.deleted += len(chunk) - len(failed)
+            if failed:
+                out.errors.append(f"chunk {out.chunks} (n={len(chunk)}): {len(failed)} objects failed")
+
+        chunk: List[str] = []
+        seen: set[str] = set()
+        for oid in object_ids:
+            oid = str(oid or "").strip()
+            if not oid or oid in seen:
+                continue
+            seen.add(oid)
+            out.requested += 1
+            chunk.append(oid)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+        return out
+
     def delete_by_filter(self, collection: str, filters: Dict[str, Any]):
-        col = self.client.collections.get(_safe_name(collection))
+        col = self._get(collection)
         clauses = [Filter.by_property(k).equal(v) for k, v in filters.items()]
         where = Filter.all_of(clauses)
         col.data.delete_many(where=where)
@@ -359,7 +818,7 @@ class WeaviateStore:
         properties: Optional[Dict[str, Any]] = None,
         vector: Optional[List[float]] = None,
     ) -> None:
-        col = self.client.collections.get(_safe_name(collection))
+        col = self._get(collection)
         col.data.update(
             uuid=object_id,
             properties=properties if properties else None,
@@ -372,7 +831,7 @@ class WeaviateStore:
         - 存在：返回 dict
         - 不存在：返回 None
         """
-        col = self.client.collections.get(_safe_name(collection))
+        col = self._get(collection)
         try:
             obj = col.query.fetch_object_by_id(uuid=object_id)
         except Exception:
@@ -3,22 +3,36 @@
 
 from __future__ import annotations
 
+import threading
 import time
 import uuid
-from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import Dict, List, Set
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
 from core.embedding.embedding_client import EmbeddingClient
+from core.kb.kb_builder import DEFERRED, BuildItem, KBBuilder, SourceResult, StageStats
 from datasource.objectstores.minio_store import MinIOStore
-from datasource.vectorstores.weaviate_store import WeaviateStore
+from datasource.sqlstores.rebuild_state_store import RebuildStateStore
+from datasource.vectorstores.weaviate_store import ALIAS_CACHE_TTL, CollectionNotReady, WeaviateStore
 
 from .jd_schema import ensure_jd_collection, DEFAULT_JD_COLLECTION
 
 
 DEFAULT_BUCKET = "company-jd"
 DEFAULT_BATCH_SIZE = 32
+DEFAULT_FETCH_WORKERS = 8   # MinIO 并发拉取线程
+DEFAULT_EMBED_WORKERS = 2   # 同时在途的 embedding 批次
+DEFAULT_WRITE_WORKERS = 1   # Weaviate 写入线程
+DEFAULT_QUEUE_SIZE = 256    # 各级队列上限（背压）
+DEFAULT_DELETE_BATCH = 200  # 过期 JD 攒够多少条做一次批量删除
 PROGRESS_EVERY = 100
+CHECKPOINT_EVERY = 200      # 断点推进多少条落一次 SQLite
+HASH_SOURCES = ("auto", "sqlite", "weaviate")
+VERSION_SEP = "__v"          # 蓝绿版本 collection：<collection>__v<YYYYmmddHHMMSS>
+DEFAULT_MIN_COUNT_RATIO = 0.9
+DEFAULT_KEEP_VERSIONS = 1    # 切换后保留的旧版本数（用于回滚）
+REPLAY_SKEW_SECONDS = 60     # 补写判定的时间余量（脚本与 Weaviate 的时钟偏差）
 DEFAULT_APP_ID = "interviewer"
 
 # 稳定 UUID 映射：同一个 job_id 永远得到同一个 UUID
@@ -28,12 +42,65 @@ JD_UUID_NAMESPACE = uuid.UUID("2f4a0c8d-6c3a-4a0e-9c6f-6d9c7a8d2c11")
 @dataclass
 class RebuildStats:
     companies: int = 0
+    companies_unchanged: int = 0   # manifest ETag 未变，整家跳过
+    companies_resumed: int = 0     # 从断点续跑
     manifests_found: int = 0
     jd_total: int = 0
     jd_upserted: int = 0
+    jd_distinct: int = 0           # 写入后仍在 collection 中的不同 uuid 数（同 job_id 多次写入只算一次）
     jd_deleted: int = 0
     jd_skipped: int = 0
     errors: int = 0
+    interrupted: bool = False
+    stages: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+@dataclass
+class BlueGreenResult:
+    alias: str
+    target: str                     # 本次写入的版本 collection
+    previous: str                   # 切换前 alias 指向的物理 collection
+    switched: bool = False
+    replayed: int = 0               # 重建期间写入旧版本、切换前补写到新版本的对象数
+    problems: List[str] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)
+    stats: RebuildStats = field(default_factory=RebuildStats)
+    replay_since: Optional[datetime] = None   # 切换后补写的起点（finish_blue_green 使用）
+    finalize_after: float = 0.0     # 切换时刻 + ALIAS_CACHE_TTL：此后旧指针不再有写入，可调用 finish_blue_green
+    finished: bool = False
+
+
+class _CompanyProgress:
+    """
+    单家公司的完成进度（调用方持锁）
+    流水线乱序完成，这里维护“连续完成前缀”作为断点；
+    失败条目不推进断点，下次运行从第一个失败处恢复。
+    """
+
+    def __init__(self, company: str, start: int, total: int) -> None:
+        self.company = company
+        self.total = total
+        self.watermark = start
+        self.saved = start
+        self.failed = 0
+        self._done: Set[int] = set()
+
+    def mark(self, idx: int, ok: bool) -> None:
+        if not ok:
+            self.failed += 1
+            return
+        self._done.add(idx)
+        while self.watermark in self._done:
+            self._done.discard(self.watermark)
+            self.watermark += 1
+
+    @property
+    def complete(self) -> bool:
+        return self.watermark >= self.total
+
+
+_FAILED = object()   # prepare 的失败标记（可重试，不推进断点）
+_EXPIRED = object()  # prepare 返回 (_EXPIRED, uuid)：交给批量删除
 
 
 def _now_iso() -> str:
@@ -84,15 +151,73 @@ def _compose_content(jd: Dict) -> str:
     return "\n".join(parts).strip()
 
 
-def _extract_company_dates(keys: List[str]) -> Dict[str, Set[str]]:
-    out: Dict[str, Set[str]] = {}
-    for k in keys:
-        parts = k.split("/")
-        if len(parts) >= 2:
-            company, date = parts[0], parts[1]
-            if date.isdigit() and len(date) == 8:
-                out.setdefault(company, set()).add(date)
-    return out
+def _is_crawl_date(name: str) -> bool:
+    return name.isdigit() and len(name) == 8
+
+
+def _iter_company_latest(
+    minio_store: MinIOStore,
+    bucket: str,
+    companies: Optional[Sequence[str]] = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    流式枚举 (company, latest_date)
+    - 顶层非递归列公司前缀（指定 companies 时直接用其前缀），每家公司只列日期目录
+    - 不展开 JD 文件 key，内存与 bucket 内对象总数无关
+    """
+    if companies:
+        prefixes: Iterator[str] = iter([f"{c.strip('/')}/" for c in companies if c.strip("/")])
+    else:
+        prefixes = minio_store.iter_prefixes(bucket, "")
+    for company_prefix in prefixes:
+        company = company_prefix.rstrip("/")
+        dates = [
+            p[len(company_prefix):].rstrip("/")
+            for p in minio_store.iter_prefixes(bucket, company_prefix)
+        ]
+        dates = [d for d in dates if _is_crawl_date(d)]
+        if company and dates:
+            yield company, max(dates)
+
+
+def _load_hash_snapshot(
+    weaviate_store: WeaviateStore,
+    collection: str,
+    state_store: Optional[RebuildStateStore],
+    hash_source: str,
+) -> Dict[str, str]:
+    """
+    一次性加载 {uuid -> hash}，增量判断变成内存查找：
+    - sqlite：读本地侧索引（上次重建时随写入维护）
+    - weaviate：游标遍历 collection，只取 hash 字段；并回填侧索引
+    - auto：侧索引非空且条数与 collection 一致时用 sqlite，否则 weaviate
+    侧索引与 collection 对不上（collection 被删除/重建、绕过重建的写入）时，
+    信任侧索引会让未变化的 JD 永远被跳过：auto 退回 weaviate，显式 sqlite 直接报错。
+    """
+    t = time.time()
+    use_sqlite = False
+    if state_store is not None and hash_source in ("auto", "sqlite"):
+        indexed = state_store.count_hashes(collection)
+        live = weaviate_store.count(collection) if indexed else 0
+        use_sqlite = indexed > 0 and live == indexed
+        if not use_sqlite:
+            reason = "empty side index" if not indexed else f"side index={indexed} collection={live}"
+            if hash_source == "sqlite":
+                raise RuntimeError(f"hash_source=sqlite but side index is stale for {collection}: {reason}")
+            print(f"[jd-rebuild] hash side index not usable ({reason}), falling back to weaviate")
+    elif hash_source == "sqlite":
+        raise RuntimeError("hash_source=sqlite requires a state_store")
+    if use_sqlite:
+        hashes = state_store.load_hashes(collection)
+        source = "sqlite"
+    else:
+        raw = weaviate_store.fetch_property_map(collection, "hash")
+        hashes = {oid: _safe_str(h) for oid, h in raw.items() if _safe_str(h)}
+        if state_store is not None:
+            state_store.replace_hashes(collection, hashes)
+        source = "weaviate"
+    print(f"[jd-rebuild] hash snapshot loaded: source={source} size={len(hashes)} cost={time.time()-t:.2f}s")
+    return hashes
 
 
 def rebuild_jd_kb(
@@ -104,201 +229,587 @@ def rebuild_jd_kb(
     collection: str = DEFAULT_JD_COLLECTION,
     batch_size: int = DEFAULT_BATCH_SIZE,
     app_id: str = DEFAULT_APP_ID,
+    fetch_workers: int = DEFAULT_FETCH_WORKERS,
+    embed_workers: int = DEFAULT_EMBED_WORKERS,
+    write_workers: int = DEFAULT_WRITE_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    state_store: Optional[RebuildStateStore] = None,
+    hash_source: str = "auto",
+    delete_batch_size: int = DEFAULT_DELETE_BATCH,
+    companies: Optional[Sequence[str]] = None,
+    since: Optional[str] = None,
+    force: bool = False,
 ) -> RebuildStats:
     """
-    全量重建 + hash 增量 + batch embed/upsert
+    全量重建 + hash 增量 + batch embed/upsert（分阶段流水线）
+
+    manifest 遍历 -> [fetch x N] -> 组批 -> [embed x M] -> [write x K]（core.kb.kb_builder.KBBuilder）
+    - 各阶段之间是有界队列，下游慢时上游自动阻塞（背压）
+    - 多个 embedding 批次同时在途，与 MinIO 拉取、Weaviate 写入重叠
+    - 单批 embed/upsert 失败只计入 errors，不中断整体
+    - 过期 JD 攒批后用 delete_by_ids 一次删除（按 chunk 计错）
+    - hash 增量判断基于启动时加载的快照（见 _load_hash_snapshot），不再逐条查询 Weaviate
+    - 传入 state_store 时按公司记录 manifest ETag 与断点：
+      manifest 未变且已完成的公司整家跳过，中断的公司从断点续跑（force=True 忽略）
+    - companies / since(YYYYMMDD) 用于只重建部分公司
     修复点：Weaviate object_id 使用稳定 UUID 映射，避免 “uuid not valid”。
     """
     stats = RebuildStats()
     t0 = time.time()
 
-    print(f"[jd-rebuild] start bucket={bucket}, collection={collection}, batch_size={batch_size}")
+    # 逻辑名经 alias 解析到当前物理 collection；断点/侧索引都按物理名记录
+    logical = collection
+    collection = weaviate_store.resolve(collection)
+
+    batch_size = max(int(batch_size or DEFAULT_BATCH_SIZE), 1)
+    fetch_workers = max(int(fetch_workers or 1), 1)
+    embed_workers = max(int(embed_workers or 1), 1)
+    write_workers = max(int(write_workers or 1), 1)
+    queue_size = max(int(queue_size or DEFAULT_QUEUE_SIZE), 1)
+    delete_batch_size = max(int(delete_batch_size or DEFAULT_DELETE_BATCH), 1)
+
+    print(
+        f"[jd-rebuild] start bucket={bucket}, collection={collection}"
+        f"{'' if collection == logical else f' (alias={logical})'}, batch_size={batch_size}, "
+        f"workers(fetch/embed/write)={fetch_workers}/{embed_workers}/{write_workers}"
+    )
+
+    if hash_source not in HASH_SOURCES:
+        raise ValueError(f"hash_source must be one of {HASH_SOURCES}, got {hash_source!r}")
+    since = _safe_str(since)
+    if since and not _is_crawl_date(since):
+        raise ValueError(f"since must be YYYYMMDD, got {since!r}")
 
     # 1) schema
     ensure_jd_collection(weaviate_store, collection=collection)
+    known_hashes = _load_hash_snapshot(weaviate_store, collection, state_store, hash_source)
 
     # 2) embedding 维度探针
     probe = embedding_client.embed_one("ping", app_id=app_id)
     print(f"[jd-rebuild] embedding probe dim={len(probe)}")
 
-    # 3) list keys
-    print("[jd-rebuild] listing minio keys...")
-    t_list = time.time()
-    all_keys = minio_store.list(bucket, prefix="", recursive=True)
-    print(f"[jd-rebuild] minio list done: keys={len(all_keys)}, cost={time.time()-t_list:.2f}s")
+    # 4) 流水线
+    lock = threading.Lock()
+    live_ids: Set[str] = set()
+    st_delete = StageStats("delete", workers=fetch_workers)
 
-    company_dates = _extract_company_dates(all_keys)
-    companies = sorted(company_dates.keys())
-    stats.companies = len(companies)
-    print(f"[jd-rebuild] found companies={stats.companies}")
+    def bump(**kw) -> None:
+        with lock:
+            for k, v in kw.items():
+                setattr(stats, k, getattr(stats, k) + v)
 
-    batch_texts: List[str] = []
-    batch_props: List[Dict] = []
-    batch_ids: List[str] = []  # Weaviate UUID strings
+    progresses: List[_CompanyProgress] = []
 
-    def flush_batch(reason: str):
-        nonlocal batch_texts, batch_props, batch_ids
-
-        if not batch_texts:
+    def save_progress(p: _CompanyProgress, *, force_save: bool = False) -> None:
+        # 调用方持锁；按步长落盘，公司完成时立即落盘
+        if state_store is None:
             return
-
-        n = len(batch_texts)
-        print(f"[jd-rebuild] flush_batch({reason}): n={n} (embed -> upsert) ...")
-
-        t_embed = time.time()
-        vectors = embedding_client.embed(batch_texts, app_id=app_id)
-        print(f"[jd-rebuild] batch embedded: n={n}, cost={time.time()-t_embed:.2f}s")
-
-        t_upsert = time.time()
+        if p.complete or force_save or p.watermark - p.saved >= CHECKPOINT_EVERY:
+            if p.watermark == p.saved and not p.complete:
+                return
+            state_store.checkpoint_company(collection, p.company, files_done=p.watermark, done=p.complete)
+            p.saved = p.watermark
+
+    def finish(refs: List[Tuple[_CompanyProgress, int]], ok: bool) -> None:
+        with lock:
+            for p, idx in refs:
+                p.mark(idx, ok)
+            for p in {id(p): p for p, _ in refs}.values():
+                save_progress(p)
+
+    def prepare(company: str, crawl_date: str, f: Dict) -> Any:
+        job_id = ""
+        jd_key = ""
         try:
-            weaviate_store.batch_upsert(
-                collection=collection,
-                vectors=vectors,
-                properties_list=batch_props,
-                ids=batch_ids,
-            )
+            job_id = _safe_str(f.get("job_id"))
+            jd_key = _safe_str(f.get("key"))
+            if not job_id or not jd_key:
+                bump(jd_skipped=1)
+                return None
+
+            bump(jd_total=1)
+            obj_id = _jd_object_id(job_id)  # 合法 UUID
+
+            jd = minio_store.get_json(bucket, jd_key)
+            if not isinstance(jd, dict):
+                bump(jd_skipped=1)
+                return None
+
+            status = _safe_str(jd.get("status")).lower()
+            if status == "expired":
+                return _EXPIRED, obj_id
+
+            # hash 增量（内存快照查找）
+            new_hash = _safe_str(jd.get("hash"))
+            if new_hash and known_hashes.get(obj_id) == new_hash:
+                bump(jd_skipped=1)
+                return None
+
+            content = _compose_content(jd)
+            if not content:
+                bump(jd_skipped=1)
+                return None
+
+            return obj_id, content, {
+                # 业务主键仍保存 job_id
+                "job_id": job_id,
+                "content": content,
+
+                "company": _safe_str(jd.get("company")),
+                "position": _safe_str(jd.get("position")),
+                "department": _safe_str(jd.get("department")),
+                "product": _safe_str(jd.get("product")),
+                "category": _safe_str(jd.get("category")),
+                "location": _safe_str(jd.get("location")),
+                "experience": _safe_str(jd.get("experience")),
+                "education": _safe_str(jd.get("education")),
+                "requirements": _safe_str(jd.get("requirements")),
+                "description": _safe_str(jd.get("description")),
+
+                "hash": new_hash,
+                "status": _safe_str(jd.get("status")),
+
+                "source_bucket": bucket,
+                "source_key": jd_key,
+                "crawl_date": crawl_date,
+                "publish_time": _safe_str(jd.get("publish_time")),
+                "modify_time": _safe_str(jd.get("modify_time")),
+                "crawler_time": _safe_str(jd.get("crawler_time")),
+                "vectorized_at": _now_iso(),
+            }
         except Exception as e:
-            print(f"[jd-rebuild] batch upsert FAILED: n={n} err={e}")
-            sample_id = batch_ids[0] if batch_ids else ""
-            sample_key = batch_props[0].get("source_key") if batch_props else ""
-            sample_job = batch_props[0].get("job_id") if batch_props else ""
-            print(f"[jd-rebuild] batch upsert FAILED sample: uuid={sample_id} job_id={sample_job} source_key={sample_key}")
-            raise
+            bump(errors=1)
+            print(f"[jd-rebuild] item error: company={company} jd_key={jd_key} job_id={job_id} err={e}")
+            return _FAILED
 
-        print(f"[jd-rebuild] batch upserted: n={n}, cost={time.time()-t_upsert:.2f}s")
+    pending_deletes: List[Tuple[str, Tuple[_CompanyProgress, int]]] = []
 
-        stats.jd_upserted += n
-        batch_texts, batch_props, batch_ids = [], [], []
+    def flush_deletes(items: List[Tuple[str, Tuple[_CompanyProgress, int]]]) -> None:
+        if not items:
+            return
+        t = time.time()
+        res = weaviate_store.delete_by_ids(collection, [oid for oid, _ in items])
+        failed = set(res.failed_ids)
+        ok_ids = [oid for oid, _ in items if oid not in failed]
+        if state_store is not None and ok_ids:
+            state_store.delete_hashes(collection, ok_ids)
+        with lock:
+            live_ids.difference_update(ok_ids)
+        bump(jd_deleted=len(ok_ids), errors=len([1 for oid, _ in items if oid in failed]))
+        for err in res.errors:
+            print(f"[jd-rebuild] batch delete FAILED: {err}")
+        with lock:
+            st_delete.batches += 1
+            st_delete.items += len(items)
+            st_delete.busy_s += time.time() - t
+        finish([ref for oid, ref in items if oid not in failed], True)
+        finish([ref for oid, ref in items if oid in failed], False)
+
+    def queue_delete(obj_id: str, ref: Tuple[_CompanyProgress, int]) -> None:
+        with lock:
+            pending_deletes.append((obj_id, ref))
+            if len(pending_deletes) < delete_batch_size:
+                return
+            items = pending_deletes[:]
+            pending_deletes.clear()
+        flush_deletes(items)
+
+    def prepare_source(src: Tuple[_CompanyProgress, int, str, Dict]) -> Any:
+        progress, idx, crawl_date, f = src
+        prepared = prepare(progress.company, crawl_date, f)
+        if prepared is _FAILED:
+            raise RuntimeError("prepare failed")   # 已计错并打印
+        if prepared is None:
+            return None
+        if prepared[0] is _EXPIRED:
+            queue_delete(prepared[1], (progress, idx))
+            return DEFERRED
+        obj_id, content, props = prepared
+        return [BuildItem(object_id=obj_id, text=content, properties=props)]
+
+    def on_written(items: List[BuildItem]) -> None:
+        if state_store is not None:
+            state_store.upsert_hashes(collection, [(i.object_id, i.properties.get("hash")) for i in items])
+        with lock:
+            live_ids.update(i.object_id for i in items)
+        bump(jd_upserted=len(items))
+
+    def on_batch_error(stage: str, items: List[BuildItem], err: Exception) -> None:
+        bump(errors=len(items))
+        action = "upsert" if stage == "write" else stage
+        print(f"[jd-rebuild] batch {action} FAILED: n={len(items)} err={err}")
+        if stage == "write" and items:
+            sample = items[0]
+            print(
+                f"[jd-rebuild] batch upsert FAILED sample: uuid={sample.object_id} "
+                f"job_id={sample.properties.get('job_id')} source_key={sample.properties.get('source_key')}"
+            )
 
+    def on_done(res: SourceResult) -> None:
+        finish([res.ref], res.ok)
+
+    builder = KBBuilder(
+        prepare=prepare_source,
+        embedding_client=embedding_client,
+        weaviate_store=weaviate_store,
+        collection=collection,
+        app_id=app_id,
+        batch_size=batch_size,
+        prepare_workers=fetch_workers,
+        embed_workers=embed_workers,
+        write_workers=write_workers,
+        queue_size=queue_size,
+        on_written=on_written,
+        on_done=on_done,
+        on_batch_error=on_batch_error,
+        name="jd-rebuild",
+    )
+
+    run_id = None
+    run_status = "success"
+    last_progress = 0
     try:
-        for company in companies:
-            latest = max(company_dates[company])
+        if state_store is not None:
+            run_id = state_store.start_run(collection, {
+                "bucket": bucket,
+                "companies": list(companies or []),
+                "since": since,
+                "force": force,
+                "hash_source": hash_source,
+                "batch_size": batch_size,
+            })
+        builder.start()
+
+        # 3) 按公司流式列目录；manifest 直接 stat（ETag 用于变更检测）
+        for company, latest in _iter_company_latest(minio_store, bucket, companies):
+            if since and latest < since:
+                continue
+            stats.companies += 1
             manifest_key = f"{company}/{latest}/manifest.json"
-            if manifest_key not in all_keys:
+            try:
+                meta = minio_store.stat(bucket, manifest_key)
+            except Exception as e:
+                bump(errors=1)
+                print(f"[jd-rebuild] manifest stat failed: key={manifest_key} err={e}")
                 continue
+            if meta is None:
+                continue
+            etag = _safe_str(meta.get("etag"))
+
+            start_idx = 0
+            prev = state_store.get_company(collection, company) if state_store is not None else None
+            if prev and not force and etag and prev["manifest_etag"] == etag and prev["crawl_date"] == latest:
+                if prev["status"] == "done":
+                    stats.companies_unchanged += 1
+                    continue
+                start_idx = int(prev["files_done"] or 0)
 
             print(f"[jd-rebuild] company={company}, date={latest}")
             print(f"[jd-rebuild] loading manifest: {manifest_key}")
 
             t_m = time.time()
-            manifest = minio_store.get_json(bucket, manifest_key)
+            try:
+                manifest = minio_store.get_json(bucket, manifest_key)
+            except Exception as e:
+                bump(errors=1)
+                print(f"[jd-rebuild] manifest load failed: key={manifest_key} err={e}")
+                continue
             files = manifest.get("files", []) or []
             print(f"[jd-rebuild] manifest loaded: files={len(files)}, cost={time.time()-t_m:.2f}s")
 
             stats.manifests_found += 1
             crawl_date = _safe_str(manifest.get("crawl_date") or latest)
 
-            for f in files:
-                job_id = ""
-                jd_key = ""
-                try:
-                    job_id = _safe_str(f.get("job_id"))
-                    jd_key = _safe_str(f.get("key"))
-                    if not job_id or not jd_key:
-                        stats.jd_skipped += 1
-                        continue
-
-                    stats.jd_total += 1
-                    obj_id = _jd_object_id(job_id)  # 合法 UUID
-
-                    jd = minio_store.get_json(bucket, jd_key)
-                    if not isinstance(jd, dict):
-                        stats.jd_skipped += 1
-                        continue
-
-                    status = _safe_str(jd.get("status")).lower()
-                    if status == "expired":
-                        try:
-                            weaviate_store.delete_by_id(collection, obj_id)
-                            stats.jd_deleted += 1
-                        except Exception as e:
-                            stats.errors += 1
-                            print(f"[jd-rebuild] delete failed: job_id={job_id} uuid={obj_id} err={e}")
-                        continue
-
-                    # hash 增量（用 UUID 查）
-                    new_hash = _safe_str(jd.get("hash"))
-                    if new_hash:
-                        try:
-                            existing = weaviate_store.get_properties_by_id(collection, obj_id)
-                        except Exception as e:
-                            existing = None
-                            print(f"[jd-rebuild] get_by_id failed (ignore): job_id={job_id} uuid={obj_id} err={e}")
-
-                        if existing:
-                            old_hash = _safe_str(existing.get("hash"))
-                            if old_hash and old_hash == new_hash:
-                                stats.jd_skipped += 1
-                                continue
-
-                    content = _compose_content(jd)
-                    if not content:
-                        stats.jd_skipped += 1
-                        continue
-
-                    batch_texts.append(content)
-                    batch_ids.append(obj_id)
-                    batch_props.append({
-                        # 业务主键仍保存 job_id
-                        "job_id": job_id,
-                        "content": content,
-
-                        "company": _safe_str(jd.get("company")),
-                        "position": _safe_str(jd.get("position")),
-                        "department": _safe_str(jd.get("department")),
-                        "product": _safe_str(jd.get("product")),
-                        "category": _safe_str(jd.get("category")),
-                        "location": _safe_str(jd.get("location")),
-                        "experience": _safe_str(jd.get("experience")),
-                        "education": _safe_str(jd.get("education")),
-                        "requirements": _safe_str(jd.get("requirements")),
-                        "description": _safe_str(jd.get("description")),
-
-                        "hash": new_hash,
-                        "status": _safe_str(jd.get("status")),
-
-                        "source_bucket": bucket,
-                        "source_key": jd_key,
-                        "crawl_date": crawl_date,
-                        "publish_time": _safe_str(jd.get("publish_time")),
-                        "modify_time": _safe_str(jd.get("modify_time")),
-                        "crawler_time": _safe_str(jd.get("crawler_time")),
-                        "vectorized_at": _now_iso(),
-                    })
-
-                    if len(batch_texts) == batch_size:
-                        flush_batch("batch_full")
-
-                    if stats.jd_total % PROGRESS_EVERY == 0:
-                        elapsed = time.time() - t0
-                        rate = stats.jd_total / elapsed if elapsed > 0 else 0.0
-                        print(
-                            f"[jd-rebuild] progress total={stats.jd_total} "
-                            f"upserted={stats.jd_upserted} skipped={stats.jd_skipped} "
-                            f"deleted={stats.jd_deleted} errors={stats.errors} rate={rate:.2f}/s"
-                        )
-
-                except Exception as e:
-                    stats.errors += 1
-                    print(f"[jd-rebuild] item error: company={company} jd_key={jd_key} job_id={job_id} err={e}")
-                    # 如需失败即停，解除注释：
-                    # raise
-
-        flush_batch("final")
+            start_idx = min(start_idx, len(files))
+            if start_idx:
+                stats.companies_resumed += 1
+                print(f"[jd-rebuild] resume company={company} from={start_idx}/{len(files)}")
+            progress = _CompanyProgress(company, start_idx, len(files))
+            progresses.append(progress)
+            if state_store is not None:
+                state_store.start_company(
+                    collection,
+                    company,
+                    crawl_date=latest,
+                    manifest_etag=etag,
+                    files_total=len(files),
+                    files_done=start_idx,
+                )
+
+            for idx in range(start_idx, len(files)):
+                f = files[idx]
+                if not isinstance(f, dict):
+                    # manifest 本身的坏条目，重试无意义：记错但推进断点
+                    bump(errors=1)
+                    finish([(progress, idx)], True)
+                    continue
+                builder.submit((progress, idx, crawl_date, f), ref=(progress, idx))  # 队列满时阻塞 = 背压
+            if not files:
+                with lock:
+                    save_progress(progress)
+
+            if stats.jd_total - last_progress >= PROGRESS_EVERY:
+                last_progress = stats.jd_total
+                elapsed = time.time() - t0
+                rate = stats.jd_total / elapsed if elapsed > 0 else 0.0
+                qs = builder.queue_sizes()
+                print(
+                    f"[jd-rebuild] progress total={stats.jd_total} "
+                    f"upserted={stats.jd_upserted} skipped={stats.jd_skipped} "
+                    f"deleted={stats.jd_deleted} errors={stats.errors} rate={rate:.2f}/s "
+                    f"queues(fetch/prep/embed/write)={qs['source']}/{qs['item']}/{qs['embed']}/{qs['write']}"
+                )
 
     except KeyboardInterrupt:
-        print("\n[jd-rebuild] interrupted, flushing batch...")
-        try:
-            flush_batch("interrupt")
-        except Exception as e:
-            stats.errors += 1
-            print(f"[jd-rebuild] flush on interrupt FAILED err={e}")
+        # 停止拉取新 JD；已拉取的条目仍会组批写完
+        print("\n[jd-rebuild] interrupted, draining in-flight batches...")
+        run_status = "interrupted"
+        stats.interrupted = True
+        builder.stop()
+
+    except BaseException:
+        run_status = "failed"
+        builder.stop()
+        raise
+
+    finally:
+        builder.close()
+        flush_deletes(pending_deletes)
+
+        # 落最终断点 + 运行记录
+        with lock:
+            for p in progresses:
+                save_progress(p, force_save=True)
+        elapsed = time.time() - t0
+        stats.jd_distinct = len(live_ids)
+        stages = builder.report()
+        stats.stages = {
+            "fetch": stages["prepare"],
+            "embed": stages["embed"],
+            "write": stages["write"],
+            "delete": st_delete.report(elapsed),
+        }
+        if state_store is not None and run_id is not None:
+            state_store.finish_run(run_id, status=run_status, stats=asdict(stats))
 
-    elapsed = time.time() - t0
     print(
-        f"[jd-rebuild] done total={stats.jd_total} upserted={stats.jd_upserted} "
+        f"[jd-rebuild] done companies={stats.companies} unchanged={stats.companies_unchanged} "
+        f"resumed={stats.companies_resumed} manifests={stats.manifests_found} "
+        f"total={stats.jd_total} upserted={stats.jd_upserted} "
         f"skipped={stats.jd_skipped} deleted={stats.jd_deleted} "
         f"errors={stats.errors} cost={elapsed:.2f}s"
     )
+    for name, rep in stats.stages.items():
+        print(
+            f"[jd-rebuild] stage={name} workers={rep['workers']} items={rep['items']} "
+            f"rate={rep['items_per_s']}/s avg_latency={rep['avg_latency_ms']}ms busy={rep['busy_s']}s"
+        )
 
     return stats
+
+
+def _version_name(collection: str) -> str:
+    return f"{collection}{VERSION_SEP}{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+
+
+def _same_collection(a: str, b: str) -> bool:
+    # Weaviate 会把 collection 名首字母大写
+    return a.lower() == b.lower()
+
+
+def gc_jd_versions(
+    weaviate_store: WeaviateStore,
+    collection: str = DEFAULT_JD_COLLECTION,
+    *,
+    keep_versions: int = DEFAULT_KEEP_VERSIONS,
+    state_store: Optional[RebuildStateStore] = None,
+) -> List[str]:
+    """
+    回收旧版本：保留 alias 当前目标 + 最近 keep_versions 个旧版本，其余删除
+    - alias 从未切换过（逻辑名即物理名）时不做任何删除
+    - 首次切换前的原始 collection 视为最旧的版本
+    """
+    live = weaviate_store.resolve(collection)
+    if _same_collection(live, collection):
+        return []
+
+    prefix = f"{collection}{VERSION_SEP}".lower()
+    names = weaviate_store.list_collections()
+    versions = sorted((n for n in names if n.lower().startswith(prefix)), key=str.lower, reverse=True)
+    old = [n for n in versions if not _same_collection(n, live)]
+    old += [n for n in names if _same_collection(n, collection)]
+
+    dropped: List[str] = []
+    for name in old[max(int(keep_versions), 0):]:
+        try:
+            weaviate_store.drop_collection(name)
+        except Exception as e:
+            print(f"[jd-rebuild] gc drop failed: collection={name} err={e}")
+            continue
+        if state_store is not None:
+            state_store.purge_collection(name)
+        dropped.append(name)
+        print(f"[jd-rebuild] gc dropped collection={name}")
+    return dropped
+
+
+def _replay_live_writes(
+    weaviate_store: WeaviateStore,
+    previous: str,
+    target: str,
+    since: datetime,
+    state_store: Optional[RebuildStateStore],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Tuple[int, int, int]:
+    """
+    把 since 之后写入旧版本的对象（如 /jd/upload）带向量补写到新版本，后写者覆盖重建结果。
+    返回 (补写数, 其中新版本原先没有的数, 失败数)；删除不会被补上。
+    """
+    cutoff = since - timedelta(seconds=REPLAY_SKEW_SECONDS)
+    try:
+        # 服务端按更新时间过滤，只取变更过的对象
+        changed = [item["id"] for item in weaviate_store.iter_updated_since(previous, cutoff, properties=["hash"])]
+    except CollectionNotReady:
+        raise
+    except Exception as e:
+        # 更早建的版本没有时间戳索引：回退为全量扫描 + 客户端比较
+        print(f"[jd-rebuild] replay falls back to full scan: collection={previous} err={e}")
+        changed = [
+            item["id"]
+            for item in weaviate_store.iterate(previous, properties=["hash"])
+            if item["updated_at"] is not None and item["updated_at"] >= cutoff
+        ]
+    if not changed:
+        return 0, 0, 0
+    existing = weaviate_store.fetch_objects_by_ids(target, changed, return_properties=["hash"])
+    added = len([oid for oid in changed if oid not in existing])
+    written = errors = 0
+    for start in range(0, len(changed), max(int(batch_size), 1)):
+        objs = weaviate_store.fetch_objects_by_ids(previous, changed[start:start + batch_size], include_vector=True)
+        items = list(objs.values())
+        if not items:
+            continue
+        res = weaviate_store.upsert_many(
+            target,
+            [o.get("vector") for o in items],
+            [o["properties"] for o in items],
+            [o["id"] for o in items],
+        )
+        ok = [o for o in items if o["id"] not in res.errors]
+        written += len(ok)
+        errors += len(res.errors)
+        if state_store is not None and ok:
+            state_store.upsert_hashes(target, [(o["id"], o["properties"].get("hash")) for o in ok])
+        for uid, err in list(res.errors.items())[:5]:
+            print(f"[jd-rebuild] replay FAILED: id={uid} err={err}")
+    print(f"[jd-rebuild] replayed live writes: source={previous} target={target} written={written} errors={errors}")
+    return written, added, errors
+
+
+def rebuild_jd_kb_blue_green(
+    *,
+    minio_store: MinIOStore,
+    embedding_client: EmbeddingClient,
+    weaviate_store: WeaviateStore,
+    collection: str = DEFAULT_JD_COLLECTION,
+    state_store: Optional[RebuildStateStore] = None,
+    min_count_ratio: float = DEFAULT_MIN_COUNT_RATIO,
+    **pipeline_kwargs: Any,
+) -> BlueGreenResult:
+    """
+    蓝绿重建：全量写入新版本 collection -> 校验 -> 切换 alias（补最后一轮与回收旧版本见 finish_blue_green）
+    - 重建期间查询仍读旧版本，不受写入压力影响，也不会读到新旧混合数据
+    - 重建期间写入旧版本的对象（按 last_update_time 在服务端过滤）在校验前补写到新版本；
+      切换后不在这里等待：调用方在 result.finalize_after 之后调用 finish_blue_green 再补一轮并回收旧版本，
+      覆盖其它进程切换前的最后写入。删除不补，需在重建期间暂停 JD 删除
+    - 校验：无错误、未中断、新版本条数 == 写入的不同 uuid 数、且不少于旧版本的 min_count_ratio
+    - 校验不通过不切换；新版本留作排查，下次 GC 回收
+    pipeline_kwargs 透传给 rebuild_jd_kb（bucket / batch_size / workers 等）。
+    """
+    if pipeline_kwargs.get("companies") or pipeline_kwargs.get("since"):
+        raise ValueError("blue/green rebuild is always full; companies/since are not supported")
+    if weaviate_store.aliases is None:
+        raise RuntimeError("blue/green rebuild requires WeaviateStore(aliases=...)")
+
+    previous = weaviate_store.resolve(collection)
+    target = _version_name(collection)
+    result = BlueGreenResult(alias=collection, target=target, previous=previous)
+    print(f"[jd-rebuild] blue/green alias={collection} live={previous} target={target}")
+    started = datetime.now(timezone.utc)
+    batch_size = int(pipeline_kwargs.get("batch_size") or DEFAULT_BATCH_SIZE)
+
+    result.stats = rebuild_jd_kb(
+        minio_store=minio_store,
+        embedding_client=embedding_client,
+        weaviate_store=weaviate_store,
+        collection=target,
+        state_store=state_store,
+        force=True,
+        **pipeline_kwargs,
+    )
+
+    # 补写重建期间的线上写入
+    stats = result.stats
+    replay_started = datetime.now(timezone.utc)
+    result.replayed, added, replay_errors = _replay_live_writes(
+        weaviate_store, previous, target, started, state_store, batch_size
+    )
+    expected = stats.jd_distinct + added
+
+    # 校验
+    new_count = weaviate_store.count(target)
+    try:
+        old_count = weaviate_store.count(previous)
+    except Exception:
+        old_count = 0
+    if stats.interrupted:
+        result.problems.append("rebuild interrupted")
+    if stats.errors or replay_errors:
+        result.problems.append(f"errors={stats.errors + replay_errors}")
+    if new_count != expected:
+        result.problems.append(f"count mismatch: collection={new_count} expected={expected}")
+    if old_count and new_count < old_count * min_count_ratio:
+        result.problems.append(f"count dropped: new={new_count} old={old_count} min_ratio={min_count_ratio}")
+    print(f"[jd-rebuild] validate target={target} count={new_count} live_count={old_count}")
+
+    if result.problems:
+        print(f"[jd-rebuild] blue/green NOT switched: {'; '.join(result.problems)}")
+        return result
+
+    weaviate_store.switch_alias(collection, target)
+    result.switched = True
+    result.replay_since = replay_started
+    result.finalize_after = time.time() + ALIAS_CACHE_TTL
+    print(f"[jd-rebuild] alias switched: {collection} -> {target} (was {previous})")
+    return result
+
+
+def finish_blue_green(
+    weaviate_store: WeaviateStore,
+    result: BlueGreenResult,
+    *,
+    state_store: Optional[RebuildStateStore] = None,
+    keep_versions: int = DEFAULT_KEEP_VERSIONS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> BlueGreenResult:
+    """
+    切换后的收尾：补写最后一轮线上写入，再回收旧版本。
+    其它进程最多再按旧指针写 ALIAS_CACHE_TTL 秒，调用方应在 result.finalize_after 之后调用（本函数不等待）；
+    未切换的结果直接返回。
+    """
+    if not result.switched or result.finished:
+        return result
+    if time.time() < result.finalize_after:
+        print("[jd-rebuild] finish_blue_green called before the alias cache expired; late writes may be missed")
+    n, _, _ = _replay_live_writes(
+        weaviate_store, result.previous, result.target, result.replay_since, state_store, batch_size
+    )
+    result.replayed += n
+    result.dropped = gc_jd_versions(
+        weaviate_store,
+        result.alias,
+        keep_versions=keep_versions,
+        state_store=state_store,
+    )
+    result.finished = True
+    return result
@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 
-from typing import List
+from typing import List, Optional
 
 import weaviate.classes.config as wc
 
@@ -53,9 +53,13 @@ def ensure_jd_collection(
     weaviate_store: WeaviateStore,
     *,
     collection: str = DEFAULT_JD_COLLECTION,
+    wait: Optional[float] = None,
 ) -> None:
     """
-    幂等确保 collection 存在 + 尝试补齐字段。
-    WeaviateStore.ensure_collection 已实现“先 list 判断，再 create，再 add_property”的幂等策略。
+    幂等确保 collection 存在 + 补齐缺失字段（WeaviateStore.ensure_collection：后台就绪任务 + schema 缓存）。
+    重建脚本不是请求线程：默认等到创建完成（最多 create_timeout_seconds），而不是按 ready_wait_seconds 抛 CollectionNotReady。
+    新建时为更新时间建索引：蓝绿切换补写线上写入时按 lastUpdateTime 在服务端过滤。
     """
-    weaviate_store.ensure_collection(collection, jd_properties())
+    if wait is None:
+        wait = weaviate_store.create_timeout_seconds
+    weaviate_store.ensure_collection(collection, jd_properties(), wait=wait, index_timestamps=True)
@@ -0,0 +1,91 @@
+# scripts/migrate_allowed_apps.py
+# -*- coding: utf-8 -*-
+
+import argparse
+from pathlib import Path
+
+import yaml
+
+from settings.config import Settings
+from datasource.connections.sqlite_connection import SQLiteConnection
+from datasource.sqlstores.collection_alias_store import CollectionAliasStore
+from datasource.sqlstores.kb_document_store import KBDocumentStore
+from datasource.connections.weaviate_connection import WeaviateConnection
+from datasource.vectorstores.weaviate_store import WeaviateStore
+
+from core.kb.allowed_apps_migration import DEFAULT_BATCH_SIZE, migrate_allowed_apps
+
+
+def _load_collection(project_root: Path, app_id: str, kb_key: str) -> str:
+    config_path = project_root / "plugins" / app_id / "config.yaml"
+    if not config_path.exists():
+        raise RuntimeError(f"plugin config not found: {config_path}")
+    data = yaml.safe_load(config_path.read_text(encoding="utf-8")) or {}
+    kb_cfg = (data.get("knowledge_bases") or {}).get(kb_key) or {}
+    collection = str(kb_cfg.get("collection") or "").strip()
+    if not collection:
+        raise RuntimeError(f"knowledge base {app_id}/{kb_key} has no collection")
+    return collection
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Migrate allowed_apps to TEXT_ARRAY and merge per-app duplicate objects"
+    )
+    parser.add_argument("--app-id", default=None, help="Resolve the collection from this plugin's config")
+    parser.add_argument("--kb-key", default=None, help="Knowledge base key in the plugin config")
+    parser.add_argument("--collection", default=None, help="Logical collection name (overrides --app-id/--kb-key)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Cursor page / write batch size")
+    parser.add_argument(
+        "--ignore-field",
+        action="append",
+        default=[],
+        help="Extra property ignored when detecting duplicates, e.g. parent_doc_id (repeatable)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Only report groups/duplicates, write nothing")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    settings = Settings()
+    if not settings.weaviate_enabled:
+        raise RuntimeError("Weaviate is not enabled (settings.weaviate_enabled=false)")
+
+    collection = args.collection
+    if not collection:
+        if not args.app_id or not args.kb_key:
+            raise SystemExit("either --collection or both --app-id and --kb-key are required")
+        collection = _load_collection(Path(__file__).resolve().parents[1], args.app_id, args.kb_key)
+
+    sqlite = SQLiteConnection(db_path=settings.sqlite_path)
+    weaviate = WeaviateStore(WeaviateConnection(
+        scheme=settings.weaviate_scheme,
+        host=settings.weaviate_host,
+        port=settings.weaviate_port,
+        grpc_port=settings.weaviate_grpc_port,
+        api_key=settings.weaviate_api_key,
+    ), aliases=CollectionAliasStore(sqlite))
+
+    result = migrate_allowed_apps(
+        weaviate,
+        collection,
+        kb_documents=KBDocumentStore(sqlite),
+        ignore_fields=args.ignore_field,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+    )
+    print(
+        f"[allowed-apps] done alias={result.alias} source={result.source} target={result.target} "
+        f"scanned={result.scanned} groups={result.groups} duplicates={result.duplicates} "
+        f"written={result.written} errors={result.errors} switched={result.switched} "
+        f"refs_created={result.refs_created}"
+    )
+    if result.switched and result.duplicates:
+        print("[allowed-apps] KB totals are corrected by the next count reconcile (or POST /kb/{app}/{kb}/stats/reconcile)")
+    if result.problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 # scripts/rebuild_jd.py
 # -*- coding: utf-8 -*-
 
+import argparse
 import os
+import time
 from pathlib import Path
 
 import yaml
@@ -9,6 +11,8 @@ import yaml
 from settings.config import Settings
 from datasource.connections.sqlite_connection import SQLiteConnection
 from datasource.sqlstores.ingestion_log_store import IngestionLogStore
+from datasource.sqlstores.rebuild_state_store import RebuildStateStore
+from datasource.sqlstores.collection_alias_store import CollectionAliasStore
 from datasource.connections.minio_connection import MinioConnection
 from datasource.objectstores.minio_store import MinIOStore
 
@@ -18,9 +22,19 @@ from datasource.vectorstores.weaviate_store import WeaviateStore
 from core.embedding.embedding_client import EmbeddingClient
 from plugins.interviewer.ingestion.jd_rebuild import (
     rebuild_jd_kb,
+    rebuild_jd_kb_blue_green,
+    finish_blue_green,
     DEFAULT_BUCKET,
     DEFAULT_JD_COLLECTION,
     DEFAULT_APP_ID,
+    DEFAULT_FETCH_WORKERS,
+    DEFAULT_EMBED_WORKERS,
+    DEFAULT_WRITE_WORKERS,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_DELETE_BATCH,
+    HASH_SOURCES,
+    DEFAULT_MIN_COUNT_RATIO,
+    DEFAULT_KEEP_VERSIONS,
 )
 
 
@@ -40,15 +54,69 @@ def _log_ingestion(store: IngestionLogStore, **kwargs) -> None:
         pass
 
 
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rebuild interviewer JD knowledge base")
+    parser.add_argument("--batch-size", type=int, default=8, help="Embedding/upsert batch size")
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS, help="Concurrent MinIO fetchers")
+    parser.add_argument("--embed-workers", type=int, default=DEFAULT_EMBED_WORKERS, help="Embedding batches in flight")
+    parser.add_argument("--write-workers", type=int, default=DEFAULT_WRITE_WORKERS, help="Concurrent Weaviate writers")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Bounded queue size between stages")
+    parser.add_argument(
+        "--delete-batch-size",
+        type=int,
+        default=DEFAULT_DELETE_BATCH,
+        help="Expired JDs collected per bulk delete",
+    )
+    parser.add_argument(
+        "--hash-source",
+        choices=HASH_SOURCES,
+        default="auto",
+        help="Where to load the {uuid: hash} snapshot from (auto = sqlite side-index if it matches the collection count, else weaviate; sqlite fails if stale)",
+    )
+    parser.add_argument(
+        "--company",
+        action="append",
+        default=[],
+        help="Only rebuild this company (repeatable)",
+    )
+    parser.add_argument("--since", default=None, help="Only companies whose latest crawl date >= YYYYMMDD")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Ignore manifest ETag / checkpoints and re-walk every selected company",
+    )
+    parser.add_argument(
+        "--blue-green",
+        action="store_true",
+        help="Full rebuild into a new versioned collection, validate, then switch the alias",
+    )
+    parser.add_argument(
+        "--min-count-ratio",
+        type=float,
+        default=DEFAULT_MIN_COUNT_RATIO,
+        help="Blue/green: new collection must hold at least this fraction of the live count",
+    )
+    parser.add_argument(
+        "--keep-versions",
+        type=int,
+        default=DEFAULT_KEEP_VERSIONS,
+        help="Blue/green: old versions kept after switching (for rollback)",
+    )
+    return parser.parse_args()
+
+
 def main():
+    args = _parse_args()
     settings = Settings()
+    sqlite = SQLiteConnection(db_path=settings.sqlite_path)
 
-    # ---- MinIO（不经过 Datasource，因此不会初始化 sqlite）----
+    # ---- MinIO（不经过 Datasource）----
     minio = MinIOStore(MinioConnection(
         endpoint=settings.minio_endpoint,
         access_key=settings.minio_access_key,
         secret_key=settings.minio_secret_key,
         secure=settings.minio_secure,
+        pool_size=max(settings.minio_pool_size, args.fetch_workers),
     ))
 
     # ---- Weaviate ----
@@ -61,7 +129,7 @@ def main():
         port=settings.weaviate_port,
         grpc_port=settings.weaviate_grpc_port,
         api_key=settings.weaviate_api_key,
-    ))
+    ), aliases=CollectionAliasStore(sqlite))
 
     # ---- Embedding ----
     embedder = EmbeddingClient(settings)
@@ -71,8 +139,8 @@ def main():
     collection = os.getenv("JD_COLLECTION", _load_collection(project_root, app_id))
     bucket = os.getenv("JD_BUCKET", DEFAULT_BUCKET)
 
-    sqlite = SQLiteConnection(db_path=settings.sqlite_path)
     log_store = IngestionLogStore(sqlite)
+    state_store = RebuildStateStore(sqlite)
 
     _log_ingestion(
         log_store,
@@ -81,19 +149,52 @@ def main():
         app_id=app_id,
         kb_key="jd_kb",
         collection=collection,
-        meta={"bucket": bucket},
+        meta={"bucket": bucket, "companies": args.company, "since": args.since, "force": args.force},
     )
 
+    pipeline_kwargs = dict(
+        minio_store=minio,
+        embedding_client=embedder,
+        weaviate_store=weaviate,
+        bucket=bucket,
+        batch_size=args.batch_size,
+        app_id=app_id,
+        fetch_workers=args.fetch_workers,
+        embed_workers=args.embed_workers,
+        write_workers=args.write_workers,
+        queue_size=args.queue_size,
+        state_store=state_store,
+        hash_source=args.hash_source,
+        delete_batch_size=args.delete_batch_size,
+    )
+
+    blue_green = None
     try:
-        stats = rebuild_jd_kb(
-            minio_store=minio,
-            embedding_client=embedder,
-            weaviate_store=weaviate,
-            bucket=bucket,
-            collection=collection,
-            batch_size=8,
-            app_id=app_id,
-        )
+        if args.blue_green:
+            blue_green = rebuild_jd_kb_blue_green(
+                collection=collection,
+                min_count_ratio=args.min_count_ratio,
+                **pipeline_kwargs,
+            )
+            if blue_green.switched:
+                # 等其它进程的 alias 缓存过期，再补最后一轮线上写入并回收旧版本
+                time.sleep(max(blue_green.finalize_after - time.time(), 0.0))
+                finish_blue_green(
+                    weaviate,
+                    blue_green,
+                    state_store=state_store,
+                    keep_versions=args.keep_versions,
+                    batch_size=args.batch_size,
+                )
+            stats = blue_green.stats
+        else:
+            stats = rebuild_jd_kb(
+                collection=collection,
+                companies=args.company,
+                since=args.since,
+                force=args.force,
+                **pipeline_kwargs,
+            )
     except Exception as e:
         _log_ingestion(
             log_store,
@@ -105,25 +206,42 @@ def main():
             meta={"bucket": bucket},
         )
         raise
-    else:
-        _log_ingestion(
-            log_store,
-            status="success",
-            message="jd rebuild finished",
-            app_id=app_id,
-            kb_key="jd_kb",
-            collection=collection,
-            meta={
-                "bucket": bucket,
-                "total": stats.jd_total,
-                "upserted": stats.jd_upserted,
-                "skipped": stats.jd_skipped,
-                "deleted": stats.jd_deleted,
-                "errors": stats.errors,
-            },
-        )
+
+    meta = {
+        "bucket": bucket,
+        "companies": stats.companies,
+        "companies_unchanged": stats.companies_unchanged,
+        "companies_resumed": stats.companies_resumed,
+        "total": stats.jd_total,
+        "upserted": stats.jd_upserted,
+        "skipped": stats.jd_skipped,
+        "deleted": stats.jd_deleted,
+        "errors": stats.errors,
+        "stages": stats.stages,
+    }
+    if blue_green is not None:
+        meta["blue_green"] = {
+            "target": blue_green.target,
+            "previous": blue_green.previous,
+            "switched": blue_green.switched,
+            "replayed": blue_green.replayed,
+            "problems": blue_green.problems,
+            "dropped": blue_green.dropped,
+        }
+    ok = blue_green is None or blue_green.switched
+    _log_ingestion(
+        log_store,
+        status="success" if ok else "failed",
+        message="jd rebuild finished" if ok else "jd blue/green validation failed: " + "; ".join(blue_green.problems),
+        app_id=app_id,
+        kb_key="jd_kb",
+        collection=collection,
+        meta=meta,
+    )
 
     print("JD rebuild finished:", stats)
+    if not ok:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
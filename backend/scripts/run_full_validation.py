@@ -162,8 +162,10 @@ def ensure_user_profile_collection(
         wc.Property(name="metadata_json", data_type=wc.DataType.TEXT),
     ]
     if use_allowed_apps:
-        props.append(wc.Property(name="allowed_apps", data_type=wc.DataType.TEXT))
-    store.ensure_collection(collection, props)
+        props.append(
+            wc.Property(name="allowed_apps", data_type=wc.DataType.TEXT_ARRAY, tokenization=wc.Tokenization.FIELD)
+        )
+    store.ensure_collection(collection, props, wait=store.create_timeout_seconds)
 
 
 def upload_to_minio(
@@ -618,7 +620,7 @@ def main() -> int:
         "metadata_json": json.dumps(resume_payload),
     }
     if use_allowed_apps:
-        props["allowed_apps"] = app_id
+        props["allowed_apps"] = [app_id]
 
     created = create_doc(api_base, app_id, kb_key, resume_text, props, wallet_id, timeout)
     replaced = replace_doc(
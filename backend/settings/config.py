@@ -40,6 +40,20 @@ class Settings(BaseModel):
     # ⭐ 唯一 bucket（与你的 .env 对齐）
     minio_bucket: str = os.getenv("MINIO_BUCKET_KB", "rag")
 
+    # urllib3 连接池大小（同时也是批量读写的并发上限）
+    minio_pool_size: int = _env_int("MINIO_POOL_SIZE", 10)
+
+    # multipart 上传分片大小（字节，最小 5MiB）
+    minio_part_size: int = _env_int("MINIO_PART_SIZE", 16 * 1024 * 1024)
+
+    # 读穿透缓存（默认关闭；DIR 为空则只用内存层）
+    minio_cache_enabled: bool = _env_bool("MINIO_CACHE_ENABLED", "false")
+    minio_cache_max_bytes: int = _env_int("MINIO_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    minio_cache_max_object_bytes: int = _env_int("MINIO_CACHE_MAX_OBJECT_BYTES", 4 * 1024 * 1024)
+    minio_cache_ttl_seconds: int = _env_int("MINIO_CACHE_TTL_SECONDS", 30)
+    minio_cache_dir: str = os.getenv("MINIO_CACHE_DIR", "")
+    minio_cache_disk_max_bytes: int = _env_int("MINIO_CACHE_DISK_MAX_BYTES", 512 * 1024 * 1024)
+
     # ---------- SQLite ----------
     sqlite_path: str = os.getenv(
         "SQLITE_PATH",
@@ -54,6 +68,14 @@ class Settings(BaseModel):
     weaviate_host: str = os.getenv("WEAVIATE_HOST", "47.101.3.196")
     weaviate_port: int = _env_int("WEAVIATE_PORT", 8080)
     weaviate_grpc_port: int = _env_int("WEAVIATE_GRPC_PORT", 50051)
+    # schema 漂移检查间隔（秒）：重拉已缓存 collection 的 schema，补齐缺失属性；0 表示不检查
+    weaviate_schema_check_seconds: int = _env_int("WEAVIATE_SCHEMA_CHECK_SECONDS", 300)
+    # 请求线程等待 collection 就绪（后台创建）的上限，超时返回 503 + Retry-After
+    weaviate_ready_wait_seconds: int = _env_int("WEAVIATE_READY_WAIT_SECONDS", 2)
+    # 后台任务等待新建 collection 可见的上限
+    weaviate_create_timeout_seconds: int = _env_int("WEAVIATE_CREATE_TIMEOUT_SECONDS", 30)
+    # KB 计数对账间隔（秒）：按 kb_documents 重算计数并与 Weaviate 实际数比对，记录校正值；0 表示不对账
+    kb_count_reconcile_seconds: int = _env_int("KB_COUNT_RECONCILE_SECONDS", 900)
 
 
     # ---------- OpenAI ----------
@@ -65,6 +87,42 @@ class Settings(BaseModel):
     embed_api_key: str = os.getenv("EMBED_API_KEY", "")
     embed_api_base: str = os.getenv("EMBED_API_BASE", "")
     embed_dim: int = _env_int("EMBEDDING_DIM", 0)
+    # ---------- Ingestion workers ----------
+    # 后台 worker 线程数；0 表示不启动（作业只能通过 ?run=true 内联执行）
+    ingestion_workers: int = _env_int("INGESTION_WORKERS", 2)
+    ingestion_lease_seconds: int = _env_int("INGESTION_LEASE_SECONDS", 60)
+    ingestion_poll_interval_ms: int = _env_int("INGESTION_POLL_INTERVAL_MS", 1000)
+    ingestion_max_attempts: int = _env_int("INGESTION_MAX_ATTEMPTS", 3)
+    ingestion_retry_backoff_seconds: int = _env_int("INGESTION_RETRY_BACKOFF_SECONDS", 10)
+    ingestion_retry_backoff_max_seconds: int = _env_int("INGESTION_RETRY_BACKOFF_MAX_SECONDS", 600)
+    # 切块：按段落/标题/句子切成 chunk_size 字符的块（作业 options.chunking/chunk_size/chunk_overlap 可覆盖）
+    ingestion_chunking: bool = _env_bool("INGESTION_CHUNKING", "true")
+    ingestion_chunk_size: int = _env_int("INGESTION_CHUNK_SIZE", 800)
+    ingestion_chunk_overlap: int = _env_int("INGESTION_CHUNK_OVERLAP", 100)
+    # 每次向量化/写入的块数
+    ingestion_embed_batch_size: int = _env_int("INGESTION_EMBED_BATCH_SIZE", 32)
+    # 不小于该字节数且类型支持分段解析（txt/md/jsonl/html）的对象，边读边解析边切块（常量内存）
+    ingestion_stream_min_bytes: int = _env_int("INGESTION_STREAM_MIN_BYTES", 8 * 1024 * 1024)
+    # 单个作业内同时在途的 embedding 批次数（与写入重叠）
+    ingestion_embed_workers: int = _env_int("INGESTION_EMBED_WORKERS", 2)
+    # 内容哈希去重：同一 kb/私有库范围内已有相同内容的 active 文档时跳过向量化（作业 options.dedupe 可覆盖）
+    ingestion_dedupe: bool = _env_bool("INGESTION_DEDUPE", "true")
+    # 解析：HTML/JSON 等 CPU 密集解析器放进子进程（0 表示在 worker 线程内解析）
+    ingestion_parse_processes: int = _env_int("INGESTION_PARSE_PROCESSES", 2)
+    # 小于该字节数的文档仍在本线程解析（省掉进程间序列化）
+    ingestion_parse_process_min_bytes: int = _env_int("INGESTION_PARSE_PROCESS_MIN_BYTES", 262144)
+    # 单文档大小上限；0 表示不限
+    ingestion_parse_max_bytes: int = _env_int("INGESTION_PARSE_MAX_BYTES", 100 * 1024 * 1024)
+    # 子进程内单次解析超时（含排队）；0 表示不限
+    ingestion_parse_timeout_seconds: int = _env_int("INGESTION_PARSE_TIMEOUT_SECONDS", 120)
+    # 公平调度：按 wallet_id/app_id 做加权公平排队
+    # JSON，如 {"wallet_a": {"weight": 2, "max_concurrency": 4}, "wallet_a/interviewer": {"weight": 1}}
+    ingestion_tenant_policies: str = os.getenv("INGESTION_TENANT_POLICIES", "")
+    # 每个租户默认并发上限；0 表示不限
+    ingestion_tenant_max_concurrency: int = _env_int("INGESTION_TENANT_MAX_CONCURRENCY", 0)
+    # 统计租户"最近被服务次数"的时间窗口
+    ingestion_fair_window_seconds: int = _env_int("INGESTION_FAIR_WINDOW_SECONDS", 300)
+
     # ---------- Plugins ----------
     plugins_auto_register: str = os.getenv("PLUGINS_AUTO_REGISTER", "interviewer")
 
@@ -65,9 +65,14 @@ export function fetchKBDocuments(appId, kbKey, limit = 20, offset = 0, walletId,
   const id = requireWalletId(walletId);
   const params = new URLSearchParams({
     limit: String(limit),
-    offset: String(offset),
     wallet_id: id,
   });
+  // 优先用游标翻页；没有游标（如直接跳页）时才退回 offset
+  if (options.cursor) {
+    params.set("cursor", options.cursor);
+  } else if (offset) {
+    params.set("offset", String(offset));
+  }
   if (options.privateDbId) params.set("private_db_id", options.privateDbId);
   if (options.sessionId) params.set("session_id", options.sessionId);
   return request(`/kb/${appId}/${kbKey}/documents?${params.toString()}`);
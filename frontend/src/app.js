@@ -556,16 +556,23 @@ async function loadDocuments() {
   docSubtitle.textContent = `集合 ${kb.collection} · 文本字段 ${kb.text_field} · 点击行查看详情`;
   try {
     const { sessionId, privateDbId } = getDocFilters();
+    // docCursors[i] 为第 i 页的游标（由上一页响应的 next_cursor 得到）
+    if (!state.docPageOffset || !state.docCursors) {
+      state.docCursors = [null];
+    }
+    const pageIndex = Math.floor((state.docPageOffset || 0) / state.docPageSize);
     const res = await fetchKBDocuments(
       kb.app_id,
       kb.kb_key,
       state.docPageSize,
       state.docPageOffset,
       state.walletId,
-      { sessionId, privateDbId }
+      { sessionId, privateDbId, cursor: state.docCursors[pageIndex] }
     );
     state.documents = res.items || [];
     state.docTotal = res.total ?? 0;
+    state.docCursors[pageIndex + 1] = res.next_cursor || null;
+    state.docHasNext = Boolean(res.next_cursor);
     const pageCount = state.docTotal ? Math.ceil(state.docTotal / state.docPageSize) : 0;
     const maxOffset = pageCount ? (pageCount - 1) * state.docPageSize : 0;
     if (state.docPageOffset > maxOffset) {
@@ -1000,7 +1007,7 @@ function renderDocToolbar() {
 
   docPageInfo.textContent = total ? `第 ${current}/${pageCount} 页 · ${total} 条` : "暂无数据";
   docPrev.disabled = offset <= 0;
-  docNext.disabled = offset + size >= total;
+  docNext.disabled = offset + size >= total || !state.docHasNext;
 }
 
 function updateDocPageSize(size) {